@@ -1,7 +1,10 @@
+import os
+import sys
 import numpy as np
 import csv
-from sklearn import svm
 import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'train2'))
+from Kernel_SVM import KernelSVM
 
 
 def process_data():
@@ -158,12 +161,12 @@ def process_data():
 
 def predict():
     x_train, y_train, x_test = process_data()
-    clf = svm.SVC(C=1,
-                  coef0=0,
-                  gamma='auto',
-                  kernel='rbf')
+    clf = KernelSVM(c=1,
+                    coef0=0,
+                    gamma='auto',
+                    kernel='rbf')
     clf.fit(x_train, y_train)
-    y_pred = clf.predict(x_test)
+    y_pred = clf.predict(x_test).ravel()
     (col, ) = np.shape(y_pred)
     y_pred = y_pred.astype(dtype=np.str)
     for i in range(0, col):                     # 数字转YES or NO
@@ -1,9 +1,12 @@
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
-import pandas as pd
 # from tqdm import tqdm
 from sklearn.datasets import load_wine
-from sklearn.feature_extraction import DictVectorizer
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'train2'))
+from feature_store import leave_out
+from preprocessing import Standardizer
 
 
 # 超参
@@ -11,39 +14,11 @@ EPOCH = 4000
 LAMBDA = 0
 AlPHA = 0.01
 SCALE = 0.5
-
-
-def leave_out():
-    """Divide data into 70% for train and 30% for test.
-
-    Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-        x_get_train: matrix, data
-        y_get_train: matrix, label
-
-    """
-    data_frame = pd.read_csv('./titanic/train.csv')
-
-    # 填补空缺值
-    data_frame = data_frame.fillna(method='ffill')  # 待改进
-
-    # 删除不必要特征
-    del data_frame['PassengerId']
-    del data_frame['Cabin']
-    del data_frame['Name']
-    del data_frame['Ticket']
-
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(data_frame.to_dict(orient='record'))
-
-    leave_num = int((np.size(data_get, axis=0) - (np.size(data_get, axis=0) % 10)) / 10 * 7)
-    x_get = data_get[:leave_num, :-2]
-    y_get = data_get[:leave_num, -1]
-    x_test_get = data_get[(leave_num + 1):, :-2]
-    y_test_get = data_get[(leave_num + 1):, -1]
-    return x_get, y_get, x_test_get, y_test_get
+BATCH_SIZE = 256     # None: full batch
+TOL = 1e-4           # 提前停止的阈值, None: 跑满EPOCH
+COST_EVERY = 10      # 每隔多少个epoch计算一次cost
+PATIENCE = 5         # mini-batch: cost 连续这么多次检查都没有比最低值再低tol才停
+EPS = 1e-12          # 防止log(0)
 
 
 class LogisticRegression(object):
@@ -54,41 +29,46 @@ class LogisticRegression(object):
 　　　　　　　　score   -- Show the mean accuracy on the given test data and labels
 
     Attribute:
-        __params: parameters
-        __count: decide when to initialize params
+        __params: parameters, (features + 1, 1) for binary, (features + 1, classes) for multinomial
+        __scaler: Standardizer fitted on the training data
+        __classes: sorted labels (multinomial)
+        multi_class: 'binary'      -- labels are 0/1, sigmoid
+                     'multinomial' -- any labels, softmax over one weight matrix
+                     'auto'        -- binary if the labels are 0/1, else multinomial
+        n_iter_: epochs run by the last fit
+        cost_: cost at the end of the last fit
 
     """
-    def __init__(self):
+    def __init__(self, multi_class='auto'):
         self.__params = 0
-        self.__count = 0
+        self.__scaler = None
+        self.__classes = None
+        self.__multinomial = False
+        self.multi_class = multi_class
+        self.n_iter_ = 0
+        self.cost_ = None
+
+    def __normalize(self, x_norm, y_norm=None):
+        """process raw data with the scaler fitted in fit (transform only)"""
 
-    def __normalize(self, x_norm, y_norm):
-        """process raw data"""
+        # normalization
+        x_norm = self.__scaler.transform(x_norm)
 
         # reshape
-        self.__count = self.__count + 1
         x_norm = np.hstack((np.ones((np.size(x_norm, axis=0), 1)), x_norm))  # 加一列1
-        y_norm = y_norm.reshape((np.size(x_norm, axis=0), 1))
-
-        # initialize params
-        if self.__count == 1:
-            self.__set_params(np.random.random((np.size(x_norm, axis=1), 1)))
-
-        # normalization
-        average = np.mean(x_norm, axis=0)
-        std = np.std(x_norm, axis=0)
-        for i in range(np.size(x_norm, axis=1)):
-            if std[i] == 0:
-                continue
-            else:
-                x_norm[:, i] = (x_norm[:, i] - average[i]) / std[i]
+        if y_norm is not None:
+            y_norm = y_norm.reshape((np.size(x_norm, axis=0), -1))
         return x_norm, y_norm
 
     def __cost_function(self, y_get, y_in, j_list_in):
         """calculate cost j for visualization"""
-        j = -1 / np.size(y_get, axis=0) * (np.sum((y_in * np.log(y_get)), axis=0)
-                                           + np.sum(((1 - y_in) * np.log(1 - y_get)), axis=0))
-        j_list_in.append(j)
+        y_get = np.clip(y_get, EPS, 1 - EPS)
+        if self.__multinomial:
+            j = -1 / np.size(y_get, axis=0) * np.sum(y_in * np.log(y_get))
+        else:
+            j = -1 / np.size(y_get, axis=0) * (np.sum((y_in * np.log(y_get)), axis=0)
+                                               + np.sum(((1 - y_in) * np.log(1 - y_get)), axis=0))
+        j_list_in.append(j.item())
         return j_list_in
 
     def __back(self, x_in, y_get, y_in):
@@ -99,55 +79,135 @@ class LogisticRegression(object):
         self.__set_params(params)
         return 0
 
-    def __plot_j(self, j_list_in):
+    def __plot_j(self, epoch_list_in, j_list_in):
         """Visualize the change of j"""
-        plt.plot(range(EPOCH), j_list_in, c="r")
+        plt.plot(epoch_list_in, j_list_in, c="r")
         plt.show()
         return 0
 
     def __forward(self, x_forward):
-        """forward prop with sigmoid"""
-        y_predict = 1 / (1 + np.exp(-np.dot(x_forward, self.__get_params())))
+        """forward prop with sigmoid (binary) or softmax (multinomial)"""
+        z = np.dot(x_forward, self.__get_params())
+        if self.__multinomial:
+            return np.exp(self.__log_softmax(z))
+        y_predict = 1 / (1 + np.exp(-z))
         return y_predict
 
-    def fit(self, x_in, y_in):
-        """Fit the model according to the given training data."""
+    def __log_softmax(self, z):
+        """log of softmax along the classes, shifted by the row max so exp never overflows"""
+        z = z - np.max(z, axis=1, keepdims=True)
+        return z - np.log(np.sum(np.exp(z), axis=1, keepdims=True))
+
+    def __set_labels(self, y_in):
+        """Decide binary / multinomial; for multinomial turn labels into a one-hot matrix."""
+
+        classes = np.unique(y_in)
+        if self.multi_class == 'auto':
+            self.__multinomial = not np.all(np.isin(classes, [0, 1]))
+        elif self.multi_class in ('binary', 'multinomial'):
+            self.__multinomial = self.multi_class == 'multinomial'
+        else:
+            raise ValueError("multi_class must be 'auto', 'binary' or 'multinomial', got %r" % self.multi_class)
+
+        if not self.__multinomial:
+            self.__classes = None
+            return y_in
+        self.__classes = classes
+        y_matrix = np.zeros((np.size(y_in, axis=0), np.size(classes)))
+        y_matrix[np.arange(np.size(y_in, axis=0)), np.searchsorted(classes, y_in)] = 1
+        return y_matrix
+
+    def fit(self, x_in, y_in, batch_size=BATCH_SIZE, tol=TOL, cost_every=COST_EVERY, patience=PATIENCE):
+        """Fit the model according to the given training data.
+
+        Parameters:
+            batch_size: rows per gradient step, shuffled every epoch; None for full batch
+            tol: stop once the cost gets less than tol below its best so far, or
+                 the norm of the full gradient is below tol; None runs all EPOCH
+            cost_every: compute the cost (and check tol) every cost_every epochs
+            patience: mini-batches only, checks in a row without a new best before stopping
+        """
         # pbar = tqdm(total=EPOCH)
 
+        # fit scaler, initialize params
+        y_in = self.__set_labels(np.ravel(y_in))
+        self.__scaler = Standardizer().fit(x_in)
+        outputs = np.size(self.__classes) if self.__multinomial else 1
+        self.__set_params(np.random.random((np.size(x_in, axis=1) + 1, outputs)))
         x_in, y_in = self.__normalize(x_in, y_in)
+        rows = np.size(x_in, axis=0)
+        if batch_size is None or batch_size >= rows:
+            batch_size = rows
+        # full batch 的cost没有噪声, 一次就够
+        if batch_size == rows:
+            patience = 1
 
         # initialize the list to store cost j
         j_list = []
+        epoch_list = []
 
         # fit
         for epoch in range(EPOCH):
-            y_get = self.__forward(x_in)
-            j_list = self.__cost_function(y_get, y_in, j_list)
-            self.__back(x_in, y_get, y_in)
-            if epoch % 50 == 0:
+            check = epoch % cost_every == 0 or epoch == EPOCH - 1
+
+            if batch_size == rows:
+                y_get = self.__forward(x_in)
+                if check:
+                    j_list = self.__cost_function(y_get, y_in, j_list)
+                    grad = np.dot(x_in.T, (y_get - y_in)) / rows
+                self.__back(x_in, y_get, y_in)
+            else:
+                # 每个epoch打乱顺序
+                order = np.random.permutation(rows)
+                for start in range(0, rows, batch_size):
+                    index = order[start:start + batch_size]
+                    x_batch, y_batch = x_in[index], y_in[index]
+                    self.__back(x_batch, self.__forward(x_batch), y_batch)
+                if check:
+                    y_get = self.__forward(x_in)
+                    j_list = self.__cost_function(y_get, y_in, j_list)
+                    grad = np.dot(x_in.T, (y_get - y_in)) / rows
+
+            if not check:
+                continue
+            epoch_list.append(epoch)
+            if epoch % 50 < cost_every:  # 大约每50个epoch打印一次
                 # pbar.update(50)
                 print("EPOCH: %4d" % epoch, " | Cost: ", j_list[-1])
+            if self.__converged(j_list, grad, tol, patience):
+                break
         # pbar.close()
+        self.n_iter_ = epoch + 1
+        self.cost_ = j_list[-1]
 
         # plot
-        self.__plot_j(j_list)
+        self.__plot_j(epoch_list, j_list)
         print("Minimized cost: %.5f" % j_list[-1])
         return self
 
+    def __converged(self, j_list_in, grad, tol, patience=1):
+        """the gradient is ~0, or none of the last patience checks got the cost tol below the best before them
+
+        mini-batch 的cost会上下抖, 单次上升不算收敛, 连续 patience 次都没有新低才停.
+        """
+        if tol is None:
+            return False
+        if np.linalg.norm(grad) < tol:
+            return True
+        return len(j_list_in) > patience and min(j_list_in[-patience:]) > min(j_list_in[:-patience]) - tol
+
     def predict(self, x_pre):
         """Predict class labels for samples in X."""
         # y_pre is useless here
-        x_pre, y_pre = self.__normalize(x_pre, np.ones((np.size(x_pre, axis=0), 1)))
-
-        y_pre = self.__forward(x_pre)
+        x_pre, _ = self.__normalize(x_pre)
+        z = np.dot(x_pre, self.__get_params())
 
-        # 化成0/1
-        for j in range(np.size(y_pre, axis=0)):
-            if y_pre[j] >= SCALE:
-                y_pre[j] = 1
-            else:
-                y_pre[j] = 0
+        # multinomial: 概率最大的类, softmax 是单调的, 直接比较 z
+        if self.__multinomial:
+            return self.__classes[np.argmax(z, axis=1)].reshape(-1, 1)
 
+        # 化成0/1, sigmoid(z) >= SCALE  <=>  z >= log(SCALE / (1 - SCALE))
+        y_pre = (z >= np.log(SCALE / (1 - SCALE))).astype(np.float64)
         return y_pre
 
     def __get_params(self):
@@ -163,27 +223,15 @@ class LogisticRegression(object):
     def score(self, x_score, y_score):
         """Returns the mean accuracy on the given test data and labels."""
 
-        x_score, y_score = self.__normalize(x_score, y_score)
-        y_pred = self.__forward(x_score)
-
         # record the right classify
-        count = 0
-
-        # turn into 0/1, then judge
-        for j in range(np.size(y_score, axis=0)):
-            if y_pred[j] >= SCALE:
-                y_pred[j] = 1
-            else:
-                y_pred[j] = 0
-            if y_pred[j] == y_score[j]:
-                count = count + 1
-        accuracy = count / np.size(y_score, axis=0) * 100
+        y_pred = self.predict(x_score)
+        accuracy = np.mean(y_pred.ravel() == np.ravel(y_score)) * 100
         print("acc:            %.4f%%" % accuracy)
         return 0
 
 
 if __name__ == "__main__":
-    # data = load_wine(return_X_y=True)
+    # 多分类: x, y = load_wine(return_X_y=True); LogisticRegression('multinomial').fit(x, y)
     x, y, x_test, y_test = leave_out()
     clf = LogisticRegression().fit(x, y)
     clf.score(x_test, y_test)
@@ -1,188 +1,152 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
-from sklearn.feature_extraction import DictVectorizer
-
-# 超参
-EPOCH = 3000
-LAMBDA = 0
-AlPHA = 0.01
-ITER = 10
-
-
-def load_train():
-    """Load titanic train data and process into vectorized martix.
-
-    Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-
-    """
-    data_frame = pd.read_csv('./titanic/train.csv')
+"""Bootstrap of logistic regression, all resamples trained together.
 
-    # 填补空缺值
-    data_frame = data_frame.fillna(method='ffill')  # 待改进
+A resample is stored as counts (how many times each row was drawn) instead of
+a copy of the data. Model b is then plain gradient descent on the weighted
+cost sum_i counts[b, i] * loss_i / n, so B models are two (n x d) by (d x B)
+matrix products per epoch:
 
-    # 删除不必要特征
-    del data_frame['PassengerId']
-    del data_frame['Cabin']
-    del data_frame['Name']
-    del data_frame['Ticket']
+    P = sigmoid(X W),    W -= alpha * X^T (C^T * (P - y)) / n
 
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(data_frame.to_dict(orient='record'))
+Rows a resample never drew are its out-of-bag (oob) rows, and are used to
+score it.
+"""
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'train2'))
+from feature_store import load_train, load_matrix
+from preprocessing import Standardizer
 
-    x_get = data_get[:, :-2]
-    y_get = data_get[:, -1]
-    return x_get, y_get
+# 超参
+EPOCH = 3000
+AlPHA = 0.1
+ITER = 1000          # 自助采样次数
+BATCH = 100          # 同时训练的模型数, 内存约为 (n x BATCH) 个float64的几倍
+TOL = 1e-6           # 一批模型梯度的最大范数低于它时提前停止
+SCALE = 0.5
+LEVEL = 0.95         # 置信区间
 
 
-def load_test():
-    """Load titanic test data and process into vectorized martix.
+def percentile_interval(values, level=LEVEL):
+    """Percentile bootstrap interval of each column of values (B, ...).
 
     Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-
+        (low, high)
     """
-    x_frame = pd.read_csv('./titanic/test.csv')
-    y_frame = pd.read_csv('./titanic/gender_submission.csv')
-
-    # 填补空缺值
-    x_frame = x_frame.fillna(method='ffill')  # 待改进
+    tail = (1 - level) / 2 * 100
+    low, high = np.nanpercentile(values, [tail, 100 - tail], axis=0)
+    return low, high
 
-    # 删除不必要特征
-    del x_frame['PassengerId']
-    del x_frame['Cabin']
-    del x_frame['Name']
-    del x_frame['Ticket']
 
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(x_frame.to_dict(orient='record'))
-    x_get = data_get[:, :-1]
-    y_get = y_frame.values[:, 1]
+class BootstrapLogisticRegression(object):
+    """Fit logistic regression on n_bootstrap resamples of the data at once.
 
-    return x_get, y_get
+    Methods:
+        fit     -- draw the resamples and train every model
+        predict -- majority vote of the models
+        score   -- accuracy of predict
 
-
-class LogisticRegression(object):
-    """Do logistic regression to predict 0 or 1.
-
-    Contains normalize, forward prop, cost function, back prop, and plot j
-
-    Attribute:
-        images: input data to predict
-        labels: answer
-        rows: rows of images
-        cols: columns of images
-        j: cost
-        j_list: store j for visualize
-        theta: weight of each input
-        predict: the predict of the algorithm
+    Attributes:
+        n_bootstrap, epoch, alpha, batch, tol: see the module constants
+        coef_: (n_bootstrap, features + 1) params of every model (on standardized x, bias first)
+        oob_accuracy_: (n_bootstrap,) accuracy of each model on its out-of-bag rows
+        oob_score_: accuracy of the majority vote of the models for which a row is out-of-bag
+        n_iter_: epochs run by each batch of models
     """
-
-    def __init__(self, images, labels):
-        self.images = images
-        self.labels = labels
-        self.rows, self.cols = np.shape(images)
-        self.j = 999
-        self.j_list = []
-        self.theta = np.random.random(((self.cols + 1), 1))
-        self.predict = np.zeros((self.rows, 1))
-
-    def normalize(self):
-        """turn images into numbers near 0
-        """
-
-        # reshape data
-        self.images = np.hstack((np.ones((self.rows, 1)), self.images))  # 加一列1
-        self.labels = self.labels.reshape((self.rows, 1))
-
-        # norm
-        average = np.mean(self.images, axis=0)
-        std = np.std(self.images, axis=0)
-        for m in range(self.cols):
-            if std[m] == 0:
-                continue
-            else:
-                self.images[:, m] = (self.images[:, m] - average[m]) / std[m]
-        return 0
-
-    def cost_function(self):
-        """calculate cost j for visualization"""
-        self.j = -1 / self.rows * (np.sum((self.labels * np.log(self.predict)), axis=0)
-                                   + np.sum(((1 - self.labels) * np.log(1 - self.predict)), axis=0))
-        self.j_list.append(self.j)
-        return 0
-
-    def back(self):
-        """do backprop to adjust theta"""
-        grad = AlPHA / self.rows * np.dot(self.images.T, (self.predict - self.labels))
-        self.theta = self.theta - grad
-        return 0
-
-    def plot_j(self):
-        """Visualize the decline of j"""
-        plt.scatter(range(EPOCH), self.j_list, linewidths=0.01, c="r")
-        plt.show()
+    def __init__(self, n_bootstrap=ITER, epoch=EPOCH, alpha=AlPHA, batch=BATCH, tol=TOL, random_state=None):
+        self.n_bootstrap = n_bootstrap
+        self.epoch = epoch
+        self.alpha = alpha
+        self.batch = batch
+        self.tol = tol
+        self.random_state = random_state
+        self.coef_ = None
+        self.oob_accuracy_ = None
+        self.oob_score_ = None
+        self.n_iter_ = []
+        self.__scaler = None
+
+    def __normalize(self, x_norm):
+        """standardize with the scaler fitted on the whole data, add a column of 1"""
+        return np.hstack((np.ones((np.size(x_norm, axis=0), 1)), self.__scaler.transform(x_norm)))
+
+    def fit(self, x_in, y_in):
+        """Draw every resample and fit the models, batch models at a time."""
+
+        rng = np.random.RandomState(self.random_state)
+        rows = np.size(x_in, axis=0)
+        # 标准化只影响收敛速度, 所以用全部数据拟合一次, 所有模型共用
+        self.__scaler = Standardizer().fit(x_in)
+        x_norm = self.__normalize(x_in)
+        y_in = np.asarray(y_in, dtype=np.float64).reshape((rows, 1))
+
+        self.coef_ = np.empty((self.n_bootstrap, np.size(x_norm, axis=1)))
+        self.oob_accuracy_ = np.empty(self.n_bootstrap)
+        self.n_iter_ = []
+        votes = np.zeros(rows)
+        oob_count = np.zeros(rows)
+
+        for start in range(0, self.n_bootstrap, self.batch):
+            size = min(self.batch, self.n_bootstrap - start)
+
+            # 每个模型每行被抽到的次数, (rows, size)
+            counts = rng.multinomial(rows, np.full(rows, 1 / rows), size=size).T
+            params = self.__fit_batch(x_norm, y_in, counts / rows)
+            self.coef_[start:start + size] = params.T
+
+            # 没被抽到的行(oob)用来打分
+            oob = counts == 0
+            predict = (x_norm @ params >= np.log(SCALE / (1 - SCALE)))
+            correct = predict == (y_in == 1)
+            self.oob_accuracy_[start:start + size] = \
+                np.sum(correct & oob, axis=0) / np.maximum(np.sum(oob, axis=0), 1) * 100
+            votes += np.sum(predict & oob, axis=1)
+            oob_count += np.sum(oob, axis=1)
+
+        seen = oob_count > 0
+        self.oob_score_ = np.mean((votes[seen] / oob_count[seen] >= 0.5) == (y_in[seen, 0] == 1)) * 100
+        return self
+
+    def __fit_batch(self, x_norm, y_in, weight):
+        """Gradient descent of size models at once; weight is (rows, size), counts / rows."""
+
+        params = np.zeros((np.size(x_norm, axis=1), np.size(weight, axis=1)))
+        for epoch in range(self.epoch):
+            y_get = 1 / (1 + np.exp(-(x_norm @ params)))
+            grad = x_norm.T @ (weight * (y_get - y_in))
+            params -= self.alpha * grad
+            if self.tol is not None and np.max(np.sqrt(np.sum(grad * grad, axis=0))) < self.tol:
+                break
+        self.n_iter_.append(epoch + 1)
+        return params
+
+    def predict(self, x_pre):
+        """Majority vote of the n_bootstrap models."""
+
+        logit = self.__normalize(x_pre) @ self.coef_.T
+        votes = np.mean(logit >= np.log(SCALE / (1 - SCALE)), axis=1)
+        return (votes >= 0.5).astype(np.float64).reshape(-1, 1)
+
+    def score(self, x_score, y_score):
+        """Returns the mean accuracy on the given test data and labels."""
+
+        accuracy = np.mean(self.predict(x_score).ravel() == np.ravel(y_score)) * 100
+        print("acc:            %.4f%%" % accuracy)
         return 0
 
-    def forward(self):
-        """forward prop with sigmoid"""
-        self.predict = 1 / (1 + np.exp(-np.dot(self.images, self.theta)))
-        return 0
-
-
-def acc_cross():
-    """计算acc"""
-
-    count = 0
-    predict_copy2 = np.zeros((logistic_regression_test.rows, 1))
-
-    for j in range(logistic_regression_test.rows):
-
-        # 处理predict
-        if logistic_regression_test.predict[j] < 0.5:
-            predict_copy2[j] = 0
-        else:
-            predict_copy2[j] = 1
-        if predict_copy2[j] == label_boot[j]:
-            count = count + 1
-
-    accu = count / logistic_regression.rows * 100
-    return accu
-
 
 # 自助法
-x, y = load_train()
-acc_add = 0
-
-for i in range(ITER):
-
-    data_boot = np.zeros_like(x)
-    label_boot = np.zeros_like(y)
-
-    # 随机取出
-    for k in range(np.size(x, axis=0)):
-        random_int = np.random.randint(low=0, high=(np.size(x, axis=0) - 1))
-        label_boot[k] = y[random_int]
-        data_boot[k] = x[random_int, :]
-
-    # train
-    logistic_regression = LogisticRegression(x, y)
-    logistic_regression.normalize()
-
-    for epoch in range(EPOCH):
-        logistic_regression.forward()
-        logistic_regression.cost_function()
-        logistic_regression.back()
-
-    logistic_regression_test = LogisticRegression(data_boot, label_boot)
-    logistic_regression_test.normalize()
-    logistic_regression_test.forward()
-    accu_out = acc_cross()
-    acc_add = acc_add + accu_out
-
-print("ACC: %.2f%%" % (acc_add / ITER))
\ No newline at end of file
+if __name__ == "__main__":
+    x, y = load_train()
+    start_time = time.perf_counter()
+    clf = BootstrapLogisticRegression(random_state=0).fit(x, y)
+    print("%d models in %.2fs" % (clf.n_bootstrap, time.perf_counter() - start_time))
+
+    low, high = percentile_interval(clf.oob_accuracy_)
+    print("oob ACC: %.2f%% (%d%% interval %.2f%% - %.2f%%) | vote oob ACC: %.2f%%"
+          % (np.mean(clf.oob_accuracy_), LEVEL * 100, low, high, clf.oob_score_))
+    low, high = percentile_interval(clf.coef_)
+    names = ['bias'] + load_matrix('./titanic/train.csv')[1][:np.size(x, axis=1)]
+    for name, value, l, h in zip(names, np.mean(clf.coef_, axis=0), low, high):
+        print("%-12s %8.4f  [%8.4f, %8.4f]" % (name, value, l, h))
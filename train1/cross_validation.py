@@ -1,191 +1,159 @@
+"""(Repeated, stratified) k-fold cross-validation on a process pool.
+
+Each repeat draws one permutation and orders the rows fold by fold, so every
+fold is a contiguous block. The permuted data is written twice, one copy after
+the other, into shared memory. Fold k is then rows [start, stop) and its
+training set is rows [stop, start + n), so both are views: no row is copied
+per fold and no fold is pickled to the workers.
+
+    results = cross_validate(LogisticRegression, x, y)
+
+Any estimator works: make_estimator() must return an object with fit(x, y)
+and predict(x), and must be picklable (a class or a functools.partial).
+"""
+import os
+import sys
+import io
+import time
+import contextlib
+import multiprocessing
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # fit() 里的 plt.show() 不弹窗
 import matplotlib.pyplot as plt
-import pandas as pd
-from sklearn.feature_extraction import DictVectorizer
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'train2'))
+from feature_store import load_train
+import shared_data
+from shared_data import SharedArrays
+from Logistic_Regression import LogisticRegression
 
 # 超参
-EPOCH = 3000
-LAMBDA = 0
-AlPHA = 0.01
 FOLD = 10
 ITER = 10
+WORKERS = None       # 进程数, None: os.cpu_count()
 
+# worker 里的估计器工厂
+_MAKE_ESTIMATOR = None
 
-def load_train():
-    """Load titanic train data and process into vectorized martix.
 
-    Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-
-    """
-    data_frame = pd.read_csv('./titanic/train.csv')
-
-    # 填补空缺值
-    data_frame = data_frame.fillna(method='ffill')  # 待改进
-
-    # 删除不必要特征
-    del data_frame['PassengerId']
-    del data_frame['Cabin']
-    del data_frame['Name']
-    del data_frame['Ticket']
-
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(data_frame.to_dict(orient='record'))
-
-    x_get = data_get[:, :-2]
-    y_get = data_get[:, -1]
-    return x_get, y_get
+def fold_order(y_in, n_folds=FOLD, stratify=True, random_state=None):
+    """One permutation of the rows with every fold contiguous.
 
-
-def load_test():
-    """Load titanic test data and process into vectorized martix.
+    Parameters:
+        y_in: labels (only used when stratify)
+        stratify: every fold gets the same share of each label (to within one row)
 
     Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-
+        order: permutation of range(n), rows of fold k are order[bounds[k]:bounds[k + 1]]
+        bounds: (n_folds + 1,) fold boundaries
     """
-    x_frame = pd.read_csv('./titanic/test.csv')
-    y_frame = pd.read_csv('./titanic/gender_submission.csv')
-
-    # 填补空缺值
-    x_frame = x_frame.fillna(method='ffill')  # 待改进
-
-    # 删除不必要特征
-    del x_frame['PassengerId']
-    del x_frame['Cabin']
-    del x_frame['Name']
-    del x_frame['Ticket']
+    rng = np.random.RandomState(random_state)
+    rows = np.size(y_in, axis=0)
+    if n_folds < 2 or n_folds > rows:
+        raise ValueError('n_folds must be between 2 and the number of rows, got %d' % n_folds)
+
+    order = rng.permutation(rows)
+    if stratify:
+        # 按label排好后轮流分到各折, 每折每类的行数最多差一
+        order = order[np.argsort(np.ravel(y_in)[order], kind='stable')]
+    fold = np.arange(rows) % n_folds
+    # 按折排序, 折内再打乱(不然逐行训练的模型会先看到一整类)
+    order = order[np.lexsort((rng.random_sample(rows), fold))]
+    bounds = np.zeros(n_folds + 1, dtype=np.intp)
+    np.cumsum(np.bincount(fold, minlength=n_folds), out=bounds[1:])
+    return order, bounds
+
+
+def _init_worker(specs, make_estimator):
+    """Pool initializer: attach the shared data and keep the estimator factory."""
+
+    global _MAKE_ESTIMATOR
+    shared_data.attach(specs)
+    _MAKE_ESTIMATOR = make_estimator
+    return 0
+
+
+def _run_fold(task):
+    """Fit on the views of one fold and score on its held-out block."""
+
+    repeat, fold, start, stop, seed = task
+    np.random.seed(seed)
+    x_in, y_in = shared_data.ARRAYS['x'], shared_data.ARRAYS['y']
+    rows = np.size(x_in, axis=0) // 2
+    record = {'repeat': repeat, 'fold': fold, 'train_rows': int(rows - (stop - start)), 'test_rows': int(stop - start)}
+
+    clf = _MAKE_ESTIMATOR()
+    # 训练时的输出不计入
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+        # x是只读视图; y很小, 复制一份(有的模型会原地改y)
+        clf = clf.fit(x_in[stop:start + rows], np.array(y_in[stop:start + rows]))
+        record['fit_s'] = time.perf_counter() - start_time
+    plt.close('all')
+
+    start_time = time.perf_counter()
+    y_pred = clf.predict(x_in[start:stop])
+    record['predict_s'] = time.perf_counter() - start_time
+    record['accuracy'] = float(np.mean(np.ravel(y_pred) == y_in[start:stop]) * 100)
+    return record
+
+
+def cross_validate(make_estimator, x_in, y_in, n_folds=FOLD, n_repeats=ITER, stratify=True, workers=WORKERS,
+                   random_state=0):
+    """Repeated (stratified) k-fold cross-validation, folds trained in parallel.
+
+    Parameters:
+        make_estimator: picklable callable returning a new estimator with fit / predict
+        x_in, y_in: data, labels
+        n_folds: folds per repeat
+        n_repeats: repeats, each with a new permutation
+        stratify: keep the label distribution in every fold
+        workers: processes, None for os.cpu_count()
+        random_state: seed of the permutations and of the estimators
 
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(x_frame.to_dict(orient='record'))
-    x_get = data_get[:, :-1]
-    y_get = y_frame.values[:, 1]
+    Returns:
+        list of dicts, one per (repeat, fold): accuracy, fit_s, predict_s,
+        train_rows, test_rows
+    """
+    x_in = np.asarray(x_in, dtype=np.float64)
+    y_in = np.ravel(y_in).astype(np.float64)
+    rows = np.size(x_in, axis=0)
+    rng = np.random.RandomState(random_state)
 
-    return x_get, y_get
+    results = []
+    with SharedArrays(x=((2 * rows,) + x_in.shape[1:], np.float64), y=((2 * rows,), np.float64)) as shared:
+        x_shared, y_shared = shared.arrays['x'], shared.arrays['y']
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(shared.specs, make_estimator)) as pool:
+            for repeat in range(n_repeats):
+                order, bounds = fold_order(y_in, n_folds, stratify, rng.randint(2 ** 31))
 
+                # 写两遍, 每折的训练集都是连续的一段
+                np.take(x_in, order, axis=0, out=x_shared[:rows])
+                x_shared[rows:] = x_shared[:rows]
+                np.take(y_in, order, out=y_shared[:rows])
+                y_shared[rows:] = y_shared[:rows]
 
-class LogisticRegression(object):
-    """Do logistic regression to predict 0 or 1.
+                # 这一轮的折全部结束后才能覆盖共享数据
+                tasks = [(repeat, k, bounds[k], bounds[k + 1], rng.randint(2 ** 31)) for k in range(n_folds)]
+                results.extend(pool.map(_run_fold, tasks, chunksize=1))
+        del x_shared, y_shared
+    return results
 
-    Contains normalize, forward prop, cost function, back prop, and plot j
 
-    Attribute:
-        images: input data to predict
-        labels: answer
-        rows: rows of images
-        cols: columns of images
-        j: cost
-        j_list: store j for visualize
-        theta: weight of each input
-        predict: the predict of the algorithm
-    """
+def summarize(results):
+    """Print mean / std accuracy and the time spent fitting."""
 
-    def __init__(self, images, labels):
-        self.images = images
-        self.labels = labels
-        self.rows, self.cols = np.shape(images)
-        self.j = 999
-        self.j_list = []
-        self.theta = np.random.random(((self.cols + 1), 1))
-        self.predict = np.zeros((self.rows, 1))
-
-    def normalize(self):
-        """turn images into numbers near 0
-        """
-
-        # reshape data
-        self.images = np.hstack((np.ones((self.rows, 1)), self.images))  # 加一列1
-        self.labels = self.labels.reshape((self.rows, 1))
-
-        # norm
-        average = np.mean(self.images, axis=0)
-        std = np.std(self.images, axis=0)
-        for m in range(self.cols):
-            if std[m] == 0:
-                continue
-            else:
-                self.images[:, m] = (self.images[:, m] - average[m]) / std[m]
-        return 0
-
-    def cost_function(self):
-        """calculate cost j for visualization"""
-        self.j = -1 / self.rows * (np.sum((self.labels * np.log(self.predict)), axis=0)
-                                   + np.sum(((1 - self.labels) * np.log(1 - self.predict)), axis=0))
-        self.j_list.append(self.j)
-        return 0
-
-    def back(self):
-        """do backprop to adjust theta"""
-        grad = AlPHA / self.rows * np.dot(self.images.T, (self.predict - self.labels))
-        self.theta = self.theta - grad
-        return 0
-
-    def plot_j(self):
-        """Visualize the decline of j"""
-        plt.scatter(range(EPOCH), self.j_list, linewidths=0.01, c="r")
-        plt.show()
-        return 0
-
-    def forward(self):
-        """forward prop with sigmoid"""
-        self.predict = 1 / (1 + np.exp(-np.dot(self.images, self.theta)))
-        return 0
-
-
-def acc_cross():
-    """计算acc"""
-
-    count = 0
-    predict_copy2 = np.zeros((logistic_regression_test.rows, 1))
-
-    for j in range(logistic_regression_test.rows):
-
-        # 处理predict
-        if logistic_regression_test.predict[j] < 0.5:
-            predict_copy2[j] = 0
-        else:
-            predict_copy2[j] = 1
-        if predict_copy2[j] == label_fold[j]:
-            count = count + 1
-
-    accu = count / logistic_regression.rows * 100
-    return accu
+    accuracy = np.array([record['accuracy'] for record in results])
+    fit_s = np.array([record['fit_s'] for record in results])
+    print("folds: %d | ACC: %.2f%% +- %.2f%% | fit: %.3fs per fold, %.3fs total"
+          % (len(results), np.mean(accuracy), np.std(accuracy), np.mean(fit_s), np.sum(fit_s)))
+    return 0
 
 
 # 10次10折交叉验证法
-x, y = load_train()
-in_fold = (np.size(x, axis=0) - (np.size(x, axis=0) % FOLD)) / FOLD
-acc_add = 0
-
-for i in range(ITER):
-
-    # 取出一折
-    test_fold = np.zeros((FOLD, np.size(x, axis=1)))
-    label_fold = np.zeros((FOLD, 1))
-    for k in range(FOLD):
-        random_int = np.random.randint(low=0, high=(np.size(x, axis=0) - 1 - k))
-        label_fold[k] = y[random_int]
-        test_fold[k] = x[random_int, :]
-        x = np.delete(x, random_int, axis=0)
-        y = np.delete(y, random_int, axis=0)
-
-    # train
-    logistic_regression = LogisticRegression(x, y)
-    logistic_regression.normalize()
-
-    for epoch in range(EPOCH):
-        logistic_regression.forward()
-        logistic_regression.cost_function()
-        logistic_regression.back()
-
-    logistic_regression_test = LogisticRegression(test_fold, label_fold)
-    logistic_regression_test.normalize()
-    logistic_regression_test.forward()
-    accu_out = acc_cross()
-    acc_add = acc_add + accu_out
-
-print("ACC: %.2f%%" % (acc_add / ITER * 100))
+if __name__ == "__main__":
+    x, y = load_train()
+    start_wall = time.perf_counter()
+    report = cross_validate(LogisticRegression, x, y)
+    summarize(report)
+    print("wall: %.3fs" % (time.perf_counter() - start_wall))
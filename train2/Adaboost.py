@@ -1,97 +1,57 @@
 import numpy as np
-import pandas as pd
 # from tqdm import tqdm
-from sklearn.feature_extraction import DictVectorizer
 
 # 引用三个算法
 from Linear_SVM import LinearSVM
 from CART import CartDecisionTree
 from Logistic_Regression import LogisticRegression
+from feature_store import leave_out
 
 # 超参
 Adaboost_EPOCH = 15
-
-
-def leave_out():
-    """Divide data into 70% for train and 30% for test.
-
-    Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-        x_get_train: matrix, data
-        y_get_train: matrix, label
-
-    """
-    data_frame = pd.read_csv('./titanic/train.csv')
-
-    # 填补空缺值
-    data_frame = data_frame.fillna(method='ffill')  # 待改进
-
-    # 删除不必要特征
-    del data_frame['PassengerId']
-    del data_frame['Cabin']
-    del data_frame['Name']
-    del data_frame['Ticket']
-
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(data_frame.to_dict(orient='record'))
-
-    leave_num = int((np.size(data_get, axis=0) - (np.size(data_get, axis=0) % 10)) / 10 * 7)
-    x_get = data_get[:leave_num, :-2]
-    y_get = data_get[:leave_num, -1]
-    x_test_get = data_get[(leave_num + 1):, :-2]
-    y_test_get = data_get[(leave_num + 1):, -1]
-    return x_get, y_get, x_test_get, y_test_get
+EPS = 1e-10          # 加权误差截到 [EPS, 1 - EPS], 完全分对时 log 不除0
 
 
 def adaboost(x_ada, y_ada, x_test_in, y_test_in):
     # 初始化权重
     weight = np.ones((np.size(x_ada, axis=0), 1))
     weight /= np.size(x_ada, axis=0)
+    y_column = np.reshape(y_ada, (-1, 1))   # 和 predict 的 (rows, 1) 对齐
     weight_list = []
     classifier_list = []
 
     # 训练算法
     clf1 = LogisticRegression().fit(x_ada, y_ada)
-    predict1 = clf1.predict(x_ada, y_ada)
+    predict1 = np.reshape(clf1.predict(x_ada), (-1, 1))
     clf2 = LinearSVM().fit(x_ada, y_ada)
-    predict2 = clf2.predict(x_ada, y_ada)
+    predict2 = np.reshape(clf2.predict(x_ada), (-1, 1))
     clf3 = CartDecisionTree().fit(x_ada, y_ada)
-    predict3 = clf3.predict(x_ada, y_ada)
+    predict3 = np.reshape(clf3.predict(x_ada), (-1, 1))
 
     # 组合分类器
     for i in range(Adaboost_EPOCH):
-        e1 = 0
-        e2 = 0
-        e3 = 0
-
-        # 计算误差
-        for j in range(np.size(x_ada, axis=0)):
-            if predict1[j] != y_ada[j]:
-                e1 += weight[j]
-            if predict2[j] != y_ada[j]:
-                e2 += weight[j]
-            if predict3[j] != y_ada[j]:
-                e3 += weight[j]
+        # 计算误差: 分错的行的权重之和
+        e1 = np.clip(np.sum(weight[predict1 != y_column]), EPS, 1 - EPS)
+        e2 = np.clip(np.sum(weight[predict2 != y_column]), EPS, 1 - EPS)
+        e3 = np.clip(np.sum(weight[predict3 != y_column]), EPS, 1 - EPS)
 
         # 选择小误差的模型
-        if e1[0] <= e2[0] and e1[0] <= e3[0]:
+        if e1 <= e2 and e1 <= e3:
             clf = clf1
-            a = 1 / 2 * np.log((1 - e1[0]) / e1[0])
+            a = 1 / 2 * np.log((1 - e1) / e1)
             predict = predict1
-        elif e2[0] <= e1[0] and e2[0] <= e3[0]:
+        elif e2 <= e1 and e2 <= e3:
             clf = clf2
-            a = 1 / 2 * np.log((1 - e2[0]) / e2[0])
+            a = 1 / 2 * np.log((1 - e2) / e2)
             predict = predict2
         else:
             clf = clf3
-            a = 1 / 2 * np.log((1 - e3[0]) / e3[0])
+            a = 1 / 2 * np.log((1 - e3) / e3)
             predict = predict3
 
         # 更新权重
-        z = np.sum(np.exp(-a * (y_ada - 0.5) * (predict - 0.5) * 4), axis=0)      # x, y化成０或１
-        weight = weight * np.exp(-a * (y_ada - 0.5) * (predict - 0.5) * 4) / z
+        z = np.sum(np.exp(-a * (y_column - 0.5) * (predict - 0.5) * 4), axis=0)      # x, y化成０或１
+        weight = weight * np.exp(-a * (y_column - 0.5) * (predict - 0.5) * 4) / z
         weight_list.append(a)
         classifier_list.append(clf)
 
@@ -100,7 +60,7 @@ def adaboost(x_ada, y_ada, x_test_in, y_test_in):
     predict_get = np.zeros_like(y_test_in)
     acc_count = 0
     for l in range(Adaboost_EPOCH):
-        predict_sum += weight_list[l] * (classifier_list[l].predict(x_test_in, y_test_in) - 0.5) * 2
+        predict_sum += weight_list[l] * (np.ravel(classifier_list[l].predict(x_test_in)) - 0.5) * 2
     for k in range(np.size(y_test_in, axis=0)):
         if predict_sum[k] / Adaboost_EPOCH >= 0:
             predict_get[k] = 1
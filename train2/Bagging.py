@@ -1,44 +1,10 @@
 import numpy as np
-import pandas as pd
-from sklearn.feature_extraction import DictVectorizer
 
 # 引用三个算法
 from Linear_SVM import LinearSVM
 from CART import CartDecisionTree
 from Logistic_Regression import LogisticRegression
-
-
-def leave_out():
-    """Divide data into 70% for train and 30% for test.
-
-    Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-        x_get_train: matrix, data
-        y_get_train: matrix, label
-
-    """
-    data_frame = pd.read_csv('./titanic/train.csv')
-
-    # 填补空缺值
-    data_frame = data_frame.fillna(method='ffill')  # 待改进
-
-    # 删除不必要特征
-    del data_frame['PassengerId']
-    del data_frame['Cabin']
-    del data_frame['Name']
-    del data_frame['Ticket']
-
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(data_frame.to_dict(orient='record'))
-
-    leave_num = int((np.size(data_get, axis=0) - (np.size(data_get, axis=0) % 10)) / 10 * 7)
-    x_get = data_get[:leave_num, :-2]
-    y_get = data_get[:leave_num, -1]
-    x_test_get = data_get[(leave_num + 1):, :-2]
-    y_test_get = data_get[(leave_num + 1):, -1]
-    return x_get, y_get, x_test_get, y_test_get
+from feature_store import leave_out
 
 
 def bagging(x_in, y_in, x_test_in, y_test_in):
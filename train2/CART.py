@@ -1,348 +1,557 @@
+import os
+import heapq
+from multiprocessing.pool import ThreadPool
 import numpy as np
-import pandas as pd
-from sklearn.feature_extraction import DictVectorizer
+from feature_store import leave_out
 
+# 超参(默认值, 每个实例可以单独设置)
+MAX_DEPTH = None             # 最大深度, None: 不限
+MIN_SAMPLES_SPLIT = 2        # 少于这么多行的节点不再分
+MIN_IMPURITY_DECREASE = 0    # 分裂要求的最小 (节点行数 / 总行数) * gini增量
+MAX_LEAF_NODES = None        # 最多几个叶子, 设了就按增量从大到小(best-first)生长
+MAX_FEATURES = None          # 每次分裂随机看几列: None 全部, 'sqrt', 整数, 或 (0, 1] 的比例
+MAX_BINS = None              # 每列最多分成几箱(<= 256)在直方图上找分裂点, None: 在排好序的原值上找
+WORKERS = 1                  # 找分裂点的线程数, None: os.cpu_count()
+PARALLEL_CELLS = 2 ** 18     # 节点的 行数*列数 不到这么多时不值得分给线程
+LEVELS = 4                   # apply 每下降几层去掉一次已经到叶子的行
 
-def leave_out():
-    """Divide data into 70% for train and 30% for test.
 
-    Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-        x_get_train: matrix, data
-        y_get_train: matrix, label
-
-    """
-    data_frame = pd.read_csv('titanic/train.csv')
-
-    # 填补空缺值
-    data_frame = data_frame.fillna(method='ffill')  # 待改进
+def quantize(x_in, max_bins):
+    """每列分箱一次
 
-    # 删除不必要特征
-    del data_frame['PassengerId']
-    del data_frame['Cabin']
-    del data_frame['Name']
-    del data_frame['Ticket']
+    CartDecisionTree(max_bins=max_bins).fit(x, y, bins=quantize(x, max_bins)) 和 fit(x, y) 建出同一棵树,
+    几棵树用同一个 x 时只需分箱一次.
 
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(data_frame.to_dict(orient='record'))
-
-    leave_num = int((np.size(data_get, axis=0) - (np.size(data_get, axis=0) % 10)) / 10 * 7)
-    x_get = data_get[:leave_num, :-2]
-    y_get = data_get[:leave_num, -1]
-    x_test_get = data_get[(leave_num + 1):, :-2]
-    y_test_get = data_get[(leave_num + 1):, -1]
-    return x_get, y_get, x_test_get, y_test_get
+    Returns:
+        bins: (rows, features) uint8 箱号, 按列存储
+        edges: (features, max_bins) 每箱的下界(都是原数据里的值), 没用到的箱是 inf;
+               箱号 >= b 就是 x >= edges[:, b]
+    """
+    if not 2 <= max_bins <= 256:
+        raise ValueError('max_bins must be between 2 and 256, got %r' % max_bins)
+
+    x_in = np.asarray(x_in, dtype=np.float64)
+    rows, features = np.shape(x_in)
+    bins = np.empty((rows, features), dtype=np.uint8, order='F')
+    edges = np.full((features, max_bins), np.inf)
+    for i in range(features):
+        kinds = np.unique(x_in[:, i])
+        if len(kinds) > max_bins:
+            kinds = np.unique(np.quantile(x_in[:, i], np.linspace(0, 1, max_bins, endpoint=False), method='lower'))
+        edges[i, :len(kinds)] = kinds
+        bins[:, i] = np.searchsorted(kinds, x_in[:, i], side='right') - 1
+    return bins, edges
 
 
 class CartDecisionTree(object):
     """Cart Decision Tree.
 
+    The builder works on one training matrix and one array of row indices.
+    A node is a range [start, end) of that array, and splitting it reorders
+    the range in place (like quicksort), so no rows are copied.
+
+    Nodes waiting to be split are kept on an explicit stack (depth first),
+    or, with max_leaf_nodes, on a heap so the split with the largest
+    weighted gain is made first. There is no recursion, and max_depth,
+    min_samples_split, min_impurity_decrease and max_leaf_nodes bound the
+    size of the tree.
+
+    The fitted tree is a set of parallel arrays indexed by node id (the root
+    is 0, children have larger ids than their parent), so predict moves all
+    rows down one level per step with fancy indexing instead of walking the
+    tree row by row.
+
+    With max_bins, every column is quantized once into at most max_bins
+    uint8 bins (edges at quantiles of the column, each value its own bin if
+    there are few enough). Split search then runs on per-node histograms of
+    (feature, bin, class) counts, O(rows + bins) per node instead of a sort,
+    and only the smaller child's histogram is counted: the larger one is
+    the parent's minus it. The training matrix is kept as uint8 only.
+
+    With workers > 1, the columns of a large node are searched (or counted
+    into the histogram) by a thread pool in blocks; numpy's sorts, cumsums
+    and gathers release the GIL. Blocks are merged in column order, so the
+    tree is the same for any number of workers.
+
+    With max_features, every split only looks at a random subset of the
+    columns (the rest are searched too if all the chosen ones are constant
+    in the node), as in a random forest; fit can also be given the rows to
+    train on, repeats allowed, so a bootstrap sample needs no copy of x.
+
     Methods:
         fit     -- build the tree with given data
         score   -- return the acc predicted by the tree
         predict -- return label
+        predict_proba -- return the share of label 1 in the leaf of each row
+        apply   -- return the leaf id of each row
 
     Attributes:
-        value: chosen split value
-        truebranch, falsebranch: binary branches which the data are divided into each time
-        col: the chosen column
-        summary: details of each point
-        current_gain: gini of data before split
-        data: store data
-        result: store labels
-        prune: if prune == 1:剪枝 每次+1
-
+        max_depth, min_samples_split, min_impurity_decrease, max_leaf_nodes: growth limits,
+            default to the module constants
+        max_features: columns tried per split, None for all of them
+        random_state: seed of the column subsets
+        max_bins: bins per column for the histogram split search, None for the exact search
+        workers: threads searching the columns of one node, None for os.cpu_count()
+        prune: apply Reduced-Error Pruning after building
+        classes_: the classes, counts_[:, k] is the count of classes_[k]
+        feature_: the chosen column of each node, -1 for leaves
+        threshold_: chosen split value, rows with x[feature] >= threshold go to true_
+        true_, false_: ids of the two branches, -1 for leaves
+        value_: label of each node (majority class of its training rows)
+        counts_: (nodes, classes) number of training rows of each class in each node
+        impurity_: gini of each node before split
     """
-    def __init__(self, value=None, truebranch=None, falsebranch=None, col=-1, summary=None, result=None, data=None):
-        self.value = value
-        self.truebranch = truebranch
-        self.falsebranch = falsebranch
-        self.col = col
-        self.summary = summary
-        self.current_gain = 0
-        self.result = result
-        self.prune = 0
-        self.data = data
-
-    def fit(self, x_in, y_in):
+    def __init__(self, max_depth=MAX_DEPTH, min_samples_split=MIN_SAMPLES_SPLIT,
+                 min_impurity_decrease=MIN_IMPURITY_DECREASE, max_leaf_nodes=MAX_LEAF_NODES,
+                 max_features=MAX_FEATURES, random_state=None, max_bins=MAX_BINS, workers=WORKERS, prune=True):
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        self.min_impurity_decrease = min_impurity_decrease
+        self.max_leaf_nodes = max_leaf_nodes
+        self.max_features = max_features
+        self.random_state = random_state
+        self.max_bins = max_bins
+        self.workers = workers
+        self.prune = prune
+        self.classes_ = None
+        self.feature_ = None
+        self.threshold_ = None
+        self.true_ = None
+        self.false_ = None
+        self.value_ = None
+        self.counts_ = None
+        self.impurity_ = None
+        self.__x = None
+        self.__bins = None
+        self.__edges = None
+        self.__codes = None
+        self.__samples = None
+        self.__nodes = None
+        self.__rng = None
+        self.__candidates = None
+        self.__pool = None
+        self.__blocks = None
+        self.__step = None
+
+    def fit(self, x_in, y_in, samples=None, bins=None):
         """build the tree by x_in and y_in
 
-        递归__build_tree,建成决策树
+        __build_tree 建成决策树, 剪枝, 再转成数组
+
+        Parameters:
+            samples: rows of x_in / y_in to train on, may repeat (bootstrap); None for all rows.
+                     classes_ always comes from all of y_in
+            bins: (bins, edges) = quantize(x_in, max_bins), max_bins only; x_in is not read then
         """
+        if self.max_leaf_nodes is not None and self.max_leaf_nodes < 2:
+            raise ValueError('max_leaf_nodes must be at least 2, got %r' % self.max_leaf_nodes)
+        if bins is not None and (self.max_bins is None or np.size(bins[1], axis=1) != self.max_bins):
+            raise ValueError('bins must come from quantize(x_in, max_bins) with max_bins=%r' % self.max_bins)
+
+        # 所有节点共用的训练数据(分箱时只留uint8的箱号), label 编成 0..类别数-1
+        if self.max_bins is None:
+            self.__x = np.asarray(x_in, dtype=np.float64)
+        elif bins is None:
+            self.__bins, self.__edges = quantize(x_in, self.max_bins)
+        else:
+            self.__bins, self.__edges = bins
+        self.classes_, self.__codes = np.unique(np.ravel(y_in), return_inverse=True)
+        if samples is None:
+            self.__samples = np.arange(np.size(self.__codes, axis=0))
+        else:
+            self.__samples = np.array(samples, dtype=np.intp)  # 会被原地重排, 复制一份
+        # 每个节点一行: [feature, threshold, true, false, impurity, counts]
+        self.__nodes = []
+        # 线程池, 列分成 2*线程数 块, 块内串行
+        workers = os.cpu_count() if self.workers is None else self.workers
+        features = np.size(self.__x if self.__x is not None else self.__bins, axis=1)
+        self.__candidates = self.__n_candidates(features)
+        self.__rng = np.random.RandomState(self.random_state)
+        if workers > 1 and features > 1:
+            self.__pool = ThreadPool(workers)
+            self.__blocks = 2 * workers
+        try:
+            self.__build_tree()
+            if self.prune:
+                self.__prune()
+            self.__compile()
+        finally:
+            self.__x, self.__codes, self.__samples, self.__nodes = None, None, None, None
+            self.__bins, self.__edges = None, None
+            if self.__pool is not None:
+                self.__pool.close()
+                self.__pool.join()
+            self.__pool, self.__blocks, self.__rng = None, None, None
+        return self
+
+    def __n_candidates(self, features):
+        """max_features -> number of columns tried per split"""
+
+        if self.max_features is None:
+            return features
+        if self.max_features == 'sqrt':
+            number = int(np.sqrt(features))
+        elif isinstance(self.max_features, float) and 0 < self.max_features <= 1:
+            number = int(self.max_features * features)
+        elif isinstance(self.max_features, (int, np.integer)) and self.max_features >= 1:
+            number = int(self.max_features)
+        else:
+            raise ValueError("max_features must be None, 'sqrt', an int >= 1 or a float in (0, 1], got %r"
+                             % (self.max_features,))
+        return min(max(number, 1), features)
 
-        y_in = np.reshape(y_in, (np.size(y_in, axis=0), 1))
-        data_total = np.hstack((x_in, y_in))
-        return self.__build_tree(data_total)
+    def __histogram(self, index):
+        """(features, max_bins, classes) counts of the rows index"""
 
-    def __build_tree(self, data_build):
-        """创建分类树"""
+        classes = len(self.classes_)
+        codes = self.__codes[index]
+        hist = np.empty((np.size(self.__bins, axis=1), self.max_bins, classes), dtype=np.intp)
 
-        # 记录节点信息
-        self.current_gain = self.__gini(data_build)
+        def count(block):
+            for i in block:
+                flat = self.__bins[index, i].astype(np.intp) * classes + codes
+                hist[i] = np.bincount(flat, minlength=self.max_bins * classes).reshape(self.max_bins, classes)
+            return 0
 
-        dic = {'impurity': '%6.3f' % self.current_gain, 'samples': '%d' % np.size(data_build, axis=0)}
-        # 类别完全相同
-        clf1 = self.__type_count(data_build, -1)
-        for c in clf1:
-            if clf1[c] == np.size(data_build, axis=0):
-                return CartDecisionTree(result=c, summary=dic, data=data_build)
+        if self.__parallel(index, len(hist)):
+            self.__pool.map(count, self.__blocks_of(np.arange(len(hist))), chunksize=1)
+        else:
+            count(range(len(hist)))
+        return hist
+
+    def __parallel(self, index, columns):
+        """whether the columns of the node are worth giving to the thread pool"""
+        return self.__pool is not None and columns > 1 and len(index) * columns >= PARALLEL_CELLS
+
+    def __blocks_of(self, columns):
+        """columns cut into self.__blocks contiguous pieces for the threads"""
+        return [block for block in np.array_split(columns, min(len(columns), self.__blocks)) if len(block)]
+
+    def __add_node(self, start, end):
+        """append the rows self.__samples[start:end] as a leaf, returns its id"""
+
+        counts = np.bincount(self.__codes[self.__samples[start:end]], minlength=len(self.classes_))
+        self.__nodes.append([-1, np.nan, -1, -1, self.__gini(counts), counts])
+        return len(self.__nodes) - 1
+
+    def __compile(self):
+        """node list -> parallel arrays"""
+
+        nodes = self.__nodes
+        self.feature_ = np.array([node[0] for node in nodes], dtype=np.intp)
+        self.threshold_ = np.array([node[1] for node in nodes], dtype=np.float64)
+        self.true_ = np.array([node[2] for node in nodes], dtype=np.intp)
+        self.false_ = np.array([node[3] for node in nodes], dtype=np.intp)
+        self.impurity_ = np.array([node[4] for node in nodes], dtype=np.float64)
+        self.counts_ = np.array([node[5] for node in nodes], dtype=np.intp).reshape(len(nodes), len(self.classes_))
+        self.value_ = self.classes_[np.argmax(self.counts_, axis=1)]
+
+        # apply 用: 叶子的两个分支都指向自己, 多走几层也停在叶子上
+        ids = np.arange(len(nodes))
+        leaf = self.feature_ < 0
+        self.__step = (np.where(leaf, 0, self.feature_),
+                       np.where(leaf, np.inf, self.threshold_),
+                       np.column_stack((np.where(leaf, ids, self.false_), np.where(leaf, ids, self.true_))).ravel())
+        return 0
+
+    def __build_tree(self):
+        """创建分类树, 不递归
+
+        frontier 里是找好了分裂点、还没分的节点:
+        (-加权增量, id, start, end, depth, col, value, 箱号, 直方图), 后两项只在分箱时有.
+        深度优先时是栈(先长 true 分支), max_leaf_nodes 时是按加权增量的堆.
+        栈里最多 depth+1 个节点, 直方图留着; 堆可以很大, 不存直方图, 分裂时再数一遍.
+        """
+        best_first = self.max_leaf_nodes is not None
+        binned = self.max_bins is not None
+        rows = len(self.__samples)
+        frontier = []
+        self.__push(frontier, self.__add_node(0, rows), 0, rows, 0, best_first,
+                    self.__histogram(self.__samples) if binned else None)
+
+        leaves = 1
+        while frontier and (not best_first or leaves < self.max_leaf_nodes):
+            item = heapq.heappop(frontier) if best_first else frontier.pop()
+            _, node, start, end, depth, best_col, best_val, cut, hist = item
+            if binned and hist is None:
+                hist = self.__histogram(self.__samples[start:end])
+
+            middle = self.__split_data(start, end, best_val, best_col, cut)
+            true_branch = self.__add_node(start, middle)
+            false_branch = self.__add_node(middle, end)
+            self.__nodes[node][:4] = [best_col, best_val, true_branch, false_branch]
+            leaves += 1
+
+            # 只数小的一边, 大的一边 = 父节点 - 小的一边
+            true_hist, false_hist = None, None
+            if binned and (self.max_depth is None or depth + 1 < self.max_depth):
+                if middle - start <= end - middle:
+                    true_hist = self.__histogram(self.__samples[start:middle])
+                    false_hist = hist - true_hist
+                else:
+                    false_hist = self.__histogram(self.__samples[middle:end])
+                    true_hist = hist - false_hist
+
+            # 栈: 后压的先分
+            self.__push(frontier, false_branch, middle, end, depth + 1, best_first, false_hist)
+            self.__push(frontier, true_branch, start, middle, depth + 1, best_first, true_hist)
+        return 0
+
+    def __push(self, frontier, node, start, end, depth, best_first, hist=None):
+        """find the split of a node and put it on the frontier, unless the node stays a leaf
 
-        # 遍历完所有的特征
-        if self.__feature_end(data_build):
-            return CartDecisionTree(result=self.__major_feature(data_build), summary=dic, data=data_build)
+        hist: the node's histogram when binned
+        """
 
-        # get best gain and split data
-        best_col, best_val, best_gain = self.__choose_best_gain(data_build)
-        data1, data2 = self.__split_data(data_build, best_val, best_col)
+        rows = end - start
+        index = self.__samples[start:end]
+        current_gain, counts = self.__nodes[node][4], self.__nodes[node][5]
 
-        # 空集则结束
-        if isinstance(data1, int):
-            return CartDecisionTree(result=self.__major_feature(data2), summary=dic, data=data_build)
-        elif isinstance(data2, int):
-            return CartDecisionTree(result=self.__major_feature(data1), summary=dic, data=data_build)
+        # 类别完全相同, 太深或太小
+        if np.max(counts) == rows or rows < self.min_samples_split or \
+                (self.max_depth is not None and depth >= self.max_depth):
+            return 0
+
+        # get best gain; 所有列在节点里都是常数时找不到阈值, best_col 是 None
+        features = np.size(self.__x if hist is None else self.__bins, axis=1)
+        if self.__candidates < features:
+            columns = np.sort(self.__rng.choice(features, self.__candidates, replace=False))
+        else:
+            columns = np.arange(features)
+        best_col, best_val, best_gain, cut = self.__choose_best(index, hist, counts, current_gain, columns)
+        if best_col is None and len(columns) < features:  # 选中的列在节点里都是常数, 看剩下的列
+            columns = np.setdiff1d(np.arange(features), columns)
+            best_col, best_val, best_gain, cut = self.__choose_best(index, hist, counts, current_gain, columns)
 
         # stop or not
-        if best_gain > 0:
-            true_branch = self.__build_tree(data1)
-            false_branch = self.__build_tree(data2)
-            return CartDecisionTree(col=best_col, value=best_val, truebranch=true_branch, falsebranch=false_branch,
-                                    summary=dic, data=data_build)
+        weighted_gain = best_gain * rows / len(self.__samples)
+        if best_col is None or best_gain <= 1e-12 or weighted_gain < self.min_impurity_decrease:
+            return 0
+        item = (-weighted_gain, node, start, end, depth, best_col, best_val, cut, None if best_first else hist)
+        if best_first:
+            heapq.heappush(frontier, item)
         else:
-            return CartDecisionTree(result=self.__type_count(data_build, -1), summary=dic, data=data_build)
+            frontier.append(item)
+        return 0
 
-    def __split_data(self, data_split, value, column):
-        """split data by value,column
+    def __split_data(self, start, end, value, column, cut=None):
+        """split the rows [start, end) of self.__samples in place by value,column
 
         Parameters:
-            data_split: data
+            start, end: range of the node in self.__samples
             column: split feature
             value: where to separate feature
+            cut: when binned, the first bin of the true side (bin >= cut is x >= value)
 
         Returns:
-            2 array
+            middle: rows with feature >= value are now [start, middle), the others [middle, end)
         """
-        split1 = 0
-        split2 = 0
-
-        # 数字
-        if isinstance(value, int) or isinstance(value, float):
-            for i in range(np.size(data_split, axis=0)):
-                if data_split[i, column] >= value:
-                    if isinstance(split1, int):  # 第一次满足该条件时,从int变成数组
-                        split1 = data_split[i, :]
-                    else:
-                        split1 = np.vstack((split1, data_split[i, :]))  # 竖着叠加
-                else:
-                    if isinstance(split2, int):
-                        split2 = data_split[i, :]
-                    else:
-                        split2 = np.vstack((split2, data_split[i, :]))
-
-        # 字符
+        index = self.__samples[start:end]
+        if cut is None:
+            mask = self.__x[index, column] >= value
         else:
-            for i in range(np.size(data_split, axis=0)):
-                if data_split[i, column] == value:
-                    if split1 == 0:
-                        split1 = data_split[i, :]
-                    else:
-                        split1 = np.vstack((split1, data_split[i, :]))
-                else:
-                    if split2 == 0:
-                        split2 = data_split[i, :]
-                    else:
-                        split2 = np.vstack((split1, data_split[i, :]))
-
-        # reshape
-        if np.shape(split1) == (10,):
-            split1 = split1.reshape((1, 10))
-        if np.shape(split2) == (10,):
-            split2 = split2.reshape((1, 10))
-        return split1, split2
-
-    def __choose_best_gain(self, data_to_choose):
-        """choose the best gain to decide how to split data"""
-
-        best_gain_in = 0
-        best_val_in = None
-        best_col_in = None
-        for i in range(np.size(data_to_choose, axis=1) - 1):  # 每一列
-            kinds = self.__type_count(data_to_choose, i)
-            for kind in kinds:  # 尝试每一个value
-                data_get1, data_get2 = self.__split_data(data_to_choose, kind, i)
-                if isinstance(data_get1, int) or isinstance(data_get2, int):  # 出现空集
-                    continue
-                gini_get = self.__gini_gain(data_get1, data_get2)
-                if gini_get >= best_gain_in:
-                    best_gain_in = gini_get
-                    best_val_in = kind
-                    best_col_in = i
-        return best_col_in, best_val_in, best_gain_in
+            mask = self.__bins[index, column] >= cut
+        self.__samples[start:end] = np.concatenate((index[mask], index[~mask]))
+        return start + int(np.count_nonzero(mask))
 
-    def __gini(self, x_gini):
-        """计算gini增量."""
+    def __choose_best(self, index, hist, counts, current_gain, columns):
+        """best split among columns: (col, value, gini gain, cut), cut is None unless binned"""
+
+        if hist is not None:
+            return self.__choose_best_bin(hist, counts, current_gain, columns)
+        return self.__choose_best_gain(index, counts, current_gain, columns) + (None,)
+
+    def __choose_best_gain(self, index, counts, current_gain, columns):
+        """choose the best gain to decide how to split data
 
-        clf_x = self.__type_count(x_gini, -1)
-        gini_sum = 0
-        for k in clf_x:
-            gini_sum += (clf_x[k] / np.size(x_gini, axis=0)) ** 2
-        return 1 - gini_sum
+        每一列排序一次, 用累计的类别计数一次算出所有阈值的gini增量, 搜索时不复制数据.
+        """
+        codes = self.__codes[index]
+
+        def search(block):
+            best_gain_in = 0
+            best_val_in = None
+            best_col_in = None
+            for i in block:  # 每一列
+                gini_get, value = self.__best_split_of(self.__x[index, i], codes, counts, current_gain)
+                if value is not None and gini_get > best_gain_in:
+                    best_gain_in = gini_get
+                    best_val_in = value
+                    best_col_in = i
+            return best_col_in, best_val_in, best_gain_in
 
-    def __gini_gain(self, data_in1, data_in2):
-        """calculate gini gain"""
+        if not self.__parallel(index, len(columns)):
+            return search(columns)
 
-        p = np.size(data_in1, axis=0) / (np.size(data_in1, axis=0) + np.size(data_in2, axis=0))  # data1占的比例
-        gain = self.current_gain - p * self.__gini(data_in1) - (1 - p) * self.__gini(data_in2)
-        return gain
+        # 按列的顺序合并, 增量相同时和串行一样取前面的列
+        best = (None, None, 0)
+        for found in self.__pool.map(search, self.__blocks_of(columns), chunksize=1):
+            if found[0] is not None and found[2] > best[2]:
+                best = found
+        return best
 
-    def __type_count(self, data_split, col):
-        """将每个特征与特征出现次数转为字典 {特征值:出现次数}
+    def __best_split_of(self, column, codes, counts, current_gain):
+        """best threshold of one column: (gini gain, value), split is column >= value
 
-        Parameters:
-            data_split: 总数据
-            col: 目标列（一般为-1）
+        排序后第k个阈值左边是前k行, 左右两边的类别计数都由一次 cumsum 得到.
         """
-        if np.shape(data_split) == (10, ):
-            data_split = data_split.reshape((1, 10))
-        clf_data = {}
-        for i in range(np.size(data_split, axis=0)):
-            if data_split[i, col] not in clf_data:
-                clf_data[data_split[i, col]] = 1
-            else:
-                clf_data[data_split[i, col]] += 1
-        return clf_data
-
-    def __major_feature(self, data_in):
-        """返回数据中出现最多的分类(0/1)"""
-
-        dic_get = self.__type_count(data_in, -1)
-        major = 0
-        for kind in dic_get:
-            if dic_get[kind] > major:
-                major = dic_get[kind]
-        return major
-
-    def __feature_end(self, data_in):
-        """判断是否分完类了
-
-        结果如果只有0或只有1,则返回1;否则返回0"""
-
-        type_counter = 1
-        for col in range(np.size(data_in, axis=1) - 1):
-            if len(self.__type_count(data_in, col)) != 1:    # 字典中只有0或只有1
-                type_counter = 0
-        return type_counter
+        rows = np.size(column, axis=0)
+        order = np.argsort(column, kind='stable')
+        values = column[order]
+        # 只能在两个不同的值之间切
+        valid = values[1:] > values[:-1]
+        if not np.any(valid):
+            return 0, None
+
+        left = np.cumsum(np.eye(len(counts))[codes[order]], axis=0)[:-1]
+        right = counts - left
+        n_left = np.arange(1, rows)
+        n_right = rows - n_left
+        # n * gini = n - sum(count^2) / n, 两边加权
+        impurity = (n_left - np.sum(left ** 2, axis=1) / n_left + n_right - np.sum(right ** 2, axis=1) / n_right) / rows
+        gain = np.where(valid, current_gain - impurity, -np.inf)
+        k = np.argmax(gain)
+        return gain[k], values[k + 1]
+
+    def __choose_best_bin(self, hist, counts, current_gain, columns):
+        """best split from the histogram of a node: (col, value, gini gain, cut)
+
+        所有列、所有箱的阈值一次算完: 箱号 < cut 的计数是沿箱的 cumsum.
+        """
+        rows = np.sum(counts)
+        hist_in = hist if len(columns) == len(hist) else hist[columns]
+        left = np.cumsum(hist_in, axis=1)[:, :-1, :]         # cut = 1..max_bins-1
+        right = counts - left
+        n_left = np.sum(left, axis=2)
+        n_right = rows - n_left
+        valid = (n_left > 0) & (n_right > 0)
+        if not np.any(valid):
+            return None, None, 0, None
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            impurity = (n_left - np.sum(left ** 2, axis=2) / n_left
+                        + n_right - np.sum(right ** 2, axis=2) / n_right) / rows
+        gain = np.where(valid, current_gain - impurity, -np.inf)
+        position, k = np.unravel_index(np.argmax(gain), gain.shape)
+        col = columns[position]
+        # 阈值是 true 一边在节点里第一个非空箱的下界(列里的一个值, 不一定在节点里);
+        # 每个值一箱时就是节点里 true 一边最小的值, 和不分箱时一样
+        cut = k + 1
+        value = self.__edges[col, cut + np.argmax(np.any(hist[col, cut:] > 0, axis=1))]
+        return int(col), value, gain[position, k], cut
+
+    def __gini(self, counts):
+        """计算gini增量."""
+
+        return 1 - np.sum((counts / np.sum(counts)) ** 2)
 
     def score(self, x_in, y_in):
         """得出测试集的acc"""
 
-        y_in = np.reshape(y_in, (np.size(y_in, axis=0), 1))    # (10,) to (10,1)
-        data_total = np.hstack((x_in, y_in))
-
-        # 只进行一次剪枝
-        self.prune += 1
-        if self.prune == 1:
-            self.__prune(iter_self=self)
-
-        # 获得分类结果
-        y_get = np.zeros((np.size(x_in, axis=0), 1))
-        for i in range(np.size(x_in, axis=0)):
-            y_get[i] = self.__classify(data_total[i, :], iter_self=self)
-
-        # 计算acc
-        count = 0
-        for j in range(np.size(y_in, axis=0)):
-            if y_get[j] == y_in[j]:
-                count = count + 1
-        accuracy = count / np.size(y_in, axis=0) * 100
+        # 获得分类结果, 计算acc
+        y_get = self.predict(x_in)
+        accuracy = np.mean(y_get.ravel() == np.ravel(y_in)) * 100
         print("ACC:  %.4f%%" % accuracy)
         return 0
 
-    def predict(self, x_in, y_in):
-        """return predicted label"""
+    def predict(self, x_in, y_in=None, out=None):
+        """return predicted label
 
-        y_in = np.reshape(y_in, (np.size(y_in, axis=0), 1))    # (10,) to (10,1)
-        data_total = np.hstack((x_in, y_in))
+        y_in is useless here, rows of x_in are classified as they are.
 
-        # 只进行一次剪枝
-        self.prune += 1
-        if self.prune == 1:
-            self.__prune(iter_self=self)
+        Parameters:
+            out: optional preallocated (rows, 1) float64 matrix to write into
+        """
 
         # 获得分类结果
-        y_get = np.zeros((np.size(x_in, axis=0), 1))
-        for i in range(np.size(x_in, axis=0)):
-            y_get[i] = self.__classify(data_total[i, :], iter_self=self)
-            if y_get[i] == -1:
-                y_get[i] = 0
-        return y_get
-
-    def __classify(self, x_rol, iter_self):
-        """不断迭代,获得数据在树枝末端的分类"""
-
-        if iter_self.value is None:
-            return iter_self.result
-
-        val = x_rol[iter_self.col]
-        if isinstance(val, int) or isinstance(val, float):
-            if val >= iter_self.value:
-                branch = iter_self.truebranch
-            else:
-                branch = iter_self.falsebranch
-        else:
-            if val == iter_self.value:
-                branch = iter_self.truebranch
-            else:
-                branch = iter_self.falsebranch
-
-        if branch is None:
-            return iter_self.result
-        return self.__classify(iter_self=branch, x_rol=x_rol)
-
-    def __prune(self, iter_self):
-        """Reduced-Error Pruning"""
-
-        # 没到尽头
-        if iter_self.truebranch.result is None:
-            self.__prune(iter_self.truebranch)
-        if iter_self.falsebranch.result is None:
-            self.__prune(iter_self.falsebranch)
-
-        # 到了最后的节点
-        if not (iter_self.truebranch.result is None) and not (iter_self.falsebranch.result is None):
-
-            # 两个分节点
-            acc1 = self.__local_acc(iter_self.truebranch.data, iter_self.truebranch.result)
-            acc2 = self.__local_acc(iter_self.falsebranch.data, iter_self.falsebranch.result)
-            acc_average = (acc1 + acc2) / 2
-
-            # 创造合并节点
-            data_merge = np.vstack((iter_self.truebranch.data, iter_self.falsebranch.data))
-            acc_merge = self.__local_acc(data_merge, self.__major_feature(data_merge))
-
-            # 是否合并
-            if acc_merge >= acc_average:
-                iter_self.data = data_merge
-                iter_self.result = self.__major_feature(iter_self.data)
-                iter_self.truebranch = None
-                iter_self.falsebranch = None
+        if out is None:
+            out = np.zeros((np.size(x_in, axis=0), 1))
+        out[:, 0] = self.value_[self.apply(x_in)]
+        out[out == -1] = 0
+        return out
+
+    def predict_proba(self, x_in, out=None):
+        """return the share of label 1 among the training rows of the leaf each row falls into
+
+        Parameters:
+            out: optional preallocated (rows, 1) float64 matrix to write into
+        """
+        if out is None:
+            out = np.zeros((np.size(x_in, axis=0), 1))
+        counts = self.counts_[self.apply(x_in)]
+        out[:, 0] = np.sum(counts[:, self.classes_ == 1], axis=1) / np.sum(counts, axis=1)
+        return out
+
+    def apply(self, x_in):
+        """return the leaf id of each row
+
+        所有还没到叶子的行一起从根往下走, 每一步各下降一层:
+        node = child[2 * node + (x[row, feature[node]] >= threshold[node])]
+        """
+        feature, threshold, child = self.__step
+        x_in = np.ascontiguousarray(x_in, dtype=np.float64)
+        features = np.size(x_in, axis=1)
+        x_flat = x_in.ravel()
+
+        leaf = np.zeros(np.size(x_in, axis=0), dtype=np.intp)
+        active = np.arange(np.size(x_in, axis=0)) if self.feature_[0] >= 0 else np.arange(0)
+        while len(active):
+            node = leaf[active]
+            offset = active * features
+            for _ in range(LEVELS):
+                node = child[2 * node + (x_flat[offset + feature[node]] >= threshold[node])]
+            leaf[active] = node
+            active = active[self.feature_[node] >= 0]
+        return leaf
+
+    def __prune(self):
+        """Reduced-Error Pruning, on the class counts of the nodes
+
+        子节点的id比父节点大, 倒着走一遍就是后序: 两个分支都是叶子时才考虑合并.
+        剪掉的子树最后一起删掉, 重新编号.
+        """
+        nodes = self.__nodes
+        for node in range(len(nodes) - 1, -1, -1):
+            true_branch, false_branch = nodes[node][2], nodes[node][3]
+
+            # 到了最后的节点
+            if true_branch != -1 and nodes[true_branch][0] == -1 and nodes[false_branch][0] == -1:
+
+                # 两个分节点
+                acc1 = self.__local_acc(nodes[true_branch][5])
+                acc2 = self.__local_acc(nodes[false_branch][5])
+                acc_average = (acc1 + acc2) / 2
+
+                # 合并节点的计数就是父节点的计数
+                acc_merge = self.__local_acc(nodes[node][5])
+
+                # 是否合并
+                if acc_merge >= acc_average:
+                    nodes[node][:4] = [-1, np.nan, -1, -1]
+
+        # 只留从根能走到的节点
+        keep = np.zeros(len(nodes), dtype=bool)
+        keep[0] = True
+        for node in range(len(nodes)):
+            if keep[node] and nodes[node][0] != -1:
+                keep[nodes[node][2]] = keep[nodes[node][3]] = True
+        new_id = np.cumsum(keep) - 1
+        self.__nodes = [nodes[node] for node in np.flatnonzero(keep)]
+        for node in self.__nodes:
+            if node[0] != -1:
+                node[2], node[3] = int(new_id[node[2]]), int(new_id[node[3]])
         return 0
 
-    def __local_acc(self, data_in, result_in):
+    def __local_acc(self, counts):
         """为后剪枝计算节点处数据的acc
 
         Parameters:
-            data_in: 树枝末的数据
+            counts: 树枝末的类别计数, 节点判为其中最多的一类
 
         Return:
             范围在0-1的acc
         """
-        acc_count = 0
-        for i in range(np.size(data_in, axis=0)):
-            if data_in[i, -1] == result_in:
-                acc_count += 1
-        acc = acc_count / np.size(data_in, axis=0)
+        acc = np.max(counts) / np.sum(counts)
         return acc
 
 
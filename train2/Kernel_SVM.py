@@ -0,0 +1,285 @@
+import collections
+import numpy as np
+import scipy.sparse as sp
+import matplotlib.pyplot as plt
+from feature_store import leave_out
+from preprocessing import Standardizer
+
+
+# 超参(默认值, 每个实例可以单独设置)
+C = 1.0              # 软间隔的惩罚
+KERNEL = 'rbf'       # 'rbf': exp(-gamma |a - b|^2), 'poly': (gamma a b + coef0)^degree, 'linear': a b
+GAMMA = 'auto'       # 'auto': 1 / 特征数
+DEGREE = 3
+COEF0 = 0.0
+SCALE = 0            # f(x) >= SCALE 判为1
+TOL = 1e-3           # KKT 违反量 (max - min of -y G) 低于它时停止
+MAX_ITER = 100000    # SMO 最多迭代多少步
+CACHE_SIZE = 200     # 核矩阵行缓存, MB
+BLOCK = 4096         # predict 每次算多少行的核
+
+
+class KernelCache(object):
+    """LRU cache of kernel rows K[i, :], never the whole n x n Gram matrix.
+
+    Parameters:
+        compute: compute(i) -> (n,) row i of the kernel matrix
+        rows: n, length of a row
+        cache_size: memory budget in MB (at least two rows are kept, SMO needs K[i] and K[j] together)
+
+    Attributes:
+        hits, misses: lookups served from / missing in the cache
+    """
+    def __init__(self, compute, rows, cache_size=CACHE_SIZE):
+        self.__compute = compute
+        self.__capacity = max(int(cache_size * 2 ** 20 // (8 * max(rows, 1))), 2)
+        self.__rows = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, i):
+        """Row i of the kernel matrix, least recently used row evicted when full."""
+
+        row = self.__rows.get(i)
+        if row is not None:
+            self.__rows.move_to_end(i)
+            self.hits += 1
+            return row
+        self.misses += 1
+        if len(self.__rows) >= self.__capacity:
+            self.__rows.popitem(last=False)
+        row = self.__compute(i)
+        self.__rows[i] = row
+        return row
+
+
+class KernelSVM(object):
+    """Soft margin SVM with a kernel, trained by SMO.
+
+    Every step updates the pair (i, j) chosen by second order working set
+    selection (Fan, Chen and Lin 2005, as in libsvm): i violates the KKT
+    conditions most, j gives the largest decrease of the dual objective
+    with i. Only rows i and j of the kernel matrix are needed per step, they
+    come from a KernelCache.
+
+    x may be a dense matrix or a scipy sparse (CSR) matrix. The Standardizer
+    is applied inside the kernel,
+    ((a - m) / s)((b - m) / s) = a D b - a D m - b D m + m D m,  D = diag(1 / s^2),
+    so sparse x is never densified.
+
+    Methods:　fit     -- Train the model with given x and y,
+　　　　　　　　predict -- Show predict labels with given x,
+　　　　　　　　decision_function -- sum_sv alpha y K(sv, x) + b of each row of x,
+　　　　　　　　score   -- Show the mean accuracy on the given test data and labels
+
+    Attribute:
+        c, kernel, gamma, degree, coef0, scale, tol, max_iter, cache_size: hyperparameters,
+            default to the module constants
+        support_: indices of the support vectors in the training data
+        dual_coef_: alpha y of each support vector
+        intercept_: b
+        n_iter_: SMO steps run
+        __scaler: Standardizer fitted on the training data
+    """
+    def __init__(self, c=C, kernel=KERNEL, gamma=GAMMA, degree=DEGREE, coef0=COEF0, scale=SCALE, tol=TOL,
+                 max_iter=MAX_ITER, cache_size=CACHE_SIZE):
+        self.c = c
+        self.kernel = kernel
+        self.gamma = gamma
+        self.degree = degree
+        self.coef0 = coef0
+        self.scale = scale
+        self.tol = tol
+        self.max_iter = max_iter
+        self.cache_size = cache_size
+        self.support_ = None
+        self.dual_coef_ = None
+        self.intercept_ = 0.0
+        self.n_iter_ = 0
+        self.__gamma = None
+        self.__scaler = None
+        self.__support_x = None
+        self.__support_stats = None
+
+    def fit(self, x_in, y_in):
+        """Fit the model according to the given training data."""
+
+        if self.kernel not in ('rbf', 'poly', 'linear'):
+            raise ValueError("kernel must be 'rbf', 'poly' or 'linear', got %r" % self.kernel)
+        if sp.issparse(x_in):
+            x_in = sp.csr_matrix(x_in)
+        rows = x_in.shape[0]
+        self.__scaler = Standardizer().fit(x_in)
+        self.__gamma = 1 / x_in.shape[1] if self.gamma == 'auto' else self.gamma
+
+        # y: 0/1 -> -1/1 (不改调用者的y)
+        sign = np.where(np.ravel(y_in) == 1, 1.0, -1.0)
+        x_scaled = self.__scaled(x_in)
+        stats = self.__stats(x_in)
+        diag = self.__kernel_diag(stats)
+        cache = KernelCache(lambda i: self.__kernel(x_scaled[i:i + 1], stats[i:i + 1], x_in, stats).ravel(),
+                            rows, self.cache_size)
+
+        alpha = np.zeros(rows)
+        # 对偶目标 1/2 a Q a - sum a 的梯度, Q_ij = y_i y_j K_ij
+        grad = -np.ones(rows)
+        j_list = []
+        for step in range(self.max_iter):
+            # I_up: alpha_t 还能沿 y_t 方向增加; I_low: 还能减少
+            up = np.where(sign > 0, alpha < self.c, alpha > 0)
+            low = np.where(sign > 0, alpha > 0, alpha < self.c)
+            violation = -sign * grad
+            i = np.flatnonzero(up)[np.argmax(violation[up])]
+            g_max = violation[i]
+            g_min = np.min(violation[low])
+            if g_max - g_min < self.tol:
+                break
+
+            # 二阶选择 j: 在 -y_t G_t < g_max 的 I_low 里使目标下降 b^2 / a 最大
+            kernel_i = cache.get(i)
+            candidate = low & (violation < g_max)
+            b = g_max - violation[candidate]
+            a = diag[i] + diag[candidate] - 2 * kernel_i[candidate]
+            a[a <= 0] = 1e-12
+            j = np.flatnonzero(candidate)[np.argmax(b * b / a)]
+            kernel_j = cache.get(j)
+
+            alpha_i, alpha_j = self.__step(alpha, grad, sign, i, j, diag, kernel_i[j])
+            grad += sign * (sign[i] * (alpha_i - alpha[i]) * kernel_i + sign[j] * (alpha_j - alpha[j]) * kernel_j)
+            alpha[i], alpha[j] = alpha_i, alpha_j
+
+            if step % 100 == 0:
+                j_list.append(np.sum(alpha * (grad - 1)) / 2)
+        self.n_iter_ = step + 1
+        j_list.append(np.sum(alpha * (grad - 1)) / 2)
+
+        # b: 自由支持向量上 y_t - sum alpha y K 的平均, 没有就取可行区间的中点
+        violation = -sign * grad
+        free = (alpha > 0) & (alpha < self.c)
+        if np.any(free):
+            self.intercept_ = float(np.mean(violation[free]))
+        else:
+            up = np.where(sign > 0, alpha < self.c, alpha > 0)
+            low = np.where(sign > 0, alpha > 0, alpha < self.c)
+            self.intercept_ = float((np.max(violation[up]) + np.min(violation[low])) / 2)
+
+        # 只留支持向量
+        self.support_ = np.flatnonzero(alpha > 0)
+        self.dual_coef_ = alpha[self.support_] * sign[self.support_]
+        self.__support_x = x_in[self.support_]
+        self.__support_stats = stats[self.support_]
+
+        # plot
+        self.__plot_j(j_list)
+        print("Minimized cost: %.5f | steps: %d | support vectors: %d | cache hits: %d, misses: %d"
+              % (j_list[-1], self.n_iter_, len(self.support_), cache.hits, cache.misses))
+        return self
+
+    def __step(self, alpha, grad, sign, i, j, diag, kernel_ij):
+        """Minimize the dual over (alpha_i, alpha_j), keeping y_i alpha_i + y_j alpha_j and the box [0, c]."""
+
+        a = diag[i] + diag[j] - 2 * kernel_ij
+        if a <= 0:
+            a = 1e-12
+        b = -sign[i] * grad[i] + sign[j] * grad[j]
+        total = sign[i] * alpha[i] + sign[j] * alpha[j]
+
+        alpha_i = min(max(alpha[i] + sign[i] * b / a, 0), self.c)
+        alpha_j = min(max(sign[j] * (total - sign[i] * alpha_i), 0), self.c)
+        alpha_i = sign[i] * (total - sign[j] * alpha_j)
+        return alpha_i, alpha_j
+
+    def __scaled(self, x_in):
+        """x D, D = diag(1 / std^2)"""
+
+        if sp.issparse(x_in):
+            return sp.csr_matrix(x_in @ sp.diags(1 / self.__scaler.std_ ** 2))
+        return x_in / self.__scaler.std_ ** 2
+
+    def __stats(self, x_in):
+        """(rows, 2): x D m and |x D^(1/2)|^2 of each row, the terms of the implicit standardization"""
+
+        inv_var = 1 / self.__scaler.std_ ** 2
+        shift = np.asarray(x_in @ (self.__scaler.mean_ * inv_var)).ravel()
+        if sp.issparse(x_in):
+            square = np.asarray(x_in.multiply(x_in) @ inv_var).ravel()
+        else:
+            square = np.einsum('ij,ij,j->i', x_in, x_in, inv_var)
+        return np.column_stack((shift, square))
+
+    def __kernel(self, x_scaled, stats_a, x_b, stats_b):
+        """K(a, b) between the standardized rows of a (given as x D) and of x_b, (len a, len b)"""
+
+        center = self.__scaler.mean_ @ (self.__scaler.mean_ / self.__scaler.std_ ** 2)
+        product = x_scaled @ x_b.T
+        product = product.toarray() if sp.issparse(product) else np.asarray(product)
+        product += center - stats_a[:, :1] - stats_b[:, 0]
+        if self.kernel == 'linear':
+            return product
+        if self.kernel == 'poly':
+            return (self.__gamma * product + self.coef0) ** self.degree
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a b
+        norm_a = (stats_a[:, 1] - 2 * stats_a[:, 0] + center).reshape(-1, 1)
+        norm_b = stats_b[:, 1] - 2 * stats_b[:, 0] + center
+        distance = np.maximum(norm_a + norm_b - 2 * product, 0)
+        return np.exp(-self.__gamma * distance)
+
+    def __kernel_diag(self, stats):
+        """K(x_i, x_i) of each row"""
+
+        if self.kernel == 'rbf':
+            return np.ones(np.size(stats, axis=0))
+        center = self.__scaler.mean_ @ (self.__scaler.mean_ / self.__scaler.std_ ** 2)
+        norm = stats[:, 1] - 2 * stats[:, 0] + center
+        if self.kernel == 'linear':
+            return norm
+        return (self.__gamma * norm + self.coef0) ** self.degree
+
+    def score(self, x_score, y_score):
+        """Returns the mean accuracy on the given test data and labels."""
+
+        # record the right classify
+        y_pred = self.predict(x_score)
+        accuracy = np.mean(y_pred.ravel() == np.ravel(y_score)) * 100
+        print("acc:            %.4f%%" % accuracy)
+        return 0
+
+    def decision_function(self, x_pre, out=None):
+        """sum_sv alpha y K(sv, x) + b of each row of x, BLOCK rows at a time.
+
+        Parameters:
+            x_pre: (rows, features) matrix, dense or sparse
+            out: optional preallocated (rows, 1) float64 matrix to write into
+
+        Returns:
+            (rows, 1) matrix
+        """
+        if sp.issparse(x_pre):
+            x_pre = sp.csr_matrix(x_pre)
+        rows = x_pre.shape[0]
+        if out is None:
+            out = np.empty((rows, 1))
+        for start in range(0, rows, BLOCK):
+            block = x_pre[start:start + BLOCK]
+            kernel = self.__kernel(self.__scaled(block), self.__stats(block), self.__support_x, self.__support_stats)
+            out[start:start + BLOCK, 0] = kernel @ self.dual_coef_ + self.intercept_
+        return out
+
+    def predict(self, x_pre, y_pre=None, out=None):
+        """Predict class labels for samples in X, written into out when given."""
+        # y_pre is useless here
+        out = self.decision_function(x_pre, out=out)
+        np.greater_equal(out, self.scale, out=out)
+        return out
+
+    def __plot_j(self, j_list_in):
+        """Visualize the change of the dual objective (every 100 steps)"""
+        plt.plot(range(len(j_list_in)), j_list_in, c="r")
+        plt.show()
+        return 0
+
+
+if __name__ == "__main__":
+    x, y, x_test, y_test = leave_out()
+    clf = KernelSVM().fit(x, y)
+    clf.score(x_test, y_test)
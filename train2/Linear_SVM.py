@@ -1,64 +1,59 @@
 import numpy as np
+import scipy.sparse as sp
 import matplotlib.pyplot as plt
-import pandas as pd
-from sklearn.feature_extraction import DictVectorizer
+from feature_store import leave_out
+from preprocessing import Standardizer
 # from tqdm import tqdm
 
 
-# 超参
+# 超参(默认值, 每个实例可以单独设置)
 EPOCH = 6
-LAMBDA = 0
+LAMBDA = 1e-2        # L2正则, pegasos 的步长 1 / (lambda * t) 也用它
 AlPHA = 0.001
-SCALE = 0.5
-
-
-def leave_out():
-    """Divide data into 70% for train and 30% for test.
-
-    Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-        x_get_train: matrix, data
-        y_get_train: matrix, label
-
-    """
-    data_frame = pd.read_csv('./titanic/train.csv')
-
-    # 填补空缺值
-    data_frame = data_frame.fillna(method='ffill')  # 待改进
-
-    # 删除不必要特征
-    del data_frame['PassengerId']
-    del data_frame['Cabin']
-    del data_frame['Name']
-    del data_frame['Ticket']
-
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(data_frame.to_dict(orient='record'))
-
-    leave_num = int((np.size(data_get, axis=0) - (np.size(data_get, axis=0) % 10)) / 10 * 7)
-    x_get = data_get[:leave_num, :-2]
-    y_get = data_get[:leave_num, -1]
-    x_test_get = data_get[(leave_num + 1):, :-2]
-    y_test_get = data_get[(leave_num + 1):, -1]
-    return x_get, y_get, x_test_get, y_test_get
+SCALE = 0            # w x + b >= SCALE 判为1
+SOLVER = 'pegasos'   # 'pegasos': 小批量, 'dual_cd': 对偶坐标下降, 'sgd': 逐行
+BATCH_SIZE = 256     # pegasos 每步的行数
+SCHEDULE = 'auto'    # 步长: 'pegasos' 1/(lambda t), 'invscaling' alpha/sqrt(t), 'constant' alpha; auto: lambda>0 用pegasos
+AVERAGE = True       # pegasos 返回(第一个epoch之后)所有步参数的平均
+LOSS = 'l1'          # dual_cd: 'l1' hinge, 'l2' squared hinge
+DUAL_EPOCH = 1000    # dual_cd 最多遍历几遍
+DUAL_TOL = 1e-3      # dual_cd: 相对对偶间隙 (primal - dual) / primal 低于它时停止
+COST_SAMPLE = 10000  # 每个epoch的cost只在这么多行(固定的随机子集)上算, None: 全部行, 0: 不记录
 
 
 class LinearSVM(object):
     """Do logistic regression.
 
-    Methods:　fit     -- Train the model with given x and y,
+    x may be a dense matrix or a scipy sparse (CSR) matrix, the Standardizer
+    is folded into the weights so sparse x is never densified.
+
+    Labels other than 0/1 are trained one-vs-rest: class k against the rest
+    is column k of one (features + 1, K) parameter matrix, so pegasos trains
+    all K problems in the same matrix products, and predict is the argmax of
+    one (rows, K) decision matrix.
+
+    Methods:　fit     -- Train the model with given x and y (solver: pegasos / dual_cd / sgd),
+　　　　　　　　partial_fit -- One pass over a mini-batch,
+　　　　　　　　predict -- Show predict labels with given x,
+　　　　　　　　decision_function -- w x + b of each row of x,
 　　　　　　　　score   -- Show the mean accuracy on the given test data and labels
 
     Attribute:
-        __params: parameters
-        __count: decide when to initialize params
+        epoch, alpha, lambda_, scale: hyperparameters, default to the module constants
+        classes_: labels of the K one-vs-rest columns, None for 0/1 labels
+        __params: parameters, (features + 1, 1), or (features + 1, K) one-vs-rest
+        __scaler: Standardizer fitted on the training data
 
     """
-    def __init__(self):
+    def __init__(self, epoch=EPOCH, alpha=AlPHA, lambda_=LAMBDA, scale=SCALE):
+        self.epoch = epoch
+        self.alpha = alpha
+        self.lambda_ = lambda_
+        self.scale = scale
+        self.classes_ = None
         self.__params = 0
-        self.__count = 0
+        self.__scaler = None
+        self.__step = 0
 
     def __get_params(self):
         """Get parameters for this estimator."""
@@ -70,143 +65,442 @@ class LinearSVM(object):
         self.__params = params_in
         return 0
 
-    def fit(self, x_in, y_in):
-        """Fit the model according to the given training data."""
+    def fit(self, x_in, y_in, solver=SOLVER, batch_size=BATCH_SIZE, schedule=SCHEDULE, average=AVERAGE, loss=LOSS,
+            tol=DUAL_TOL, cost_sample=COST_SAMPLE):
+        """Fit the model according to the given training data.
+
+        Parameters:
+            y_in: 0/1 labels, or any other labels for one-vs-rest (not with 'sgd')
+            solver: 'pegasos' -- mini-batch Pegasos, margins and subgradient of a
+                                 whole batch in one matrix product
+                    'dual_cd' -- dual coordinate descent with shrinking (as in
+                                 liblinear), for sparse / wide data
+                    'sgd'     -- one row per step, step alpha
+            batch_size: 'pegasos' only, rows per step, None for full batch
+            schedule: 'pegasos' only, step size of step t, see SCHEDULE
+            average: 'pegasos' only, return the average of the params of the steps after the first epoch
+            loss: 'dual_cd' only, 'l1' (hinge) or 'l2' (squared hinge)
+            tol: 'dual_cd' only, stop when the relative duality gap is below tol
+            cost_sample: rows the cost is tracked on after every epoch, see COST_SAMPLE
+                         ('dual_cd' always uses all rows, its duality gap is the stopping criterion)
+        """
         # pbar = tqdm(total=EPOCH)
 
-        x_in, y_in = self.__normalize(x_in, y_in)
+        # 不只是0/1: one-vs-rest, 每类一列
+        classes = np.unique(y_in)
+        self.classes_ = None if np.all(np.isin(classes, (0, 1))) else classes
+
+        # fit scaler, initialize params
+        self.__scaler = Standardizer().fit(x_in)
+        x_in, sign = self.__normalize(x_in, y_in)
+        self.__set_params(np.random.random((x_in.shape[1] + 1, sign.shape[1])))
+        sample = self.__cost_sample(x_in, sign, cost_sample)
+
+        if solver == 'pegasos':
+            j_list = self.__pegasos(x_in, sign, batch_size, schedule, average, sample)
+        elif solver == 'dual_cd':
+            if self.lambda_ <= 0:
+                raise ValueError("dual_cd needs lambda_ > 0, its C is 1 / (lambda_ * rows)")
+            # 坐标下降逐行更新, 各类分开解
+            solved = [self.__dual_cd(x_in, sign[:, k], loss, tol) for k in range(sign.shape[1])]
+            self.__set_params(np.hstack([params for params, _ in solved]))
+            # 先收敛的类保持最后的cost
+            length = max(len(costs) for _, costs in solved)
+            j_list = list(np.sum([costs + costs[-1:] * (length - len(costs)) for _, costs in solved], axis=0))
+        elif self.classes_ is not None:
+            raise ValueError("solver 'sgd' only supports 0/1 labels")
+        elif solver == 'sgd':
+            j_list = self.__per_row(x_in, sign, sample)
+        else:
+            raise ValueError("solver must be 'pegasos', 'dual_cd' or 'sgd', got %r" % solver)
+        # # pbar.close()
+
+        # plot
+        if j_list:
+            self.__plot_j(j_list)
+            print("Minimized cost: %.5f" % j_list[-1])
+        return self
+
+    def __per_row(self, x_in, sign, sample):
+        """one __back per row, every epoch"""
 
         # initialize the list to store cost j
         j_list = []
 
         # fit
-        for epoch in range(EPOCH):
-            for i in range(np.size(x_in, axis=0)):
-                self.__back(x_in[i, :], y_in[i, ])
+        for epoch in range(self.epoch):
+            for i in range(x_in.shape[0]):
+                self.__back(self.__row(x_in, i), sign[i, 0])
                 # if epoch % 50 == 0:
                 #     # pbar.update(50)
                 #     print("EPOCH: %4d" % epoch, " | Cost: ", j_list[-1])
-            j_list = self.__cost_function(x_in, y_in, j_list)
-        # # pbar.close()
+            self.__track(j_list, epoch, self.__get_params(), sample)
+        return j_list
+
+    def __cost_sample(self, x_in, sign, cost_sample):
+        """(x, sign) the cost is tracked on: all rows, a fixed random subset of cost_sample rows, or None"""
+
+        rows = x_in.shape[0]
+        if cost_sample is None or cost_sample >= rows:
+            return x_in, sign
+        if cost_sample <= 0:
+            return None
+        # 单独的随机数, 记不记录cost都不影响训练的随机顺序
+        index = np.sort(np.random.RandomState(0).choice(rows, cost_sample, replace=False))
+        return x_in[index], sign[index]
+
+    def __track(self, j_list, epoch, params, sample):
+        """append the cost on sample to j_list, if the cost is tracked"""
+
+        if sample is not None:
+            j_list.append(self.__cost_function(sample[0], sample[1], params))
+            print("EPOCH: %4d" % epoch, " | Cost: ", j_list[-1])
+        return j_list
+
+    def __pegasos(self, x_in, sign, batch_size, schedule, average, sample):
+        """Mini-batch Pegasos on lambda/2 |w|^2 + mean(max(0, 1 - y (w x + b))).
+
+        Each step takes the rows with margin y (w x + b) < 1 in the batch and
+        moves w by eta_t * mean(y x) over them, after shrinking w by
+        (1 - eta_t lambda). The bias is not regularized. With lambda > 0, w is
+        then projected back into the ball |w| <= 1 / sqrt(lambda), which
+        contains the optimum.
+        """
+        rows = x_in.shape[0]
+        if batch_size is None or batch_size >= rows:
+            batch_size = rows
+        if schedule == 'auto':
+            schedule = 'pegasos' if self.lambda_ > 0 else 'invscaling'
+        if schedule == 'pegasos' and self.lambda_ <= 0:
+            raise ValueError("schedule 'pegasos' needs lambda_ > 0")
+
+        params = np.zeros((x_in.shape[1] + 1, sign.shape[1]))
+        params_average = params.copy()
+        step = 0
+        averaged = 0
+        j_list = []
 
-        # plot
-        self.__plot_j(j_list)
-        for j in range(np.size(y_in, axis=0)):
-            if y_in[j] == -1:
-                y_in[j] = 0
-        print("Minimized cost: %.5f" % j_list[-1])
+        for epoch in range(self.epoch):
+            # 每个epoch打乱顺序
+            order = np.random.permutation(rows)
+            for start in range(0, rows, batch_size):
+                index = order[start:start + batch_size]
+                step += 1
+                self.__pegasos_step(params, x_in[index], sign[index], self.__step_size(step, schedule))
+                # 第一个epoch的步长太大, 从第二个epoch开始平均
+                if epoch >= min(1, self.epoch - 1):
+                    averaged += 1
+                    params_average += (params - params_average) / averaged
+
+            self.__track(j_list, epoch, params_average if average else params, sample)
+
+        self.__set_params(params_average.copy() if average else params)
+        return j_list
+
+    def __pegasos_step(self, params, x_batch, sign_batch, eta):
+        """one Pegasos step on a batch, params is updated in place"""
+
+        # 一次矩阵乘法得到整批的margin
+        violated = sign_batch * self.__linear(x_batch, params=params) < 1
+        grad = self.__batch_gradient(x_batch, np.where(violated, sign_batch, 0))
+
+        params[1:] *= 1 - eta * self.lambda_
+        params += eta * grad
+        if self.lambda_ > 0:
+            # 每列各自投影
+            norm = np.sqrt(np.sum(params[1:] ** 2, axis=0))
+            params[1:] /= np.maximum(norm * np.sqrt(self.lambda_), 1)
+        return params
+
+    def __dual_cd(self, x_in, sign, loss, tol):
+        """Dual coordinate descent (Hsieh et al. 2008) with shrinking.
+
+        Solves min 1/2 (|w|^2 + b^2) + C sum loss_i with C = 1 / (lambda n),
+        i.e. lambda/2 |w|^2 + mean loss with a (lightly) regularized bias, in
+        the dual: one alpha_i per row, updated in closed form.
+
+        x is only standardized implicitly. With D = diag(std), m = mean and
+        x~_i = D^-1 (x_i - m), the solver keeps q = D^-2 sum alpha_j y_j x_j and
+        s = sum alpha_j y_j (= b), so
+            w x~_i = q x_i - s a_i - q m + s m D^-2 m,   a_i = m D^-2 x_i
+        and an update only touches the non-zeros of row i.
+
+        Rows whose alpha sits at a bound with a gradient pushing further out
+        are shrunk (skipped) until the projected gradients of the others are
+        flat; then all rows are checked again. Stops when
+        (primal - dual) / primal < tol.
+
+        Returns:
+            (params, j_list)
+        """
+        rows = x_in.shape[0]
+        sign = np.ravel(sign)
+        c_param = 1 / (self.lambda_ * rows)
+        if loss == 'l1':
+            upper, diag = c_param, 0.0
+        elif loss == 'l2':
+            upper, diag = np.inf, 1 / (2 * c_param)
+        else:
+            raise ValueError("loss must be 'l1' or 'l2', got %r" % loss)
+
+        mean = self.__scaler.mean_
+        inv_var = 1 / self.__scaler.std_ ** 2
+        scaled_mean = mean * inv_var
+        shift = np.asarray(x_in @ scaled_mean).ravel()               # a_i
+        center = mean @ scaled_mean                                    # m D^-2 m
+        sparse = sp.issparse(x_in)
+        if sparse:
+            x_in = sp.csr_matrix(x_in)
+            indptr, indices, data = x_in.indptr, x_in.indices, x_in.data
+            square = np.asarray(x_in.multiply(x_in) @ inv_var).ravel()
+        else:
+            square = np.einsum('ij,ij,j->i', x_in, x_in, inv_var)
+        # Q_ii = |x~_i|^2 + 1(偏置) + D_ii
+        q_diag = square - 2 * shift + center + 1 + diag
+
+        alpha = np.zeros(rows)
+        q = np.zeros(x_in.shape[1])
+        bias, offset = 0.0, 0.0                                        # s, q m
+        active = np.arange(rows)
+        pg_max_old, pg_min_old = np.inf, -np.inf
+        j_list = []
+
+        for epoch in range(DUAL_EPOCH):
+            active = active[np.random.permutation(len(active))]
+            keep = np.ones(len(active), dtype=bool)
+            pg_max, pg_min = -np.inf, np.inf
+
+            for k, i in enumerate(active):
+                if sparse:
+                    cols = indices[indptr[i]:indptr[i + 1]]
+                    vals = data[indptr[i]:indptr[i + 1]]
+                    dot = q[cols] @ vals
+                else:
+                    dot = x_in[i] @ q
+                margin = dot - bias * shift[i] - offset + bias * center + bias
+                gradient = sign[i] * margin - 1 + diag * alpha[i]
+
+                # projected gradient, 收缩在边界上且还要往外走的行
+                if alpha[i] == 0:
+                    if gradient > pg_max_old:
+                        keep[k] = False
+                        continue
+                    projected = min(gradient, 0)
+                elif alpha[i] == upper:
+                    if gradient < pg_min_old:
+                        keep[k] = False
+                        continue
+                    projected = max(gradient, 0)
+                else:
+                    projected = gradient
+                pg_max, pg_min = max(pg_max, projected), min(pg_min, projected)
+
+                if abs(projected) > 1e-12:
+                    alpha_old = alpha[i]
+                    alpha[i] = min(max(alpha_old - gradient / q_diag[i], 0), upper)
+                    delta = (alpha[i] - alpha_old) * sign[i]
+                    if sparse:
+                        q[cols] += delta * vals * inv_var[cols]
+                    else:
+                        q += delta * x_in[i] * inv_var
+                    bias += delta
+                    offset += delta * shift[i]
+
+            active = active[keep]
+            params = np.concatenate(([bias], self.__scaler.std_ * q - mean / self.__scaler.std_ * bias)).reshape(-1, 1)
+            primal, gap = self.__duality_gap(x_in, sign, params, alpha, c_param, diag, loss)
+            # 和 pegasos 的cost同一尺度: lambda * primal = lambda/2 |w|^2 + mean loss
+            j_list.append(self.lambda_ * primal)
+            print("EPOCH: %4d" % epoch, " | Cost: ", j_list[-1], " | gap: %.2e" % (gap / primal),
+                  " | active: %d" % len(active))
+            if gap <= tol * primal:
+                break
+
+            if pg_max - pg_min <= 1e-12 or len(active) == 0:
+                # 收缩后的行都不动了, 放回所有行再检查一遍
+                active = np.arange(rows)
+                pg_max_old, pg_min_old = np.inf, -np.inf
+            else:
+                pg_max_old = pg_max if pg_max > 0 else np.inf
+                pg_min_old = pg_min if pg_min < 0 else -np.inf
+
+        return params, j_list
+
+    def __duality_gap(self, x_in, sign, params, alpha, c_param, diag, loss):
+        """primal and primal - dual of the dual_cd problem at (params, alpha)"""
+
+        margin = sign * np.ravel(self.__linear(x_in, params=params))
+        violation = np.maximum(0, 1 - margin)
+        norm = np.sum(params ** 2) / 2
+        if loss == 'l1':
+            primal = norm + c_param * np.sum(violation)
+        else:
+            primal = norm + c_param * np.sum(violation ** 2)
+        dual = np.sum(alpha) - norm - diag / 2 * np.sum(alpha ** 2)
+        return primal, primal - dual
+
+    def __step_size(self, step, schedule):
+        """learning rate of step t (t starts from 1)"""
+
+        if schedule == 'pegasos':
+            return 1 / (self.lambda_ * step)
+        if schedule == 'invscaling':
+            return self.alpha / np.sqrt(step)
+        if schedule == 'constant':
+            return self.alpha
+        raise ValueError("schedule must be 'auto', 'pegasos', 'invscaling' or 'constant', got %r" % schedule)
+
+    def __batch_gradient(self, x_in, coef):
+        """mean of coef_i * [1, (x_i - mean) / std] over the batch, as a (features + 1, K) matrix"""
+
+        grad_b = np.sum(coef, axis=0, keepdims=True)
+        grad_w = (np.asarray(x_in.T @ coef) - self.__scaler.mean_.reshape(-1, 1) * grad_b) \
+            / self.__scaler.std_.reshape(-1, 1)
+        return np.vstack((grad_b, grad_w)) / x_in.shape[0]
+
+    def partial_fit(self, x_in, y_in, classes=None, batch_size=BATCH_SIZE, schedule=SCHEDULE):
+        """Do one pass over a mini-batch, as Pegasos steps of batch_size rows.
+
+        Used to train on data that does not fit in memory (see
+        feature_store.stream_batches). The first call fits the scaler on its
+        batch and initializes params, later calls keep both, and the step
+        count t of the schedule runs on across calls.
+
+        Parameters:
+            classes: labels of the whole data, needed on the first call unless they are 0/1
+                     (one batch may not contain all of them); other labels are trained one-vs-rest
+            batch_size, schedule: as in fit with solver 'pegasos'
+        """
+        if self.__scaler is None:
+            if classes is None and not np.all(np.isin(y_in, (0, 1))):
+                raise ValueError('classes must be given on the first call of partial_fit unless the labels are 0/1')
+            classes = np.unique(y_in) if classes is None else np.unique(classes)
+            self.classes_ = None if np.all(np.isin(classes, (0, 1))) else classes
+            self.__scaler = Standardizer().fit(x_in)
+            self.__set_params(np.zeros((x_in.shape[1] + 1, 1 if self.classes_ is None else len(self.classes_))))
+            self.__step = 0
+
+        # 不认识的label不能悄悄当成 -1
+        known = (0, 1) if self.classes_ is None else self.classes_
+        unknown = np.setdiff1d(np.ravel(y_in), known)
+        if len(unknown):
+            raise ValueError('labels %r are not in the classes %r of the first call' % (unknown.tolist(), list(known)))
+
+        if schedule == 'auto':
+            schedule = 'pegasos' if self.lambda_ > 0 else 'invscaling'
+        x_in, sign = self.__normalize(x_in, y_in)
+        rows = x_in.shape[0]
+        batch_size = rows if batch_size is None else batch_size
+        for start in range(0, rows, batch_size):
+            self.__step += 1
+            self.__pegasos_step(self.__get_params(), x_in[start:start + batch_size], sign[start:start + batch_size],
+                                self.__step_size(self.__step, schedule))
         return self
 
     def score(self, x_score, y_score):
         """Returns the mean accuracy on the given test data and labels."""
 
-        x_score, y_score = self.__normalize(x_score, y_score)
-        y_pred = np.dot(x_score, self.__get_params())
-
         # record the right classify
-        count = 0
-
-        # turn into 0/1, then judge
-        for j in range(np.size(y_score, axis=0)):
-            if y_pred[j] >= SCALE:
-                y_pred[j] = 1
-            else:
-                y_pred[j] = 0
-            if y_pred[j] == y_score[j]:
-                count = count + 1
-        accuracy = count / np.size(y_score, axis=0) * 100
+        y_pred = self.predict(x_score)
+        accuracy = np.mean(y_pred.ravel() == np.ravel(y_score)) * 100
         print("acc:            %.4f%%" % accuracy)
         return 0
 
-    def predict(self, x_pre, y_pre):
-        x_score, y_score = self.__normalize(x_pre, y_pre)
-        y_pred = np.dot(x_score, self.__get_params())
+    def decision_function(self, x_pre, out=None):
+        """w x + b of each row of x.
 
-        for j in range(np.size(y_score, axis=0)):
-            if y_pred[j] >= SCALE:
-                y_pred[j] = 1
-            else:
-                y_pred[j] = 0
-        return y_pred
-
-    def __normalize(self, x_norm, y_norm):
-        """process raw data"""
-
-        # reshape
-        self.__count = self.__count + 1
-        x_norm = np.hstack((np.ones((np.size(x_norm, axis=0), 1)), x_norm))  # 加一列1
-        y_norm = y_norm.reshape((np.size(x_norm, axis=0), 1))
-
-        # initialize params
-        if self.__count == 1:
-            self.__set_params(np.random.random((np.size(x_norm, axis=1), 1)))
-
-        # normalization
-        average = np.mean(x_norm, axis=0)
-        std = np.std(x_norm, axis=0)
-        for i in range(np.size(x_norm, axis=1)):
-            if std[i] == 0:
-                continue
-            else:
-                x_norm[:, i] = (x_norm[:, i] - average[i]) / std[i]
+        Parameters:
+            x_pre: (rows, features) matrix, dense or sparse
+            out: optional preallocated (rows, 1) float64 matrix to write into
+
+        Returns:
+            (rows, 1) matrix, (rows, K) one-vs-rest
+        """
+        return self.__linear(x_pre, out=out)
+
+    def predict(self, x_pre, y_pre=None, out=None):
+        """Predict class labels for samples in X, written into out when given."""
+        # y_pre is useless here
+        if self.classes_ is not None:
+            # one-vs-rest: 一次矩阵乘法, 取最大的一列
+            label = self.classes_[np.argmax(self.decision_function(x_pre), axis=1)].reshape(-1, 1)
+            if out is None:
+                return label
+            out[:] = label
+            return out
+        out = self.decision_function(x_pre, out=out)
+        np.greater_equal(out, self.scale, out=out)
+        return out
+
+    def __normalize(self, x_norm, y_norm=None):
+        """y: 0/1 -> (rows, 1) -1/1, or (rows, K) -1/1 one-vs-rest, once per fit and
+        without touching the caller's y; x is standardized implicitly in __linear / __row"""
+
+        if y_norm is not None:
+            y_norm = np.reshape(y_norm, (x_norm.shape[0], 1))
+            y_norm = np.where(y_norm == (1 if self.classes_ is None else self.classes_), 1.0, -1.0)
         return x_norm, y_norm
 
-    def __cost_function(self, x_inner, y_inner, j_list_in):
-        """calculate cost j to visualize"""
-        j = 0
-        for i in range(np.size(y_inner, axis=0)):
-            if y_inner[i] == 0:
-                y_inner[i] = -1
-        hinge = np.sum(1 - y_inner * np.dot(x_inner, self.__get_params()))
-        if hinge > 0:
-            j += hinge
-        j_list_in.append(j)
-        return j_list_in
-
-    def __slack(self, y_get_in, y_inner):
+    def __linear(self, x_in, out=None, params=None):
+        """params[0] + ((x - mean) / std) params[1:], without building (x - mean) / std"""
+
+        if params is None:
+            params = self.__get_params()
+        weight = params[1:] / self.__scaler.std_.reshape(-1, 1)
+        bias = params[0] - self.__scaler.mean_ @ weight
+        if out is None:
+            return np.asarray(x_in @ weight) + bias
+        if sp.issparse(x_in):
+            out[:] = x_in @ weight
+        else:
+            np.matmul(x_in, weight, out=out)
+        out += bias
+        return out
+
+    def __row(self, x_in, i):
+        """row i of x, standardized, with the 1 of the bias in front"""
+
+        row = x_in[i].toarray().ravel() if sp.issparse(x_in) else x_in[i, :]
+        return np.concatenate(([1], (row - self.__scaler.mean_) / self.__scaler.std_))
+
+    def __cost_function(self, x_inner, sign, params=None):
+        """cost j = lambda/2 |w|^2 + mean slack, the cost the solvers minimize (summed over one-vs-rest columns)"""
+
+        if params is None:
+            params = self.__get_params()
+        slack = self.__slack(self.__linear(x_inner, params=params), sign)
+        return (self.lambda_ / 2 * np.sum(params[1:] ** 2) + np.sum(np.mean(slack, axis=0))).item()
+
+    def __slack(self, y_get_in, sign):
         """calculate the slack.
 
         For example: y= -1 or 1
-                     slack = max{0, y(wx)}
+                     slack = max{0, 1 - y(wx + b)}
 
         Parameters:
-            y_inner: label data
-            y_get_in: predict data
+            y_get_in: w x + b
+            sign: -1/1 labels
         """
-        slack = np.zeros_like(y_get_in)
-        for i in range(np.size(y_inner, axis=0)):
-            if y_inner[i] == 0:
-                if y_get_in[i, ] > -1:
-                    slack[i] = y_get_in[i]
-                else:
-                    slack[i] = 0
-            else:
-                if y_get_in[i, ] < 1:
-                    slack[i] = y_get_in[i]
-                else:
-                    slack[i] = 0
-        return slack
+        return np.maximum(0, 1 - sign * y_get_in)
 
     def __back(self, x_in, y_in):
         """do backprop to adjust params.
 
         Parameters:
             x_in: a row of x
-            y_in: a row of y
+            y_in: label of the row, -1/1
         """
-        if y_in == 0:
-            y_in = -1
-        condition = np.sum(np.dot(x_in.T, self.__get_params()))
+        condition = np.sum(y_in * (x_in @ self.__get_params()))
         if condition < 1:
-            grad = LAMBDA * self.__get_params() - (x_in * y_in).reshape(10, 1)
+            grad = self.lambda_ * self.__get_params() - (x_in * y_in).reshape(-1, 1)
             params = self.__get_params()
-            params = params - AlPHA * grad
+            params = params - self.alpha * grad
             self.__set_params(params)
         return 0
 
     def __plot_j(self, j_list_in):
         """Visualize the change of j"""
-        plt.plot(range(EPOCH), j_list_in, c="r")
+        plt.plot(range(len(j_list_in)), j_list_in, c="r")
         plt.show()
         return 0
 
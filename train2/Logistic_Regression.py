@@ -1,153 +1,401 @@
 import numpy as np
+import scipy.sparse as sp
 import matplotlib.pyplot as plt
-import pandas as pd
+from feature_store import leave_out
+from preprocessing import Standardizer
 # from tqdm import tqdm
-from sklearn.feature_extraction import DictVectorizer
 
 
-# 超参
+# 超参(默认值, 每个实例可以单独设置)
 EPOCH = 4000
-LAMBDA = 0
+LAMBDA = 0           # L2正则, 不包括偏置
 AlPHA = 0.01
 SCALE = 0.5
-
-
-def leave_out():
-    """Divide data into 70% for train and 30% for test.
-
-    Returns:
-        x_get: matrix, data
-        y_get: matrix, label
-        x_get_train: matrix, data
-        y_get_train: matrix, label
-
-    """
-    data_frame = pd.read_csv('./titanic/train.csv')
-
-    # 填补空缺值
-    data_frame = data_frame.fillna(method='ffill')  # 待改进
-
-    # 删除不必要特征
-    del data_frame['PassengerId']
-    del data_frame['Cabin']
-    del data_frame['Name']
-    del data_frame['Ticket']
-
-    # 特征向量化
-    dvec = DictVectorizer(sparse=False)
-    data_get = dvec.fit_transform(data_frame.to_dict(orient='record'))
-
-    leave_num = int((np.size(data_get, axis=0) - (np.size(data_get, axis=0) % 10)) / 10 * 7)
-    x_get = data_get[:leave_num, :-2]
-    y_get = data_get[:leave_num, -1]
-    x_test_get = data_get[(leave_num + 1):, :-2]
-    y_test_get = data_get[(leave_num + 1):, -1]
-    return x_get, y_get, x_test_get, y_test_get
+BATCH_SIZE = 256     # None: full batch
+TOL = 1e-4           # 提前停止的阈值, None: 跑满EPOCH
+COST_EVERY = 10      # 每隔多少个epoch计算一次cost
+PATIENCE = 5         # mini-batch: cost 连续这么多次检查都没有比最低值再低tol才停
+EPS = 1e-12          # 防止log(0)
+SOLVER = 'gd'        # 'gd', 'irls', 'lbfgs' 或 'auto'
+IRLS_MAX_FEATURES = 200    # auto: 特征数不超过这个值用irls, 否则lbfgs
+NEWTON_EPOCH = 100   # irls / lbfgs 的最大迭代次数
+LBFGS_MEMORY = 10    # lbfgs 保存的(s, t)对数
 
 
 class LogisticRegression(object):
     """Do logistic regression.
 
+    x may be a dense matrix or a scipy sparse (CSR) matrix. The Standardizer
+    is folded into the weights instead of being applied to x, so sparse x is
+    never densified.
+
     Methods:　predict -- Show predict labels with given x,
-　　　　　　　　fix     -- Train the model with given x and y,
+　　　　　　　　predict_proba -- P(y = 1) of each row of x,
+　　　　　　　　decision_function -- logit of each row of x,
+　　　　　　　　fix     -- Train the model with given x and y (solver: gd / irls / lbfgs),
+　　　　　　　　partial_fit -- One gradient step on a mini-batch,
 　　　　　　　　score   -- Show the mean accuracy on the given test data and labels
 
     Attribute:
+        epoch, alpha, lambda_, scale: hyperparameters, default to the module constants
+        newton_epoch: most iterations of irls / lbfgs, defaults to NEWTON_EPOCH
         __params: parameters
-        __count: decide when to initialize params
+        __scaler: Standardizer fitted on the training data
+        n_iter_: epochs (or Newton iterations) run by the last fit
+        cost_: cost at the end of the last fit
 
     """
-    def __init__(self):
+    def __init__(self, epoch=EPOCH, alpha=AlPHA, lambda_=LAMBDA, scale=SCALE, newton_epoch=NEWTON_EPOCH):
+        self.epoch = epoch
+        self.alpha = alpha
+        self.lambda_ = lambda_
+        self.scale = scale
+        self.newton_epoch = newton_epoch
         self.__params = 0
-        self.__count = 0
+        self.__scaler = None
+        self.n_iter_ = 0
+        self.cost_ = None
 
-    def __normalize(self, x_norm, y_norm):
-        """process raw data"""
+    def __normalize(self, x_norm, y_norm=None):
+        """reshape y; x is standardized implicitly in __linear / __gradient"""
 
-        # reshape
-        self.__count = self.__count + 1
-        x_norm = np.hstack((np.ones((np.size(x_norm, axis=0), 1)), x_norm))  # 加一列1
-        y_norm = y_norm.reshape((np.size(x_norm, axis=0), 1))
+        if y_norm is not None:
+            y_norm = np.asarray(y_norm).reshape((x_norm.shape[0], 1))
+        return x_norm, y_norm
 
-        # initialize params
-        if self.__count == 1:
-            self.__set_params(np.random.random((np.size(x_norm, axis=1), 1)))
+    def __linear(self, x_in, out=None):
+        """params[0] + ((x - mean) / std) params[1:], without building (x - mean) / std"""
 
-        # normalization
-        average = np.mean(x_norm, axis=0)
-        std = np.std(x_norm, axis=0)
-        for i in range(np.size(x_norm, axis=1)):
-            if std[i] == 0:
-                continue
-            else:
-                x_norm[:, i] = (x_norm[:, i] - average[i]) / std[i]
-        return x_norm, y_norm
+        params = self.__get_params()
+        weight = params[1:] / self.__scaler.std_.reshape(-1, 1)
+        bias = params[0] - self.__scaler.mean_ @ weight
+        if out is None:
+            return np.asarray(x_in @ weight) + bias
+        if sp.issparse(x_in):
+            out[:] = x_in @ weight
+        else:
+            np.matmul(x_in, weight, out=out)
+        out += bias
+        return out
+
+    def __log_loss(self, y_get, y_in):
+        """cross entropy of the predicted probabilities, plus the L2 penalty"""
+        y_get = np.clip(y_get, EPS, 1 - EPS)
+        j = -1 / np.size(y_get, axis=0) * (np.sum((y_in * np.log(y_get)), axis=0)
+                                           + np.sum(((1 - y_in) * np.log(1 - y_get)), axis=0))
+        if self.lambda_:
+            j = j + self.lambda_ / 2 / np.size(y_get, axis=0) * np.sum(self.__get_params()[1:] ** 2)
+        return j.item()
 
     def __cost_function(self, y_get, y_in, j_list_in):
         """calculate cost j for visualization"""
-        j = -1 / np.size(y_get, axis=0) * (np.sum((y_in * np.log(y_get)), axis=0)
-                                           + np.sum(((1 - y_in) * np.log(1 - y_get)), axis=0))
-        j_list_in.append(j)
+        j_list_in.append(self.__log_loss(y_get, y_in))
         return j_list_in
 
+    def __gradient(self, x_in, y_get, y_in):
+        """gradient of the cost with respect to params"""
+
+        residual = y_get - y_in
+        grad_b = np.sum(residual, axis=0, keepdims=True)
+        # X_norm^T r = (X^T r - mean * sum(r)) / std
+        grad_w = (np.asarray(x_in.T @ residual) - self.__scaler.mean_.reshape(-1, 1) * grad_b) \
+            / self.__scaler.std_.reshape(-1, 1)
+        if self.lambda_:
+            grad_w = grad_w + self.lambda_ * self.__get_params()[1:]
+        return np.vstack((grad_b, grad_w)) / x_in.shape[0]
+
+    def __hessian(self, x_in, y_get):
+        """X_norm^T diag(p(1-p)) X_norm / m, built from x so that sparse x stays sparse"""
+
+        weight = y_get * (1 - y_get)
+        mean = self.__scaler.mean_.reshape(-1, 1)
+        std = self.__scaler.std_.reshape(-1, 1)
+
+        s0 = np.sum(weight)
+        sx = np.asarray(x_in.T @ weight)
+        if sp.issparse(x_in):
+            sxx = (x_in.T @ x_in.multiply(weight)).toarray()
+        else:
+            sxx = x_in.T @ (x_in * weight)
+
+        hessian = np.empty((x_in.shape[1] + 1, x_in.shape[1] + 1))
+        hessian[0, 0] = s0
+        hessian[1:, :1] = (sx - mean * s0) / std
+        hessian[:1, 1:] = hessian[1:, :1].T
+        hessian[1:, 1:] = (sxx - sx @ mean.T - mean @ sx.T + s0 * mean @ mean.T) / (std @ std.T)
+        if self.lambda_:
+            hessian[1:, 1:] += self.lambda_ * np.eye(x_in.shape[1])
+        return hessian / x_in.shape[0]
+
+    def __converged(self, j_list_in, grad, tol, patience=1):
+        """the gradient is ~0, or none of the last patience checks got the cost tol below the best before them
+
+        mini-batch 的cost会上下抖, 单次上升不算收敛, 连续 patience 次都没有新低才停.
+        """
+        if tol is None:
+            return False
+        if np.linalg.norm(grad) < tol:
+            return True
+        return len(j_list_in) > patience and min(j_list_in[-patience:]) > min(j_list_in[:-patience]) - tol
+
     def __back(self, x_in, y_get, y_in):
         """do backprop to adjust params"""
-        grad = AlPHA / np.size(x_in, axis=0) * np.dot(x_in.T, (y_get - y_in))
+        grad = self.alpha * self.__gradient(x_in, y_get, y_in)
         params = self.__get_params()
         params = params - grad
         self.__set_params(params)
         return 0
 
-    def __plot_j(self, j_list_in):
+    def __plot_j(self, epoch_list_in, j_list_in):
         """Visualize the change of j"""
-        plt.plot(range(EPOCH), j_list_in, c="r")
+        plt.plot(epoch_list_in, j_list_in, c="r")
         plt.show()
         return 0
 
     def __forward(self, x_forward):
         """forward prop with sigmoid"""
-        y_predict = 1 / (1 + np.exp(-np.dot(x_forward, self.__get_params())))
+        y_predict = 1 / (1 + np.exp(-self.__linear(x_forward)))
         return y_predict
 
-    def fit(self, x_in, y_in):
-        """Fit the model according to the given training data."""
+    def fit(self, x_in, y_in, batch_size=BATCH_SIZE, tol=TOL, cost_every=COST_EVERY, solver=SOLVER,
+            patience=PATIENCE):
+        """Fit the model according to the given training data.
+
+        Parameters:
+            batch_size: 'gd' only, rows per gradient step, shuffled every epoch; None for full batch
+            tol: stop once the cost gets less than tol below its best so far, or
+                 the norm of the full gradient is below tol; None runs all epochs
+            cost_every: 'gd' only, compute the cost (and check tol) every cost_every epochs
+            patience: 'gd' with mini-batches only, checks in a row without a new best before stopping
+            solver: 'gd'    -- gradient descent, self.epoch epochs of step self.alpha
+                    'irls'  -- Newton / IRLS, a few iterations, each solves a (features x features) system
+                    'lbfgs' -- limited-memory quasi-Newton, for wide data
+                    'auto'  -- irls up to IRLS_MAX_FEATURES features, else lbfgs
+        """
         # pbar = tqdm(total=EPOCH)
 
+        # fit scaler, initialize params
+        self.__scaler = Standardizer().fit(x_in)
+        self.__set_params(np.random.random((x_in.shape[1] + 1, 1)))
         x_in, y_in = self.__normalize(x_in, y_in)
 
+        if solver == 'auto':
+            solver = 'irls' if x_in.shape[1] <= IRLS_MAX_FEATURES else 'lbfgs'
+        if solver == 'gd':
+            epoch_list, j_list = self.__gradient_descent(x_in, y_in, batch_size, tol, cost_every, patience)
+        elif solver == 'irls':
+            epoch_list, j_list = self.__irls(x_in, y_in, tol)
+        elif solver == 'lbfgs':
+            epoch_list, j_list = self.__lbfgs(x_in, y_in, tol)
+        else:
+            raise ValueError("solver must be 'gd', 'irls', 'lbfgs' or 'auto', got %r" % solver)
+        # pbar.close()
+        self.n_iter_ = epoch_list[-1] + 1
+        self.cost_ = j_list[-1]
+
+        # plot
+        self.__plot_j(epoch_list, j_list)
+        print("Minimized cost: %.5f" % j_list[-1])
+        return self
+
+    def __gradient_descent(self, x_in, y_in, batch_size, tol, cost_every, patience):
+        """(mini-batch) gradient descent, returns the checked epochs and their cost"""
+
+        rows = x_in.shape[0]
+        if batch_size is None or batch_size >= rows:
+            batch_size = rows
+        # full batch 的cost没有噪声, 一次就够
+        if batch_size == rows:
+            patience = 1
+
         # initialize the list to store cost j
         j_list = []
+        epoch_list = []
 
         # fit
-        for epoch in range(EPOCH):
-            y_get = self.__forward(x_in)
-            j_list = self.__cost_function(y_get, y_in, j_list)
-            self.__back(x_in, y_get, y_in)
-            if epoch % 50 == 0:
+        for epoch in range(self.epoch):
+            check = epoch % cost_every == 0 or epoch == self.epoch - 1
+
+            if batch_size == rows:
+                y_get = self.__forward(x_in)
+                if check:
+                    j_list = self.__cost_function(y_get, y_in, j_list)
+                    grad = self.__gradient(x_in, y_get, y_in)
+                self.__back(x_in, y_get, y_in)
+            else:
+                # 每个epoch打乱顺序
+                order = np.random.permutation(rows)
+                for start in range(0, rows, batch_size):
+                    index = order[start:start + batch_size]
+                    x_batch, y_batch = x_in[index], y_in[index]
+                    self.__back(x_batch, self.__forward(x_batch), y_batch)
+                if check:
+                    y_get = self.__forward(x_in)
+                    j_list = self.__cost_function(y_get, y_in, j_list)
+                    grad = self.__gradient(x_in, y_get, y_in)
+
+            if not check:
+                continue
+            epoch_list.append(epoch)
+            if epoch % 50 < cost_every:  # 大约每50个epoch打印一次
                 # pbar.update(50)
                 print("EPOCH: %4d" % epoch, " | Cost: ", j_list[-1])
-        # pbar.close()
+            if self.__converged(j_list, grad, tol, patience):
+                break
+        return epoch_list, j_list
+
+    def __irls(self, x_in, y_in, tol):
+        """Newton's method (IRLS): each step solves (X^T W X) step = X^T (p - y)
+
+        Starts from params = 0 and halves the step while the cost goes up.
+        One-hot columns are collinear with the bias, so the system is solved
+        with lstsq (minimum norm step) instead of an inverse.
+        """
+        self.__set_params(np.zeros_like(self.__get_params()))
+        y_get = self.__forward(x_in)
+        j_list = self.__cost_function(y_get, y_in, [])
+        epoch_list = [0]
+
+        for epoch in range(1, self.newton_epoch + 1):
+            grad = self.__gradient(x_in, y_get, y_in)
+            if self.__converged(j_list, grad, tol) or np.linalg.norm(grad) == 0:
+                break
+
+            # Hessian = X^T diag(p(1-p)) X / m
+            hessian = self.__hessian(x_in, y_get)
+            direction = -np.linalg.lstsq(hessian, grad, rcond=None)[0]
+
+            params = self.__get_params()
+            step = 1.0
+            while True:
+                self.__set_params(params + step * direction)
+                y_get = self.__forward(x_in)
+                j = self.__log_loss(y_get, y_in)
+                if j <= j_list[-1] or step < 1e-10:
+                    break
+                step /= 2
+
+            j_list.append(j)
+            epoch_list.append(epoch)
+            print("ITER: %4d" % epoch, " | Cost: ", j_list[-1])
+        return epoch_list, j_list
+
+    def __lbfgs(self, x_in, y_in, tol):
+        """L-BFGS with a backtracking (Armijo) line search
+
+        Keeps the last LBFGS_MEMORY pairs of s (change of params) and t (change
+        of gradient) instead of a Hessian.
+        """
+        s_list = []
+        t_list = []
+        params = self.__get_params()
+        y_get = self.__forward(x_in)
+        grad = self.__gradient(x_in, y_get, y_in)
+        j_list = self.__cost_function(y_get, y_in, [])
+        epoch_list = [0]
+
+        for epoch in range(1, self.newton_epoch + 1):
+            if self.__converged(j_list, grad, tol) or np.linalg.norm(grad) == 0:
+                break
+
+            # two-loop recursion: direction = -H * grad
+            q = grad.copy()
+            history = []
+            for s, t in zip(reversed(s_list), reversed(t_list)):
+                rho = 1 / np.sum(t * s)
+                a = rho * np.sum(s * q)
+                q -= a * t
+                history.append((rho, a))
+            if s_list:
+                q *= np.sum(s_list[-1] * t_list[-1]) / np.sum(t_list[-1] * t_list[-1])
+            for (s, t), (rho, a) in zip(zip(s_list, t_list), reversed(history)):
+                b = rho * np.sum(t * q)
+                q += s * (a - b)
+            direction = -q
+
+            # 不是下降方向时退回梯度方向
+            slope = np.sum(grad * direction)
+            if slope >= 0:
+                s_list, t_list = [], []
+                direction = -grad
+                slope = -np.sum(grad * grad)
+
+            # backtracking line search
+            step = 1.0
+            while True:
+                self.__set_params(params + step * direction)
+                y_get = self.__forward(x_in)
+                j = self.__log_loss(y_get, y_in)
+                if j <= j_list[-1] + 1e-4 * step * slope or step < 1e-10:
+                    break
+                step /= 2
+
+            new_grad = self.__gradient(x_in, y_get, y_in)
+            s, t = step * direction, new_grad - grad
+            if np.sum(s * t) > EPS:
+                s_list.append(s)
+                t_list.append(t)
+                if len(s_list) > LBFGS_MEMORY:
+                    s_list.pop(0)
+                    t_list.pop(0)
+            params = self.__get_params()
+            grad = new_grad
+            j_list.append(j)
+            epoch_list.append(epoch)
+            print("ITER: %4d" % epoch, " | Cost: ", j_list[-1])
+        return epoch_list, j_list
+
+    def partial_fit(self, x_in, y_in):
+        """Do one gradient step on a mini-batch.
+
+        Used to train on data that does not fit in memory (see
+        feature_store.stream_batches). The first call fits the scaler on its
+        batch and initializes params, later calls keep both.
+        """
+        if self.__scaler is None:
+            self.__scaler = Standardizer().fit(x_in)
+            self.__set_params(np.random.random((x_in.shape[1] + 1, 1)))
 
-        # plot
-        self.__plot_j(j_list)
-        print("Minimized cost: %.5f" % j_list[-1])
+        x_in, y_in = self.__normalize(x_in, y_in)
+        y_get = self.__forward(x_in)
+        self.__back(x_in, y_get, y_in)
         return self
 
-    def predict(self, x_pre, y_pre):
-        """Predict class labels for samples in X."""
-        # y_pre is useless here
-        x_pre, y_pre = self.__normalize(x_pre, np.ones((np.size(x_pre, axis=0), 1)))
+    def decision_function(self, x_pre, out=None):
+        """Logit of each row of x.
 
-        y_pre = self.__forward(x_pre)
+        Parameters:
+            x_pre: (rows, features) matrix, dense or sparse
+            out: optional preallocated (rows, 1) float64 matrix to write into
 
-        # 化成0/1
-        for j in range(np.size(y_pre, axis=0)):
-            if y_pre[j] >= SCALE:
-                y_pre[j] = 1
-            else:
-                y_pre[j] = 0
+        Returns:
+            (rows, 1) matrix
+        """
+        return self.__linear(x_pre, out=out)
+
+    def predict_proba(self, x_pre, out=None):
+        """P(y = 1) of each row of x, computed in place in out when given."""
 
-        return y_pre
+        out = self.decision_function(x_pre, out=out)
+        # sigmoid in place: 1 / (1 + exp(-z))
+        np.negative(out, out=out)
+        np.exp(out, out=out)
+        out += 1
+        np.reciprocal(out, out=out)
+        return out
+
+    def predict(self, x_pre, y_pre=None, out=None):
+        """Predict class labels for samples in X.
+
+        sigmoid(z) >= scale is the same as z >= log(scale / (1 - scale)), so
+        the labels come straight from the logit without computing exp.
+        """
+        # y_pre is useless here
+        out = self.decision_function(x_pre, out=out)
+
+        # 化成0/1
+        np.greater_equal(out, np.log(self.scale / (1 - self.scale)), out=out)
+        return out
 
     def __get_params(self):
         """Get parameters for this estimator."""
@@ -162,21 +410,9 @@ class LogisticRegression(object):
     def score(self, x_score, y_score):
         """Returns the mean accuracy on the given test data and labels."""
 
-        x_score, y_score = self.__normalize(x_score, y_score)
-        y_pred = self.__forward(x_score)
-
         # record the right classify
-        count = 0
-
-        # turn into 0/1, then judge
-        for j in range(np.size(y_score, axis=0)):
-            if y_pred[j] >= SCALE:
-                y_pred[j] = 1
-            else:
-                y_pred[j] = 0
-            if y_pred[j] == y_score[j]:
-                count = count + 1
-        accuracy = count / np.size(y_score, axis=0) * 100
+        y_pred = self.predict(x_score)
+        accuracy = np.mean(y_pred.ravel() == np.ravel(y_score)) * 100
         print("acc:            %.4f%%" % accuracy)
         return 0
 
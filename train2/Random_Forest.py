@@ -0,0 +1,229 @@
+import os
+import multiprocessing
+import numpy as np
+import shared_data
+from shared_data import SharedArrays
+from CART import CartDecisionTree, LEVELS, quantize
+from feature_store import leave_out
+
+
+# 超参(默认值, 每个实例可以单独设置)
+N_TREES = 100            # 树的数量
+MAX_FEATURES = 'sqrt'    # 每次分裂随机看几列, 同 CartDecisionTree
+MAX_DEPTH = None
+MIN_SAMPLES_SPLIT = 2
+MAX_BINS = None          # 同 CartDecisionTree, None: 精确搜索
+WORKERS = None           # 建树的进程数, None: os.cpu_count(); 1: 在本进程里建
+BLOCK = 4096             # predict 每次算多少行
+
+
+def _bootstrap(seed, rows):
+    """rows drawn with replacement, the same in the parent and in the worker"""
+    return np.random.RandomState(seed).randint(0, rows, rows)
+
+
+def _grow(x_in, y_in, task, bins=None):
+    """Fit one tree on a bootstrap sample of x_in, y_in; bins: quantize(x_in, max_bins), then x_in is unused"""
+
+    params, bootstrap_seed, tree_seed = task
+    tree = CartDecisionTree(random_state=tree_seed, prune=False, workers=1, **params)
+    return tree.fit(x_in, y_in, samples=_bootstrap(bootstrap_seed, np.size(y_in, axis=0)), bins=bins)
+
+
+def _grow_shared(task):
+    """Pool task: grow a tree on the shared matrices, only the fitted arrays are pickled back."""
+
+    arrays = shared_data.ARRAYS
+    if 'x' in arrays:
+        return _grow(arrays['x'], arrays['y'], task)
+    # 共享的是转置(按行存储), 再转置回来就是 CART 要的按列存储
+    return _grow(None, arrays['y'], task, (arrays['bins_t'].T, arrays['edges']))
+
+
+class RandomForest(object):
+    """Random forest of CartDecisionTrees.
+
+    Every tree is grown unpruned on a bootstrap sample of the rows, trying
+    max_features random columns per split. Trees are grown in a process pool;
+    the training matrix is copied once into shared memory and a tree only
+    gets the seed of its bootstrap sample, the sample itself is an index
+    array built in the worker. With max_bins the matrix is quantized once in
+    fit and only the uint8 bins and the edges are shared, every tree splits
+    on the same bins.
+
+    After fit the trees are flattened into one set of node arrays (the nodes
+    of tree t start at offsets_[t]), so predict moves every (row, tree) pair
+    down one level per step with fancy indexing and averages the class
+    shares of the leaves they reach.
+
+    Methods:
+        fit           -- grow the trees, then the out-of-bag score
+        predict_proba -- average class shares of the leaves
+        predict       -- class with the largest average share
+        apply         -- leaf of every row in every tree
+        score         -- print the acc
+
+    Attributes:
+        n_trees, max_features, max_depth, min_samples_split, max_bins, workers, random_state:
+            default to the module constants
+        oob_score: compute the out-of-bag score in fit
+        trees_: fitted CartDecisionTrees
+        classes_: the classes, column k of predict_proba is classes_[k]
+        offsets_: first node of each tree in the flat arrays
+        oob_score_: acc (%) of the out-of-bag predictions, over rows that were out of bag at least once
+        oob_proba_: (rows, classes) out-of-bag class shares, nan for rows in every bootstrap sample
+    """
+    def __init__(self, n_trees=N_TREES, max_features=MAX_FEATURES, max_depth=MAX_DEPTH,
+                 min_samples_split=MIN_SAMPLES_SPLIT, max_bins=MAX_BINS, oob_score=True, workers=WORKERS,
+                 random_state=0):
+        self.n_trees = n_trees
+        self.max_features = max_features
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        self.max_bins = max_bins
+        self.oob_score = oob_score
+        self.workers = workers
+        self.random_state = random_state
+        self.trees_ = None
+        self.classes_ = None
+        self.offsets_ = None
+        self.oob_score_ = None
+        self.oob_proba_ = None
+        self.__step = None
+        self.__leaf = None
+        self.__share = None
+
+    def fit(self, x_in, y_in):
+        """grow n_trees trees on bootstrap samples of x_in, y_in"""
+
+        x_in = np.asarray(x_in, dtype=np.float64)
+        y_in = np.ravel(y_in)
+        rows = np.size(y_in, axis=0)
+        params = {'max_features': self.max_features, 'max_depth': self.max_depth,
+                  'min_samples_split': self.min_samples_split, 'max_bins': self.max_bins}
+        # 每棵树两个种子: bootstrap 和选列
+        seeds = np.random.RandomState(self.random_state).randint(2 ** 31, size=(self.n_trees, 2))
+        tasks = [(params, int(bootstrap_seed), int(tree_seed)) for bootstrap_seed, tree_seed in seeds]
+
+        # 分箱只做一次, 所有树共用
+        bins = None if self.max_bins is None else quantize(x_in, self.max_bins)
+        workers = os.cpu_count() if self.workers is None else self.workers
+        if workers == 1:
+            self.trees_ = [_grow(x_in, y_in, task, bins) for task in tasks]
+        else:
+            matrices = {'x': x_in} if bins is None else {'bins_t': bins[0].T, 'edges': bins[1]}
+            with SharedArrays(y=y_in, **matrices) as shared:
+                with multiprocessing.Pool(workers, initializer=shared_data.attach, initargs=(shared.specs,)) as pool:
+                    self.trees_ = pool.map(_grow_shared, tasks, chunksize=1)
+
+        # 每棵树的 classes_ 都来自全部的 y
+        self.classes_ = self.trees_[0].classes_
+        self.__flatten()
+        if self.oob_score:
+            self.__oob(x_in, y_in, seeds[:, 0])
+        return self
+
+    def __flatten(self):
+        """trees -> one set of node arrays, child ids shifted by the tree's offset
+
+        和 CartDecisionTree.apply 一样, 叶子的两个分支都指向自己.
+        """
+        sizes = [len(tree.feature_) for tree in self.trees_]
+        self.offsets_ = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.intp)
+        feature = np.concatenate([tree.feature_ for tree in self.trees_])
+        threshold = np.concatenate([tree.threshold_ for tree in self.trees_])
+        true_branch = np.concatenate([tree.true_ + offset for tree, offset in zip(self.trees_, self.offsets_)])
+        false_branch = np.concatenate([tree.false_ + offset for tree, offset in zip(self.trees_, self.offsets_)])
+        counts = np.concatenate([tree.counts_ for tree in self.trees_])
+
+        ids = np.arange(len(feature))
+        self.__leaf = feature < 0
+        self.__step = (np.where(self.__leaf, 0, feature),
+                       np.where(self.__leaf, np.inf, threshold),
+                       np.column_stack((np.where(self.__leaf, ids, false_branch),
+                                        np.where(self.__leaf, ids, true_branch))).ravel())
+        # 每个节点训练行里各类别的占比
+        self.__share = counts / np.sum(counts, axis=1, keepdims=True)
+        return 0
+
+    def __oob(self, x_in, y_in, bootstrap_seeds):
+        """out-of-bag class shares: each row is averaged over the trees whose sample missed it"""
+
+        rows = np.size(y_in, axis=0)
+        total = np.zeros((rows, len(self.classes_)))
+        votes = np.zeros(rows)
+        for tree, offset, seed in zip(self.trees_, self.offsets_, bootstrap_seeds):
+            out_of_bag = np.flatnonzero(np.bincount(_bootstrap(seed, rows), minlength=rows) == 0)
+            total[out_of_bag] += self.__share[tree.apply(x_in[out_of_bag]) + offset]
+            votes[out_of_bag] += 1
+
+        seen = votes > 0
+        self.oob_proba_ = np.full_like(total, np.nan)
+        self.oob_proba_[seen] = total[seen] / votes[seen, None]
+        y_get = self.classes_[np.argmax(self.oob_proba_[seen], axis=1)]
+        self.oob_score_ = np.mean(y_get == y_in[seen]) * 100
+        return 0
+
+    def apply(self, x_in):
+        """return the (rows, n_trees) flat node id of the leaf each row reaches in each tree
+
+        (行, 树) 对一起从各棵树的根往下走, 每一步各下降一层, 到叶子的对每 LEVELS 层去掉一次.
+        """
+        feature, threshold, child = self.__step
+        x_in = np.ascontiguousarray(x_in, dtype=np.float64)
+        rows, features = np.shape(x_in)
+        trees = len(self.offsets_)
+        x_flat = x_in.ravel()
+
+        leaf = np.tile(self.offsets_, rows)
+        active = np.flatnonzero(~self.__leaf[leaf])
+        while len(active):
+            node = leaf[active]
+            offset = active // trees * features
+            for _ in range(LEVELS):
+                node = child[2 * node + (x_flat[offset + feature[node]] >= threshold[node])]
+            leaf[active] = node
+            active = active[~self.__leaf[node]]
+        return leaf.reshape(rows, trees)
+
+    def predict_proba(self, x_in, out=None):
+        """average over the trees of the class shares of the leaves, BLOCK rows at a time
+
+        Parameters:
+            out: optional preallocated (rows, classes) float64 matrix to write into
+        """
+        rows = np.size(x_in, axis=0)
+        if out is None:
+            out = np.zeros((rows, len(self.classes_)))
+        for start in range(0, rows, BLOCK):
+            leaf = self.apply(x_in[start:start + BLOCK])
+            np.mean(self.__share[leaf], axis=1, out=out[start:start + BLOCK])
+        return out
+
+    def predict(self, x_in, y_in=None, out=None):
+        """return predicted label
+
+        y_in is useless here.
+
+        Parameters:
+            out: optional preallocated (rows, 1) matrix to write into
+        """
+        if out is None:
+            out = np.zeros((np.size(x_in, axis=0), 1), dtype=self.classes_.dtype)
+        out[:, 0] = self.classes_[np.argmax(self.predict_proba(x_in), axis=1)]
+        return out
+
+    def score(self, x_in, y_in):
+        """得出测试集的acc"""
+
+        y_get = self.predict(x_in)
+        accuracy = np.mean(y_get.ravel() == np.ravel(y_in)) * 100
+        print("ACC:  %.4f%%" % accuracy)
+        return 0
+
+
+if __name__ == "__main__":
+    x, y, x_test, y_test = leave_out()
+    clf = RandomForest().fit(x, y)
+    print("OOB:  %.4f%%" % clf.oob_score_)
+    clf.score(x_test, y_test)
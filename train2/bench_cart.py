@@ -0,0 +1,57 @@
+"""Scaling of the CartDecisionTree split search from 1 to N threads.
+
+    python bench_cart.py
+"""
+import os
+import time
+import numpy as np
+
+from CART import CartDecisionTree
+from synthetic import make_titanic_matrix
+
+
+# (行数, 特征数)
+CASES = [(50000, 120), (100000, 240)]
+# None: 精确搜索
+BINS = [None, 255]
+MAX_DEPTH = 8
+
+
+def worker_counts(limit=None):
+    """1, 2, 4, ... up to the number of cores, and the number of cores itself."""
+
+    limit = limit or os.cpu_count()
+    counts = [1]
+    while counts[-1] * 2 <= limit:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != limit:
+        counts.append(limit)
+    return counts
+
+
+def bench(rows, features):
+    x, y = make_titanic_matrix(rows, features)
+
+    print('%d rows x %d features, max_depth %d' % (rows, features, MAX_DEPTH))
+    for max_bins in BINS:
+        baseline = None
+        reference = None
+        for workers in worker_counts():
+            start = time.perf_counter()
+            clf = CartDecisionTree(max_depth=MAX_DEPTH, max_bins=max_bins, workers=workers).fit(x, y)
+            seconds = time.perf_counter() - start
+            baseline = baseline or seconds
+            # 线程数不应该改变树
+            if reference is None:
+                reference = clf
+            same = np.array_equal(clf.feature_, reference.feature_) \
+                and np.array_equal(clf.threshold_, reference.threshold_, equal_nan=True)
+            print('    %-10s workers %3d %8.3fs | %5.2fx | %s' % (
+                'exact' if max_bins is None else 'bins=%d' % max_bins, workers, seconds, baseline / seconds,
+                'same tree' if same else 'DIFFERENT TREE'))
+    return 0
+
+
+if __name__ == "__main__":
+    for case in CASES:
+        bench(*case)
@@ -0,0 +1,56 @@
+import time
+import numpy as np
+from sklearn.feature_extraction import DictVectorizer
+
+from feature_store import DROP_COLUMNS
+from preprocessing import ColumnEncoder
+from synthetic import make_titanic_frame
+
+
+# 行数
+ROWS = [10000, 1000000, 10000000]
+# DictVectorizer 每行一个dict, 超过这个行数就跳过(内存与时间都太大)
+DICT_MAX_ROWS = 1000000
+REPEAT = 3
+
+
+def timeit(func):
+    """Best wall time of REPEAT runs, and the last result."""
+
+    best = float('inf')
+    result = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def dict_path(data_frame):
+    """原来的做法: to_dict(orient='records') -> DictVectorizer"""
+    return DictVectorizer(sparse=False).fit_transform(data_frame.to_dict(orient='records'))
+
+
+def bench(rows):
+    data_frame = make_titanic_frame(rows).ffill()
+    for column in DROP_COLUMNS:
+        del data_frame[column]
+
+    t_dense, dense = timeit(lambda: ColumnEncoder().fit_transform(data_frame))
+    t_sparse, sparse = timeit(lambda: ColumnEncoder(sparse=True).fit_transform(data_frame))
+    assert np.array_equal(sparse.toarray(), dense)
+
+    line = '%10d | columnar dense %8.3fs | columnar csr %8.3fs' % (rows, t_dense, t_sparse)
+    if rows <= DICT_MAX_ROWS:
+        t_dict, reference = timeit(lambda: dict_path(data_frame))
+        assert np.array_equal(reference, dense)
+        line += ' | DictVectorizer %8.3fs | speedup %6.1fx' % (t_dict, t_dict / t_dense)
+    else:
+        line += ' | DictVectorizer  skipped'
+    print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    for n in ROWS:
+        bench(n)
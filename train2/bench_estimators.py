@@ -0,0 +1,241 @@
+"""Benchmark the train2 / train3 estimators on synthetic titanic-shaped data.
+
+Every (model, rows, features) case runs in its own process, so peak RSS is
+per case and a case that hangs can be killed. Results go to a json file;
+compare two of them to see regressions between versions. The suite exits
+with status 1 if any case errors or times out:
+
+    python bench_estimators.py --output new.json
+    python bench_estimators.py --compare old.json new.json
+"""
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import contextlib
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # fit() 里的 plt.show() 不弹窗
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'train3'))
+
+
+# 规模
+ROWS = [1000, 10000, 100000, 1000000]
+FEATURES = [10, 100, 1000]
+# rows * features 超过这个值的组合跳过(稠密float64, 约400MB)
+MAX_CELLS = 5 * 10 ** 7
+# 每个模型能跑的最大行数(逐行循环 / O(n^2) 的实现跑不动更大的)
+MAX_ROWS = {
+    'LogisticRegression': 1000000,
+    'LinearSVM': 1000000,
+    'CartDecisionTree': 10000,
+    'RandomForest': 10000,
+    'FC': 10000,
+    'bagging': 10000,
+    'adaboost': 10000,
+}
+MODELS = list(MAX_ROWS)
+
+# 预测延迟
+SINGLE_REPEAT = 200
+BATCH_SIZE = 1000
+BATCH_REPEAT = 20
+# 单个case超时(秒)
+TIMEOUT = 1800
+
+
+def _percentiles(seconds):
+    """p50 / p99 in milliseconds."""
+    seconds = np.asarray(seconds) * 1000
+    return float(np.percentile(seconds, 50)), float(np.percentile(seconds, 99))
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process (ru_maxrss is KB on linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _build(model):
+    """Return (fit, predict) callables for a model name; predict is None for the ensembles."""
+
+    if model == 'LogisticRegression':
+        from Logistic_Regression import LogisticRegression
+        return lambda x, y: LogisticRegression().fit(x, y), lambda clf, x: clf.predict(x)
+    if model == 'LinearSVM':
+        from Linear_SVM import LinearSVM
+        return lambda x, y: LinearSVM().fit(x, y), lambda clf, x: clf.predict(x)
+    if model == 'CartDecisionTree':
+        from CART import CartDecisionTree
+        return lambda x, y: CartDecisionTree().fit(x, y), lambda clf, x: clf.predict(x)
+    if model == 'RandomForest':
+        from Random_Forest import RandomForest
+        return lambda x, y: RandomForest().fit(x, y), lambda clf, x: clf.predict(x)
+    if model == 'FC':
+        from FC import FC, ReLU
+        return lambda x, y: FC(layer_num=3, layer_size=[20], activation=ReLU()).fit(x, y), \
+            lambda clf, x: clf.predict(x)
+    if model == 'bagging':
+        from Bagging import bagging
+        return lambda x, y: bagging(x, y, x, y), None
+    if model == 'adaboost':
+        from Adaboost import adaboost
+        return lambda x, y: adaboost(x, y, x, y), None
+    raise KeyError('Unknown model: %s' % model)
+
+
+def run_case(model, rows, features, seed=0):
+    """Fit and time one case in this process.
+
+    Returns:
+        dict with fit time, single-row / batch predict latency (p50, p99 in ms),
+        batch throughput (rows/s) and peak RSS (MB)
+    """
+    from synthetic import make_titanic_matrix
+
+    x, y = make_titanic_matrix(rows, features, random_state=seed)
+    record = {'model': model, 'rows': rows, 'features': features, 'data_rss_mb': _peak_rss_mb()}
+    fit, predict = _build(model)
+
+    # 训练时的输出不计入
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        clf = fit(x, y)
+        record['fit_s'] = time.perf_counter() - start
+
+        if predict is not None:
+            predict(clf, x[:1])  # warm up
+
+            rng = np.random.RandomState(seed)
+            single = []
+            for i in rng.randint(0, rows, SINGLE_REPEAT):
+                start = time.perf_counter()
+                predict(clf, x[i:i + 1])
+                single.append(time.perf_counter() - start)
+
+            batch_size = min(BATCH_SIZE, rows)
+            batch = []
+            for i in rng.randint(0, rows - batch_size + 1, BATCH_REPEAT):
+                start = time.perf_counter()
+                predict(clf, x[i:i + batch_size])
+                batch.append(time.perf_counter() - start)
+
+            record['single_p50_ms'], record['single_p99_ms'] = _percentiles(single)
+            record['batch_size'] = batch_size
+            record['batch_p50_ms'], record['batch_p99_ms'] = _percentiles(batch)
+            record['throughput_rows_s'] = batch_size / np.median(batch)
+
+    record['fit_throughput_rows_s'] = rows / record['fit_s']
+    record['peak_rss_mb'] = _peak_rss_mb()
+    record['status'] = 'ok'
+    return record
+
+
+def run_isolated(model, rows, features, seed=0, timeout=TIMEOUT):
+    """Run one case in a child process and parse its json line."""
+
+    record = {'model': model, 'rows': rows, 'features': features}
+    command = [sys.executable, os.path.abspath(__file__), '--case', model, str(rows), str(features),
+               '--seed', str(seed)]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except subprocess.TimeoutExpired:
+        record['status'] = 'timeout'
+        return record
+    if result.returncode != 0:
+        record['status'] = 'error'
+        record['error'] = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else str(result.returncode)
+        return record
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(models=MODELS, rows_list=ROWS, features_list=FEATURES, seed=0, timeout=TIMEOUT):
+    """Run the whole grid, skipping cases above MAX_CELLS / MAX_ROWS."""
+
+    results = []
+    for model in models:
+        for rows in rows_list:
+            for features in features_list:
+                if rows * features > MAX_CELLS or rows > MAX_ROWS[model]:
+                    results.append({'model': model, 'rows': rows, 'features': features, 'status': 'skipped'})
+                    continue
+                record = run_isolated(model, rows, features, seed, timeout)
+                results.append(record)
+                print('%-18s %8d x %4d | %-7s | fit %s' % (
+                    model, rows, features, record['status'],
+                    '%9.3fs' % record['fit_s'] if 'fit_s' in record else record.get('error', '')))
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def compare(old_path, new_path):
+    """Print new / old ratios of fit time and batch latency for the shared cases."""
+
+    with open(old_path) as f:
+        old = {(r['model'], r['rows'], r['features']): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = json.load(f)['results']
+
+    print('%-18s %8s %5s | %10s | %12s' % ('model', 'rows', 'feat', 'fit new/old', 'batch new/old'))
+    for record in new:
+        before = old.get((record['model'], record['rows'], record['features']))
+        if before is None or before.get('status') != 'ok' or record.get('status') != 'ok':
+            continue
+        fit_ratio = record['fit_s'] / before['fit_s']
+        batch_ratio = record['batch_p50_ms'] / before['batch_p50_ms'] if 'batch_p50_ms' in record else float('nan')
+        print('%-18s %8d %5d | %10.2fx | %12.2fx' % (record['model'], record['rows'], record['features'],
+                                                     fit_ratio, batch_ratio))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--case', nargs=3, metavar=('MODEL', 'ROWS', 'FEATURES'), help='run one case, print json')
+    parser.add_argument('--models', nargs='+', default=MODELS)
+    parser.add_argument('--rows', nargs='+', type=int, default=ROWS)
+    parser.add_argument('--features', nargs='+', type=int, default=FEATURES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=TIMEOUT)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case[0], int(args.case[1]), int(args.case[2]), args.seed)))
+    elif args.compare:
+        compare(*args.compare)
+    else:
+        report = run_suite(args.models, args.rows, args.features, args.seed, args.timeout)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('results written to %s' % args.output)
+        # 有模型跑不起来时不能当作正常结果
+        failed = [r for r in report['results'] if r['status'] in ('error', 'timeout')]
+        for record in failed:
+            print('FAILED %s %d x %d: %s' % (record['model'], record['rows'], record['features'],
+                                             record.get('error', record['status'])))
+        if failed:
+            sys.exit(1)
@@ -0,0 +1,53 @@
+import io
+import time
+import contextlib
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # fit() 里的 plt.show() 不弹窗
+
+from Logistic_Regression import LogisticRegression, IRLS_MAX_FEATURES, BATCH_SIZE
+from synthetic import make_titanic_matrix
+
+
+# (行数, 特征数)
+CASES = [(10000, 9), (100000, 9), (100000, 100), (10000, 1000)]
+# gd 默认是 mini-batch, batch_size=None 是 full batch
+SOLVERS = [('gd', {'batch_size': None}), ('gd', {'batch_size': BATCH_SIZE}), ('irls', {}), ('lbfgs', {})]
+# 与最优cost相差不超过这个值算作收敛
+TARGET_GAP = 1e-4
+# 参考解的 irls / lbfgs 最大迭代次数
+REFERENCE_EPOCH = 200
+
+
+def fit(x, y, solver, kwargs, params=None):
+    """Fit quietly, return (seconds, epochs / iterations, final cost).
+
+    params: constructor arguments, kwargs: fit arguments
+    """
+    np.random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        clf = LogisticRegression(**(params or {})).fit(x, y, solver=solver, **kwargs)
+        seconds = time.perf_counter() - start
+    return seconds, clf.n_iter_, clf.cost_
+
+
+def bench(rows, features):
+    x, y = make_titanic_matrix(rows, features)
+
+    # 用很小的tol跑irls得到最优cost作为参考
+    best = fit(x, y, 'lbfgs' if features > IRLS_MAX_FEATURES else 'irls', {'tol': 1e-12},
+               {'newton_epoch': REFERENCE_EPOCH})[2]
+
+    print('%d rows x %d features, optimal cost %.6f' % (rows, features, best))
+    for solver, kwargs in SOLVERS:
+        seconds, n_iter, cost = fit(x, y, solver, kwargs)
+        name = solver + (' batch=%d' % kwargs['batch_size'] if kwargs.get('batch_size') else '')
+        print('    %-16s %5d iters | %8.3fs | cost %.6f | %s' % (
+            name, n_iter, seconds, cost, 'reached' if cost - best <= TARGET_GAP else 'not reached'))
+    return 0
+
+
+if __name__ == "__main__":
+    for case in CASES:
+        bench(*case)
@@ -0,0 +1,58 @@
+"""Per-row sgd against mini-batch pegasos and dual coordinate descent for LinearSVM.
+
+    python bench_svm.py
+"""
+import io
+import time
+import contextlib
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # fit() 里的 plt.show() 不弹窗
+
+from Linear_SVM import LinearSVM
+from synthetic import make_titanic_matrix
+
+
+# (行数, 特征数)
+CASES = [(100000, 9), (100000, 100), (300000, 9), (1000000, 9)]
+SOLVERS = [('sgd', {}), ('pegasos', {}), ('pegasos', {'batch_size': 4096}), ('dual_cd', {})]
+# 逐行的sgd超过这个行数就跳过
+SGD_MAX_ROWS = 300000
+# 留出多少行算准确率
+TEST_ROWS = 20000
+
+
+def fit(x, y, solver, kwargs):
+    """Fit quietly, return (seconds, fitted model)."""
+
+    np.random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        clf = LinearSVM().fit(x, y.copy(), solver=solver, **kwargs)
+        seconds = time.perf_counter() - start
+    return seconds, clf
+
+
+def bench(rows, features):
+    x, y = make_titanic_matrix(rows + TEST_ROWS, features)
+    x, y, x_test, y_test = x[:rows], y[:rows], x[rows:], y[rows:]
+
+    print('%d rows x %d features' % (rows, features))
+    baseline = None
+    for solver, kwargs in SOLVERS:
+        name = solver + (' batch=%d' % kwargs['batch_size'] if 'batch_size' in kwargs else '')
+        if solver == 'sgd' and rows > SGD_MAX_ROWS:
+            print('    %-20s skipped' % name)
+            continue
+        seconds, clf = fit(x, y, solver, kwargs)
+        accuracy = np.mean(clf.predict(x_test).ravel() == y_test) * 100
+        if solver == 'sgd':
+            baseline = seconds
+        print('    %-20s %8.3fs | %s | acc %.2f%%' % (
+            name, seconds, '%7.1fx' % (baseline / seconds) if baseline else '      -', accuracy))
+    return 0
+
+
+if __name__ == "__main__":
+    for case in CASES:
+        bench(*case)
@@ -0,0 +1,242 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from preprocessing import Preprocessor
+
+
+# 缓存目录(位于csv同级目录下)
+CACHE_DIR = '.cache'
+# 缓存格式版本, 预处理方式改变时加一
+CACHE_VERSION = 2
+# 分块读取时每块的行数
+CHUNK_SIZE = 10000
+# 分块读取时用前多少行拟合预处理
+SAMPLE_ROWS = 100000
+# 删除不必要特征
+DROP_COLUMNS = ['PassengerId', 'Cabin', 'Name', 'Ticket']
+# 稀疏矩阵可以保留高基数的 Name / Ticket / Cabin
+SPARSE_DROP_COLUMNS = ['PassengerId']
+LABEL = 'Survived'
+
+
+def _digest(data):
+    """md5 of a bytes object."""
+    return hashlib.md5(data).hexdigest()
+
+
+def _file_digest(path):
+    """md5 of the source csv, used as the cache key."""
+
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def _cache_paths(path, key):
+    """Return (matrix path, schema path) of the cache for a csv."""
+
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    prefix = os.path.join(cache_dir, '%s.v%d.%s' % (stem, CACHE_VERSION, key[:16]))
+    return prefix + '.npy', prefix + '.json'
+
+
+def load_frame(path):
+    """Read a titanic csv."""
+    return pd.read_csv(path)
+
+
+def _write_cache(matrix_path, schema_path, data_get, schema):
+    """Write matrix and schema next to each other, atomically."""
+
+    os.makedirs(os.path.dirname(matrix_path), exist_ok=True)
+    tmp_path = matrix_path + '.%d.tmp' % os.getpid()
+    with open(tmp_path, 'wb') as f:
+        np.save(f, data_get)
+    os.replace(tmp_path, matrix_path)
+
+    tmp_path = schema_path + '.%d.tmp' % os.getpid()
+    with open(tmp_path, 'w') as f:
+        json.dump(schema, f, indent=2)
+    os.replace(tmp_path, schema_path)
+    return 0
+
+
+def _load_cache(path, preprocessor=None):
+    """Build (if needed) the cache of a csv and return its paths.
+
+    Without a preprocessor a new one is fitted on the csv and stored in the
+    schema; with one, the csv is only transformed and the cache key also
+    covers the preprocessor.
+    """
+    key = _file_digest(path)
+    if preprocessor is not None:
+        state = json.dumps(preprocessor.to_dict(), sort_keys=True)
+        key = _digest((key + state).encode())
+
+    matrix_path, schema_path = _cache_paths(path, key)
+    if not (os.path.exists(matrix_path) and os.path.exists(schema_path)):
+        data_frame = load_frame(path)
+        if preprocessor is None:
+            preprocessor = Preprocessor(drop=DROP_COLUMNS).fit(data_frame)
+        data_get = preprocessor.transform(data_frame)
+        schema = {'source': os.path.basename(path), 'key': key, 'shape': list(data_get.shape),
+                  'feature_names': preprocessor.feature_names_, 'preprocessor': preprocessor.to_dict()}
+        _write_cache(matrix_path, schema_path, data_get, schema)
+    return matrix_path, schema_path
+
+
+def load_matrix(path, preprocessor=None):
+    """Load the vectorized matrix of a titanic csv.
+
+    The csv is only parsed the first time it is seen; afterwards the matrix is
+    memory-mapped from a .npy cache keyed by the md5 of the file.
+
+    Parameters:
+        path: csv file
+        preprocessor: fitted Preprocessor to transform with; None fits one on this csv
+
+    Returns:
+        data_get: matrix (copy-on-write memmap), one column per feature
+        feature_names: list, name of each column
+    """
+    matrix_path, schema_path = _load_cache(path, preprocessor)
+
+    # 'c': copy-on-write, estimators may normalize in place without touching the cache
+    data_get = np.load(matrix_path, mmap_mode='c')
+    with open(schema_path) as f:
+        feature_names = json.load(f)['feature_names']
+    return data_get, feature_names
+
+
+def load_preprocessor(path='./titanic/train.csv'):
+    """Return the Preprocessor fitted on a (training) csv."""
+
+    _, schema_path = _load_cache(path)
+    with open(schema_path) as f:
+        return Preprocessor.from_dict(json.load(f)['preprocessor'])
+
+
+def leave_out(path='./titanic/train.csv'):
+    """Divide data into 70% for train and 30% for test.
+
+    Returns:
+        x_get: matrix, data
+        y_get: matrix, label
+        x_get_train: matrix, data
+        y_get_train: matrix, label
+
+    """
+    data_get, _ = load_matrix(path)
+
+    leave_num = int((np.size(data_get, axis=0) - (np.size(data_get, axis=0) % 10)) / 10 * 7)
+    x_get = data_get[:leave_num, :-2]
+    y_get = data_get[:leave_num, -1]
+    x_test_get = data_get[(leave_num + 1):, :-2]
+    y_test_get = data_get[(leave_num + 1):, -1]
+    return x_get, y_get, x_test_get, y_test_get
+
+
+def leave_out_sparse(path='./titanic/train.csv', drop=SPARSE_DROP_COLUMNS):
+    """Like leave_out, but one-hot encodes into scipy CSR so Name / Ticket / Cabin can be kept.
+
+    The label is taken out before encoding, so x holds every encoded column.
+
+    Returns:
+        x_get: CSR matrix, data
+        y_get: matrix, label
+        x_get_train: CSR matrix, data
+        y_get_train: matrix, label
+        feature_names: list, name of each column of x
+    """
+    data_frame = load_frame(path)
+    label = data_frame[LABEL].to_numpy(dtype=np.float64)
+
+    leave_num = int((len(data_frame) - (len(data_frame) % 10)) / 10 * 7)
+    preprocessor = Preprocessor(drop=list(drop) + [LABEL], sparse=True).fit(data_frame.iloc[:leave_num])
+    data_get = preprocessor.transform(data_frame)
+
+    x_get = data_get[:leave_num]
+    y_get = label[:leave_num]
+    x_test_get = data_get[(leave_num + 1):]
+    y_test_get = label[(leave_num + 1):]
+    return x_get, y_get, x_test_get, y_test_get, preprocessor.feature_names_
+
+
+def load_train(path='./titanic/train.csv'):
+    """Load titanic train data and process into vectorized martix.
+
+    Returns:
+        x_get: matrix, data
+        y_get: matrix, label
+
+    """
+    data_get, _ = load_matrix(path)
+
+    x_get = data_get[:, :-2]
+    y_get = data_get[:, -1]
+    return x_get, y_get
+
+
+def load_test(path='./titanic/test.csv', label_path='./titanic/gender_submission.csv',
+              train_path='./titanic/train.csv'):
+    """Load titanic test data and process into vectorized martix.
+
+    The test csv is only transformed by the preprocessor fitted on train_path,
+    so it has the same columns as load_train() (the missing label column is 0).
+
+    Returns:
+        x_get: matrix, data
+        y_get: matrix, label
+
+    """
+    data_get, _ = load_matrix(path, load_preprocessor(train_path))
+    y_frame = pd.read_csv(label_path)
+
+    x_get = data_get[:, :-2]
+    y_get = y_frame.values[:, 1]
+    return x_get, y_get
+
+
+def fit_preprocessor(path, nrows=SAMPLE_ROWS):
+    """Fit a Preprocessor on the first nrows of a csv that is too big to load.
+
+    Categories that only appear after nrows are encoded as all zeros.
+    """
+    return Preprocessor(drop=DROP_COLUMNS).fit(pd.read_csv(path, nrows=nrows))
+
+
+def stream_batches(path, preprocessor=None, chunksize=CHUNK_SIZE):
+    """Read a titanic csv chunk by chunk and yield encoded mini-batches.
+
+    Only one chunk is in memory at a time, so memory is bounded by chunksize
+    whatever the size of the file. Feed the batches to partial_fit:
+
+        for x_batch, y_batch in stream_batches(path):
+            clf.partial_fit(x_batch, y_batch)
+
+    The batch arrays are reused for the next chunk, copy them to keep them.
+
+    Parameters:
+        path: csv file with the train.csv columns
+        preprocessor: fitted Preprocessor, None fits one with fit_preprocessor
+        chunksize: rows per batch
+
+    Yields:
+        x_get: matrix, data  (same columns as load_train)
+        y_get: matrix, label
+    """
+    if preprocessor is None:
+        preprocessor = fit_preprocessor(path)
+
+    data_get = None
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        # 每块复用同一块内存
+        if data_get is None or np.size(data_get, axis=0) != len(chunk):
+            data_get = np.empty((len(chunk), len(preprocessor.feature_names_)))
+        preprocessor.transform(chunk, out=data_get)
+        yield data_get[:, :-2], data_get[:, -1]
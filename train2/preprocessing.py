@@ -0,0 +1,332 @@
+import json
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def _columns(data, columns=None):
+    """Turn a DataFrame / dict / 2-D array into a list of (name, 1-D array)."""
+
+    if isinstance(data, pd.DataFrame):
+        return [(str(name), data[name].to_numpy()) for name in data.columns]
+    if isinstance(data, dict):
+        return [(str(name), np.asarray(data[name])) for name in data]
+
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    if columns is None:
+        columns = ['x%d' % i for i in range(np.size(data, axis=1))]
+    if len(columns) != np.size(data, axis=1):
+        raise ValueError('Got %d column names for %d columns' % (len(columns), np.size(data, axis=1)))
+    return [(str(name), data[:, i]) for i, name in enumerate(columns)]
+
+
+def _is_categorical(values):
+    """Strings are one-hot encoded, everything else is kept as a number."""
+
+    if values.dtype.kind in 'US':
+        return True
+    if values.dtype.kind == 'O':
+        for value in values:
+            if isinstance(value, str):
+                return True
+            if value is not None and value == value:  # 跳过 None / nan
+                return False
+    return False
+
+
+class ColumnEncoder(object):
+    """One-hot encode string columns and pass numeric columns through.
+
+    Works column by column on numpy arrays instead of building one dict per
+    row, and gives exactly the layout of DictVectorizer(sort=True): numeric
+    column `c` keeps the name `c`, string column `c` becomes `c=value`, and all
+    names are sorted.
+
+    Methods:
+        fit           -- learn the vocabulary of each string column
+        transform     -- encode data with the learned layout
+        fit_transform -- fit, then transform
+
+    Attributes:
+        sparse: return scipy CSR if True, else a dense float64 matrix
+        feature_names_: output column names
+        vocabulary_: {source column: sorted array of its categories}, None for numeric columns
+    """
+    def __init__(self, sparse=False):
+        self.sparse = sparse
+        self.feature_names_ = None
+        self.vocabulary_ = None
+        self.__positions = None
+
+    def fit(self, data, columns=None):
+        """Learn the output layout from data.
+
+        Parameters:
+            data: DataFrame, dict of columns or 2-D array
+            columns: names of the columns when data is an array
+        """
+        vocabulary = {}
+        names = []
+        for name, values in _columns(data, columns):
+            if _is_categorical(values):
+                kinds = np.array(sorted(kind for kind in pd.unique(values) if isinstance(kind, str)), dtype=object)
+                vocabulary[name] = kinds
+                names.extend('%s=%s' % (name, kind) for kind in kinds)
+            else:
+                vocabulary[name] = None
+                names.append(name)
+
+        # DictVectorizer 按特征名排序
+        self.feature_names_ = sorted(names)
+        self.vocabulary_ = vocabulary
+        self.__build_positions()
+        return self
+
+    def __build_positions(self):
+        """Output column of every numeric column / every category."""
+
+        index = {feature: i for i, feature in enumerate(self.feature_names_)}
+        self.__positions = {}
+        for name, kinds in self.vocabulary_.items():
+            if kinds is None:
+                self.__positions[name] = index[name]
+            else:
+                self.__positions[name] = np.array([index['%s=%s' % (name, kind)] for kind in kinds], dtype=np.intp)
+        return 0
+
+    def transform(self, data, columns=None, out=None):
+        """Encode data.
+
+        Parameters:
+            data: DataFrame, dict of columns or 2-D array
+            columns: names of the columns when data is an array
+            out: optional preallocated (rows, features) float64 matrix for the dense output
+
+        Returns:
+            (rows, features) matrix, CSR if self.sparse. Unseen categories and
+            columns not seen in fit are ignored, like DictVectorizer.
+        """
+        if self.feature_names_ is None:
+            raise RuntimeError('ColumnEncoder is not fitted yet')
+
+        source = [(name, values) for name, values in _columns(data, columns) if name in self.vocabulary_]
+        rows = np.size(source[0][1], axis=0) if source else 0
+
+        if self.sparse:
+            return self.__to_csr(source, rows)
+
+        if out is None:
+            out = np.zeros((rows, len(self.feature_names_)))
+        else:
+            out[:] = 0
+        row_index = np.arange(rows)
+        for name, values in source:
+            if self.vocabulary_[name] is None:
+                out[:, self.__positions[name]] = values
+            else:
+                code = self.__codes(name, values)
+                known = code >= 0
+                out[row_index[known], self.__positions[name][code[known]]] = 1
+        return out
+
+    def fit_transform(self, data, columns=None):
+        """Fit to data, then transform it."""
+        return self.fit(data, columns).transform(data, columns)
+
+    def to_dict(self):
+        """Fitted state as plain python objects (json serializable)."""
+        vocabulary = {name: None if kinds is None else [str(kind) for kind in kinds]
+                      for name, kinds in self.vocabulary_.items()}
+        return {'sparse': self.sparse, 'feature_names': list(self.feature_names_), 'vocabulary': vocabulary}
+
+    @classmethod
+    def from_dict(cls, state):
+        """Rebuild a fitted encoder from to_dict()."""
+        encoder = cls(sparse=state['sparse'])
+        encoder.feature_names_ = list(state['feature_names'])
+        encoder.vocabulary_ = {name: None if kinds is None else np.array(kinds, dtype=object)
+                               for name, kinds in state['vocabulary'].items()}
+        encoder.__build_positions()
+        return encoder
+
+    def __codes(self, name, values):
+        """Category index of each value, -1 for categories not seen in fit."""
+        return pd.Index(self.vocabulary_[name]).get_indexer(values)
+
+    def __to_csr(self, source, rows):
+        """Build the CSR arrays directly, columns sorted within each row."""
+
+        # 每个源列在每一行恰好贡献(至多)一个非零位置
+        col_get = np.empty((rows, len(source)), dtype=np.intp)
+        val_get = np.ones((rows, len(source)))
+        for j, (name, values) in enumerate(source):
+            if self.vocabulary_[name] is None:
+                col_get[:, j] = self.__positions[name]
+                val_get[:, j] = values
+            else:
+                code = self.__codes(name, values)
+                col_get[:, j] = np.where(code >= 0, self.__positions[name][code], -1)
+
+        order = np.argsort(col_get, axis=1, kind='stable')
+        col_get = np.take_along_axis(col_get, order, axis=1)
+        val_get = np.take_along_axis(val_get, order, axis=1)
+        keep = col_get >= 0
+        indptr = np.zeros(rows + 1, dtype=np.intp)
+        np.cumsum(np.sum(keep, axis=1), out=indptr[1:])
+        return sp.csr_matrix((val_get[keep], col_get[keep], indptr), shape=(rows, len(self.feature_names_)))
+
+
+class Standardizer(object):
+    """Standardize columns with the mean/std of the training data.
+
+    The stats are fitted once, so transform works on any batch size,
+    including a single row. Constant columns are left unchanged. Linear
+    models can also use mean_ / std_ directly,
+    ((x - mean) / std) w = x (w / std) - mean (w / std),
+    which keeps sparse x sparse.
+
+    Attributes:
+        mean_: mean of each column
+        std_: std of each column (1 for constant columns)
+    """
+    def __init__(self):
+        self.mean_ = None
+        self.std_ = None
+
+    def fit(self, x_in):
+        """Compute mean and std of each column (x_in may be scipy sparse)."""
+
+        if sp.issparse(x_in):
+            # 非零元素减均值后再平方, E[x^2] - mean^2 在常数列上会剩下舍入误差
+            x_in = sp.csr_matrix(x_in)
+            rows = x_in.shape[0]
+            average = np.asarray(x_in.mean(axis=0)).ravel()
+            centered = x_in.data - average[x_in.indices]
+            nonzero = np.bincount(x_in.indices, minlength=x_in.shape[1])
+            square = np.bincount(x_in.indices, weights=centered ** 2, minlength=x_in.shape[1]) \
+                + (rows - nonzero) * average ** 2
+            std = np.sqrt(square / rows)
+        else:
+            average = np.mean(x_in, axis=0)
+            std = np.std(x_in, axis=0)
+        # 常数列: 相对均值的舍入误差也算0
+        constant = std <= 1e-10 * np.maximum(np.abs(average), 1)
+        average[constant] = 0
+        std[constant] = 1
+        self.mean_ = average
+        self.std_ = std
+        return self
+
+    def transform(self, x_in, out=None):
+        """(x - mean) / std, written into out when given."""
+
+        if self.mean_ is None:
+            raise RuntimeError('Standardizer is not fitted yet')
+        if sp.issparse(x_in):
+            raise TypeError('Centering a sparse matrix would make it dense, fold mean_ / std_ into the weights instead')
+        out = np.subtract(x_in, self.mean_, out=out)
+        np.divide(out, self.std_, out=out)
+        return out
+
+    def fit_transform(self, x_in):
+        """Fit to x_in, then transform it."""
+        return self.fit(x_in).transform(x_in)
+
+    def to_dict(self):
+        """Fitted state as plain python objects (json serializable)."""
+        return {'mean': self.mean_.tolist(), 'std': self.std_.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        """Rebuild a fitted standardizer from to_dict()."""
+        scaler = cls()
+        scaler.mean_ = np.array(state['mean'], dtype=np.float64)
+        scaler.std_ = np.array(state['std'], dtype=np.float64)
+        return scaler
+
+
+class Preprocessor(object):
+    """Raw table -> feature matrix, fitted once on the training table.
+
+    Drops the unused columns, fills blanks with values learned in fit (median
+    for numbers, most frequent value for strings) and one-hot encodes with a
+    ColumnEncoder. Test / serving data only goes through transform, so it gets
+    exactly the training vocabulary and column order.
+
+    Methods:
+        fit           -- learn impute values and vocabulary from a DataFrame
+        transform     -- DataFrame -> matrix with the fitted layout
+        save / load   -- json file
+
+    Attributes:
+        drop: columns to delete
+        impute_: {column: fill value}
+        encoder: ColumnEncoder
+    """
+    def __init__(self, drop=(), sparse=False):
+        self.drop = list(drop)
+        self.impute_ = None
+        self.encoder = ColumnEncoder(sparse=sparse)
+
+    @property
+    def feature_names_(self):
+        return self.encoder.feature_names_
+
+    def __select(self, data_frame):
+        """删除不必要特征"""
+        return data_frame.drop(columns=[column for column in self.drop if column in data_frame])
+
+    def fit(self, data_frame):
+        """Learn impute values and the encoder layout."""
+
+        data_frame = self.__select(data_frame)
+        impute = {}
+        for name in data_frame.columns:
+            values = data_frame[name]
+            if _is_categorical(values.to_numpy()):
+                mode = values.dropna().mode()
+                impute[str(name)] = str(mode.iloc[0]) if len(mode) else ''
+            else:
+                median = values.median()
+                impute[str(name)] = float(median) if median == median else 0.0
+        self.impute_ = impute
+        self.encoder.fit(data_frame.fillna(self.impute_))
+        return self
+
+    def transform(self, data_frame, out=None):
+        """Encode a DataFrame with the fitted layout."""
+
+        if self.impute_ is None:
+            raise RuntimeError('Preprocessor is not fitted yet')
+        data_frame = self.__select(data_frame).fillna(self.impute_)
+        return self.encoder.transform(data_frame, out=out)
+
+    def fit_transform(self, data_frame):
+        """Fit to data_frame, then transform it."""
+        return self.fit(data_frame).transform(data_frame)
+
+    def to_dict(self):
+        """Fitted state as plain python objects (json serializable)."""
+        return {'drop': self.drop, 'impute': self.impute_, 'encoder': self.encoder.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        """Rebuild a fitted preprocessor from to_dict()."""
+        preprocessor = cls(drop=state['drop'])
+        preprocessor.impute_ = dict(state['impute'])
+        preprocessor.encoder = ColumnEncoder.from_dict(state['encoder'])
+        return preprocessor
+
+    def save(self, path):
+        """Write the fitted state to a json file."""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return 0
+
+    @classmethod
+    def load(cls, path):
+        """Read a preprocessor written by save()."""
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
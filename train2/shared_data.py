@@ -0,0 +1,117 @@
+"""Share matrices with pool workers through multiprocessing.shared_memory.
+
+The parent copies each matrix once into a shared segment; workers attach to
+the segments by name in the pool initializer, so tasks never pickle the data:
+
+    with SharedArrays(x=x, y=y) as shared:
+        with multiprocessing.Pool(initializer=attach, initargs=(shared.specs,)) as pool:
+            pool.map(task, ...)      # task reads shared_data.ARRAYS['x']
+
+Workers get read-only views; an estimator that writes into its input has to
+be given a copy.
+"""
+import numpy as np
+import scipy.sparse as sp
+from multiprocessing import shared_memory
+
+
+# worker 里挂载的共享数组 {key: array}, 以及它们的 SharedMemory(保持引用, 防止被回收)
+ARRAYS = {}
+_SEGMENTS = []
+
+
+def _create(shape, dtype, segments):
+    """New shared segment viewed as an array; returns (array, (name, shape, dtype))."""
+
+    dtype = np.dtype(dtype)
+    segment = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    segments.append(segment)
+    return np.ndarray(shape, dtype=dtype, buffer=segment.buf), (segment.name, tuple(shape), dtype.str)
+
+
+def _open(name, shape, dtype):
+    """Attach an existing segment, read-only."""
+
+    segment = shared_memory.SharedMemory(name=name)
+    _SEGMENTS.append(segment)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+    array.flags.writeable = False
+    return array
+
+
+class SharedArrays(object):
+    """Copies of matrices in shared memory.
+
+    Use as a context manager, the segments are unlinked on exit.
+
+    Parameters:
+        **matrices: key=array, key=CSR matrix, or key=(shape, dtype) for an
+                    uninitialized array to fill in later through .arrays
+
+    Attributes:
+        specs: picklable {key: spec}, the argument of attach()
+        arrays: {key: matrix}, the parent's (writable) view of the shared copies
+    """
+    def __init__(self, **matrices):
+        self.specs = {}
+        self.arrays = {}
+        self.__segments = []
+        try:
+            for key, matrix in matrices.items():
+                self.arrays[key], self.specs[key] = self.__share(matrix)
+        except BaseException:
+            self.close()
+            raise
+
+    def __share(self, matrix):
+        """Dense arrays are one segment, CSR matrices three (data, indices, indptr)."""
+
+        if isinstance(matrix, tuple):
+            array, spec = _create(matrix[0], matrix[1], self.__segments)
+            return array, ('dense', None, [spec])
+        if sp.issparse(matrix):
+            matrix = sp.csr_matrix(matrix)
+            parts, specs = [], []
+            for part in (matrix.data, matrix.indices, matrix.indptr):
+                array, spec = _create(part.shape, part.dtype, self.__segments)
+                array[...] = part
+                parts.append(array)
+                specs.append(spec)
+            return sp.csr_matrix(tuple(parts), shape=matrix.shape, copy=False), ('csr', matrix.shape, specs)
+
+        matrix = np.asarray(matrix)
+        array, spec = _create(matrix.shape, matrix.dtype, self.__segments)
+        array[...] = matrix
+        return array, ('dense', None, [spec])
+
+    def close(self):
+        """Release and unlink every segment."""
+
+        self.arrays = {}
+        for segment in self.__segments:
+            try:
+                segment.close()
+            except BufferError:  # 外面还有这块内存的数组, 等它们被回收时再释放
+                pass
+            segment.unlink()
+        self.__segments = []
+        return 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def attach(specs):
+    """Pool initializer: attach SharedArrays.specs into ARRAYS, without copying."""
+
+    for key, (kind, shape, parts) in specs.items():
+        arrays = [_open(*part) for part in parts]
+        if kind == 'csr':
+            ARRAYS[key] = sp.csr_matrix(tuple(arrays), shape=shape, copy=False)
+        else:
+            ARRAYS[key] = arrays[0]
+    return 0
@@ -0,0 +1,132 @@
+"""Hyperparameter sweep of the numpy estimators on a process pool.
+
+The training and validation matrices are copied once into shared memory and
+every worker attaches to them by name, so a task only pickles its parameter
+dict, not the data:
+
+    results = sweep('LogisticRegression', {'alpha': [0.01, 0.1], 'lambda_': [0, 1], 'epoch': [500, 2000]},
+                    x, y, x_test, y_test)
+
+    python sweep.py --model LinearSVM --workers 4
+"""
+import os
+import sys
+import io
+import time
+import argparse
+import itertools
+import contextlib
+import multiprocessing
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # fit() 里的 plt.show() 不弹窗
+import matplotlib.pyplot as plt
+import shared_data
+from shared_data import SharedArrays
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'train3'))
+
+
+# 默认网格
+GRIDS = {
+    'LogisticRegression': {'alpha': [0.003, 0.01, 0.03, 0.1, 0.3], 'lambda_': [0, 0.1, 1, 10],
+                           'epoch': [500, 1000, 2000, 4000, 8000]},
+    # pegasos 的步长是 1 / (lambda t), 不用 alpha, 所以只扫 lambda_
+    'LinearSVM': {'lambda_': [0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1], 'epoch': [2, 4, 6, 10, 20]},
+    'FC': {'alpha': [0.01, 0.03, 0.1, 0.3, 1], 'lambda_': [0, 1, 10, 30], 'epoch': [100, 200, 300, 500, 1000]},
+}
+# 进程数, None: os.cpu_count()
+WORKERS = None
+
+
+def param_grid(grid):
+    """{'alpha': [1, 2], 'epoch': [10]} -> [{'alpha': 1, 'epoch': 10}, {'alpha': 2, 'epoch': 10}]"""
+
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _build(model, params):
+    """Create an estimator with the given hyperparameters."""
+
+    if model == 'LogisticRegression':
+        from Logistic_Regression import LogisticRegression
+        return LogisticRegression(**params)
+    if model == 'LinearSVM':
+        from Linear_SVM import LinearSVM
+        return LinearSVM(**params)
+    if model == 'FC':
+        import FC
+        params = dict(params)
+        activation = getattr(FC, params.pop('activation', 'ReLU'))()
+        return FC.FC(layer_num=params.pop('layer_num', 3), layer_size=params.pop('layer_size', [20]),
+                     activation=activation, **params)
+    raise KeyError('Unknown model: %s' % model)
+
+
+def _run(task):
+    """Fit one grid point on the shared data and score it on the validation data."""
+
+    index, model, params, fit_params, seed = task
+    np.random.seed(seed)
+    record = {'index': index, 'params': params}
+    try:
+        clf = _build(model, params)
+        # 训练时的输出不计入
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            # 共享的x只读; y很小, 复制一份(防止模型原地改y)
+            clf = clf.fit(shared_data.ARRAYS['x'], np.array(shared_data.ARRAYS['y']), **fit_params)
+            record['fit_s'] = time.perf_counter() - start
+        plt.close('all')
+        y_pred = clf.predict(shared_data.ARRAYS['x_val'])
+        record['score'] = float(np.mean(np.ravel(y_pred) == np.ravel(shared_data.ARRAYS['y_val'])) * 100)
+        record['status'] = 'ok'
+    except Exception as error:  # 某个点发散不影响其它点
+        record['status'] = 'error'
+        record['error'] = '%s: %s' % (type(error).__name__, error)
+    return record
+
+
+def sweep(model, grid, x_in, y_in, x_val, y_val, workers=WORKERS, fit_params=None, seed=0):
+    """Fit model at every point of grid in parallel.
+
+    Parameters:
+        model: 'LogisticRegression', 'LinearSVM' or 'FC'
+        grid: {hyperparameter: list of values}, keys are constructor arguments
+        x_in, y_in: training data (x may be CSR)
+        x_val, y_val: data to score on
+        workers: processes, None for os.cpu_count()
+        fit_params: extra keyword arguments of fit, e.g. {'solver': 'lbfgs'}
+        seed: every point starts from np.random.seed(seed), so points are comparable
+
+    Returns:
+        list of dicts (params, score, fit_s, status), best score first
+    """
+    tasks = [(i, model, params, fit_params or {}, seed) for i, params in enumerate(param_grid(grid))]
+
+    with SharedArrays(x=x_in, y=y_in, x_val=x_val, y_val=y_val) as shared:
+        with multiprocessing.Pool(workers, initializer=shared_data.attach, initargs=(shared.specs,)) as pool:
+            # 一次一个点, 长短不一的点也能均匀分配
+            results = list(pool.imap_unordered(_run, tasks, chunksize=1))
+
+    results.sort(key=lambda record: (record['status'] != 'ok', -record.get('score', 0), record['index']))
+    return results
+
+
+if __name__ == "__main__":
+    from feature_store import leave_out
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='LogisticRegression', choices=sorted(GRIDS))
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    x, y, x_test, y_test = leave_out()
+    start = time.perf_counter()
+    report = sweep(args.model, GRIDS[args.model], x, y, x_test, y_test, workers=args.workers)
+    print('%d points in %.1fs' % (len(report), time.perf_counter() - start))
+    for record in report[:args.top]:
+        print('%8s | %9.3fs | %s' % ('%.4f%%' % record['score'] if 'score' in record else record['status'],
+                                     record.get('fit_s', float('nan')), record['params']))
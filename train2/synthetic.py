@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from feature_store import DROP_COLUMNS
+from preprocessing import Preprocessor
+
+
+def make_titanic_frame(rows, random_state=0):
+    """Generate a passenger table shaped like titanic/train.csv.
+
+    Same columns and dtypes as the kaggle file (including blanks in Age, Cabin
+    and Embarked), with survival depending on Sex, Pclass and Age so the
+    estimators have something to learn.
+
+    Parameters:
+        rows: number of passengers
+        random_state: seed
+
+    Returns:
+        data_frame: DataFrame with the raw titanic columns
+    """
+    rng = np.random.RandomState(random_state)
+
+    sex = np.where(rng.random_sample(rows) < 0.35, 'female', 'male').astype(object)
+    pclass = rng.choice([1, 2, 3], size=rows, p=[0.24, 0.21, 0.55])
+    age = np.round(np.clip(rng.normal(30, 14, rows), 0.5, 80), 1)
+    fare = np.round(rng.lognormal(2.5, 1, rows) * (4 - pclass), 4)
+    embarked = rng.choice(np.array(['S', 'C', 'Q'], dtype=object), size=rows, p=[0.72, 0.19, 0.09])
+
+    # 生还概率
+    logit = 1.5 * (sex == 'female') - 0.8 * (pclass - 2) - 0.02 * (age - 30) - 0.6
+    survived = (rng.random_sample(rows) < 1 / (1 + np.exp(-logit))).astype(np.int64)
+
+    data_frame = pd.DataFrame({
+        'PassengerId': np.arange(1, rows + 1),
+        'Survived': survived,
+        'Pclass': pclass,
+        'Name': np.char.add('Passenger ', np.arange(rows).astype(str)).astype(object),
+        'Sex': sex,
+        'Age': age,
+        'SibSp': rng.poisson(0.5, rows),
+        'Parch': rng.poisson(0.4, rows),
+        'Ticket': np.char.add('T', rng.randint(0, 10 ** 6, rows).astype(str)).astype(object),
+        'Fare': fare,
+        'Cabin': np.where(rng.random_sample(rows) < 0.77, None,
+                          np.char.add('C', rng.randint(1, 150, rows).astype(str)).astype(object)),
+        'Embarked': embarked,
+    })
+
+    # 空缺值
+    data_frame.loc[rng.random_sample(rows) < 0.2, 'Age'] = np.nan
+    data_frame.loc[rng.random_sample(rows) < 0.002, 'Embarked'] = np.nan
+    data_frame.loc[0, ['Age', 'Embarked']] = [22.0, 'S']  # 第一行完整, ffill 之后无空缺
+    return data_frame
+
+
+def make_titanic_matrix(rows, features=9, random_state=0):
+    """Generate an encoded titanic-shaped matrix with a given feature count.
+
+    The first columns are the 9 features load_train() gives; when more are
+    asked for, numeric columns are appended (noise, slightly shifted by the
+    label so they carry a little signal).
+
+    Parameters:
+        rows: number of samples
+        features: number of columns of x
+        random_state: seed
+
+    Returns:
+        x_get: (rows, features) matrix, data
+        y_get: (rows,) matrix, label
+    """
+    data_get = Preprocessor(drop=DROP_COLUMNS).fit_transform(make_titanic_frame(rows, random_state))
+    x_get = data_get[:, :-2][:, :features]
+    y_get = data_get[:, -1]
+
+    extra = features - np.size(x_get, axis=1)
+    if extra > 0:
+        rng = np.random.RandomState(random_state + 1)
+        noise = rng.standard_normal((rows, extra))
+        noise += 0.1 * (y_get.reshape(-1, 1) - 0.5)
+        x_get = np.hstack((x_get, noise))
+    return x_get, y_get
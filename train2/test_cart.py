@@ -0,0 +1,253 @@
+"""Tests of CartDecisionTree, against a brute-force split search.
+
+    python -m pytest -q test_cart.py
+"""
+import numpy as np
+import pytest
+
+from CART import CartDecisionTree, LEVELS, quantize
+from synthetic import make_titanic_matrix
+
+
+ROWS = 400
+
+
+@pytest.fixture
+def data():
+    return make_titanic_matrix(ROWS)
+
+
+def gini(y_in):
+    _, counts = np.unique(y_in, return_counts=True)
+    return 1 - np.sum((counts / len(y_in)) ** 2)
+
+
+def split_gain(column, y_in, value):
+    """gini decrease of splitting on column >= value"""
+
+    mask = column >= value
+    if mask.all() or not mask.any():
+        return -np.inf
+    return gini(y_in) - (np.sum(mask) * gini(y_in[mask]) + np.sum(~mask) * gini(y_in[~mask])) / len(y_in)
+
+
+def best_gain(x_in, y_in):
+    """largest gini decrease over every column and every value in it"""
+
+    return max(split_gain(x_in[:, i], y_in, value)
+               for i in range(np.size(x_in, axis=1)) for value in np.unique(x_in[:, i]))
+
+
+def node_rows(tree, x_in):
+    """rows of x_in reaching every node, walking the fitted arrays from the root"""
+
+    rows = {0: np.arange(np.size(x_in, axis=0))}
+    for node in range(len(tree.feature_)):  # 子节点的id比父节点大
+        if tree.feature_[node] >= 0:
+            index = rows[node]
+            mask = x_in[index, tree.feature_[node]] >= tree.threshold_[node]
+            rows[tree.true_[node]] = index[mask]
+            rows[tree.false_[node]] = index[~mask]
+    return rows
+
+
+def test_exact_split_is_the_best_gini_split(data):
+    x, y = data
+    tree = CartDecisionTree(max_depth=5, prune=False).fit(x, y)
+    rows = node_rows(tree, x)
+    assert len(tree.feature_) > 1
+
+    for node, index in rows.items():
+        if tree.feature_[node] < 0:
+            continue
+        column = x[index, tree.feature_[node]]
+        # 阈值是 true 一边最小的值
+        assert tree.threshold_[node] == np.min(column[column >= tree.threshold_[node]])
+        assert split_gain(column, y[index], tree.threshold_[node]) == pytest.approx(best_gain(x[index], y[index]))
+
+
+def test_leaves_are_pure_or_cannot_be_split(data):
+    x, y = data
+    tree = CartDecisionTree(prune=False).fit(x, y)
+
+    for node, index in node_rows(tree, x).items():
+        if tree.feature_[node] < 0 and len(np.unique(y[index])) > 1:
+            assert best_gain(x[index], y[index]) <= 1e-12
+
+
+def test_counts_are_the_training_rows_of_each_node(data):
+    x, y = data
+    tree = CartDecisionTree(max_depth=6, prune=False).fit(x, y)
+
+    for node, index in node_rows(tree, x).items():
+        counts = [np.sum(y[index] == label) for label in tree.classes_]
+        assert np.array_equal(tree.counts_[node], counts)
+        assert tree.impurity_[node] == pytest.approx(gini(y[index]))
+
+
+def test_samples_is_the_same_as_copying_the_rows(data):
+    x, y = data
+    x_copy = x.copy()
+    samples = np.random.RandomState(0).randint(0, ROWS, ROWS)  # bootstrap, 有重复
+    samples_copy = samples.copy()
+    tree = CartDecisionTree(prune=False).fit(x, y, samples=samples)
+    reference = CartDecisionTree(prune=False).fit(x[samples], y[samples])
+
+    # 原地重排的是复制的 samples, 输入不变
+    assert np.array_equal(x, x_copy) and np.array_equal(samples, samples_copy)
+    for name in ('feature_', 'threshold_', 'true_', 'false_', 'counts_'):
+        assert np.array_equal(getattr(tree, name), getattr(reference, name), equal_nan=True)
+
+
+def depths(tree):
+    """{node: depth}, the root is 0"""
+
+    depth = {0: 0}
+    for node in range(len(tree.feature_)):
+        if tree.feature_[node] >= 0:
+            depth[tree.true_[node]] = depth[tree.false_[node]] = depth[node] + 1
+    return depth
+
+
+def walk(tree, row):
+    """leaf of one row, node by node"""
+
+    node = 0
+    while tree.feature_[node] >= 0:
+        node = tree.true_[node] if row[tree.feature_[node]] >= tree.threshold_[node] else tree.false_[node]
+    return node
+
+
+def test_level_by_level_predict_matches_walking_the_tree(data):
+    x, y = data
+    x_test, _ = make_titanic_matrix(300, random_state=1)
+    tree = CartDecisionTree(prune=False).fit(x, y)
+    assert max(depths(tree).values()) > 2 * LEVELS  # 叶子深浅不一, 要去掉好几次到了叶子的行
+
+    leaf = tree.apply(x_test)
+    assert np.array_equal(leaf, [walk(tree, row) for row in x_test])
+    assert np.array_equal(tree.predict(x_test).ravel(), tree.value_[leaf])
+    counts = tree.counts_[leaf]
+    assert np.allclose(tree.predict_proba(x_test).ravel(), counts[:, tree.classes_ == 1].ravel() / counts.sum(axis=1))
+
+    out = np.zeros((300, 1))
+    assert tree.predict(x_test, out=out) is out
+
+
+def test_single_leaf_tree():
+    x = np.random.RandomState(0).rand(20, 3)
+    tree = CartDecisionTree().fit(x, np.ones(20))
+
+    assert np.array_equal(tree.feature_, [-1])
+    assert np.array_equal(tree.apply(x), np.zeros(20))
+    assert np.array_equal(tree.predict(x).ravel(), np.ones(20))
+
+
+def leaf_groups(tree, x_in):
+    """the training rows of every leaf, as a set of row sets (independent of node ids)"""
+
+    leaf = tree.apply(x_in)
+    return {frozenset(np.flatnonzero(leaf == node)) for node in np.unique(leaf)}
+
+
+def test_growth_limits(data):
+    x, y = data
+    for max_depth in (1, 3, 6):
+        tree = CartDecisionTree(max_depth=max_depth, prune=False).fit(x, y)
+        assert max(depths(tree).values()) == max_depth
+
+    for max_leaf_nodes in (2, 5, 17):
+        tree = CartDecisionTree(max_leaf_nodes=max_leaf_nodes, prune=False).fit(x, y)
+        assert np.sum(tree.feature_ < 0) == max_leaf_nodes
+
+    tree = CartDecisionTree(min_samples_split=40, prune=False).fit(x, y)
+    rows = node_rows(tree, x)
+    assert all(len(rows[node]) >= 40 for node in np.flatnonzero(tree.feature_ >= 0))
+
+    tree = CartDecisionTree(min_impurity_decrease=0.005, prune=False).fit(x, y)
+    rows = node_rows(tree, x)
+    for node in np.flatnonzero(tree.feature_ >= 0):
+        index = rows[node]
+        gain = split_gain(x[index, tree.feature_[node]], y[index], tree.threshold_[node])
+        assert gain * len(index) / ROWS >= 0.005
+
+    with pytest.raises(ValueError):
+        CartDecisionTree(max_leaf_nodes=1).fit(x, y)
+
+
+def test_best_first_without_a_limit_grows_the_same_leaves(data):
+    x, y = data
+    depth_first = CartDecisionTree(max_depth=8, prune=False).fit(x, y)
+    best_first = CartDecisionTree(max_depth=8, max_leaf_nodes=10 ** 6, prune=False).fit(x, y)
+
+    assert len(best_first.feature_) == len(depth_first.feature_)
+    assert leaf_groups(best_first, x) == leaf_groups(depth_first, x)
+    assert np.array_equal(best_first.predict(x), depth_first.predict(x))
+
+
+def test_best_first_splits_the_largest_gain_first(data):
+    x, y = data
+    # 每多一个叶子, 只是在上一棵树上多分一个节点
+    previous = None
+    for max_leaf_nodes in range(2, 12):
+        tree = CartDecisionTree(max_leaf_nodes=max_leaf_nodes, prune=False).fit(x, y)
+        groups = leaf_groups(tree, x)
+        if previous is not None:
+            assert len(previous - groups) == 1 and len(groups - previous) == 2
+        previous = groups
+
+
+@pytest.mark.parametrize('params', [{}, {'max_leaf_nodes': 20}, {'max_features': 'sqrt', 'random_state': 3}])
+def test_binned_search_matches_exact_search_when_every_value_has_a_bin(data, params):
+    x, y = data
+    x = np.minimum(np.round(x), 200)  # 每列不超过 256 个值
+    exact = CartDecisionTree(prune=False, **params).fit(x, y)
+    binned = CartDecisionTree(prune=False, max_bins=256, **params).fit(x, y)
+
+    for name in ('feature_', 'threshold_', 'true_', 'false_', 'counts_'):
+        assert np.array_equal(getattr(binned, name), getattr(exact, name), equal_nan=True)
+
+
+def test_binned_splits_are_values_of_x(data):
+    x, y = data
+    tree = CartDecisionTree(max_depth=5, max_bins=16, prune=False).fit(x, y)
+    rows = node_rows(tree, x)
+
+    for node in np.flatnonzero(tree.feature_ >= 0):
+        index, column = rows[node], tree.feature_[node]
+        assert tree.threshold_[node] in x[:, column]
+        # 箱少于取值数时只能在箱的边界上切, 不会好过精确搜索
+        assert split_gain(x[index, column], y[index], tree.threshold_[node]) <= best_gain(x[index], y[index]) + 1e-12
+
+
+@pytest.mark.parametrize('max_bins', [1, 257])
+def test_max_bins_out_of_range_raises(data, max_bins):
+    with pytest.raises(ValueError):
+        CartDecisionTree(max_bins=max_bins).fit(*data)
+
+
+@pytest.mark.parametrize('params', [{}, {'max_bins': 32}, {'max_leaf_nodes': 30, 'max_bins': 64},
+                                    {'max_features': 0.5, 'random_state': 1}])
+def test_workers_build_the_same_tree(monkeypatch, params):
+    x, y = make_titanic_matrix(2000, 24)
+    serial = CartDecisionTree(prune=False, workers=1, **params).fit(x, y)
+    # 每个节点都交给线程池
+    monkeypatch.setattr('CART.PARALLEL_CELLS', 0)
+    threaded = CartDecisionTree(prune=False, workers=4, **params).fit(x, y)
+
+    for name in ('feature_', 'threshold_', 'true_', 'false_', 'counts_'):
+        assert np.array_equal(getattr(threaded, name), getattr(serial, name), equal_nan=True)
+
+
+def test_fit_on_precomputed_bins(data):
+    x, y = data
+    tree = CartDecisionTree(max_bins=64, prune=False).fit(x, y)
+    shared = CartDecisionTree(max_bins=64, prune=False).fit(None, y, bins=quantize(x, 64))
+
+    for name in ('feature_', 'threshold_', 'true_', 'false_', 'counts_'):
+        assert np.array_equal(getattr(shared, name), getattr(tree, name), equal_nan=True)
+
+    with pytest.raises(ValueError):
+        CartDecisionTree(max_bins=32).fit(x, y, bins=quantize(x, 64))
+    with pytest.raises(ValueError):
+        CartDecisionTree().fit(x, y, bins=quantize(x, 64))
@@ -0,0 +1,45 @@
+"""Tests of the LogisticRegression solvers.
+
+    python -m pytest -q test_logistic_regression.py
+"""
+import numpy as np
+import pytest
+import matplotlib
+matplotlib.use('Agg')  # fit() 里的 plt.show() 不弹窗
+
+from Logistic_Regression import LogisticRegression
+from synthetic import make_titanic_matrix
+
+
+ROWS = 3000
+# gd 停在 tol 附近, 和牛顿法的 cost 差不超过这个值
+GD_GAP = 1e-3
+
+
+def fit(x, y, solver, lambda_=0, **kwargs):
+    np.random.seed(0)
+    return LogisticRegression(lambda_=lambda_).fit(x, y, solver=solver, **kwargs)
+
+
+@pytest.mark.parametrize('lambda_', [0, 1])
+def test_solvers_reach_the_same_cost(lambda_):
+    x, y = make_titanic_matrix(ROWS, 20)
+    irls = fit(x, y, 'irls', lambda_, tol=1e-10)
+    lbfgs = fit(x, y, 'lbfgs', lambda_, tol=1e-10)
+    gd = fit(x, y, 'gd', lambda_)
+
+    assert abs(lbfgs.cost_ - irls.cost_) < 1e-6
+    assert 0 <= gd.cost_ - irls.cost_ < GD_GAP
+    assert np.mean(lbfgs.predict(x) == irls.predict(x)) > 0.99
+    assert np.allclose(lbfgs.predict_proba(x), irls.predict_proba(x), atol=1e-3)
+
+
+def test_auto_picks_irls_for_narrow_data():
+    x, y = make_titanic_matrix(ROWS)
+    assert fit(x, y, 'auto').cost_ == fit(x, y, 'irls').cost_
+
+
+def test_unknown_solver_raises():
+    x, y = make_titanic_matrix(100)
+    with pytest.raises(ValueError):
+        fit(x, y, 'newton')
@@ -0,0 +1,104 @@
+"""Tests of the preprocessing layer.
+
+    python -m pytest -q test_preprocessing.py
+"""
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+
+from feature_store import DROP_COLUMNS
+from preprocessing import ColumnEncoder, Preprocessor, Standardizer
+from synthetic import make_titanic_frame
+
+
+ROWS = 2000
+
+
+@pytest.fixture
+def frame():
+    """synthetic titanic table without blanks and unused columns, like load_train() sees it"""
+
+    data_frame = make_titanic_frame(ROWS).ffill()
+    return data_frame.drop(columns=DROP_COLUMNS)
+
+
+def test_encoder_matches_dict_vectorizer(frame):
+    vectorizer = DictVectorizer(sparse=False)
+    reference = vectorizer.fit_transform(frame.to_dict(orient='records'))
+
+    encoder = ColumnEncoder()
+    dense = encoder.fit_transform(frame)
+    assert encoder.feature_names_ == list(vectorizer.get_feature_names_out())
+    assert np.array_equal(dense, reference)
+
+    sparse = ColumnEncoder(sparse=True).fit_transform(frame)
+    assert np.array_equal(sparse.toarray(), reference)
+    # 每行的列号有序, 和 DictVectorizer 的 CSR 一样
+    assert sparse.has_sorted_indices
+
+
+def test_encoder_ignores_unseen_categories(frame):
+    encoder = ColumnEncoder().fit(frame)
+    unseen = frame.head(3).assign(Embarked='X', Extra=1.0)
+    vectorizer = DictVectorizer(sparse=False).fit(frame.to_dict(orient='records'))
+
+    assert np.array_equal(encoder.transform(unseen), vectorizer.transform(unseen.to_dict(orient='records')))
+
+
+def test_encoder_takes_arrays_with_column_names(frame):
+    encoder = ColumnEncoder()
+    from_array = encoder.fit_transform(frame.to_numpy(dtype=object), columns=list(frame.columns))
+
+    assert np.array_equal(from_array, ColumnEncoder().fit_transform(frame))
+
+
+def test_encoder_writes_into_out(frame):
+    encoder = ColumnEncoder().fit(frame)
+    out = np.full((len(frame), len(encoder.feature_names_)), np.nan)
+
+    assert encoder.transform(frame, out=out) is out
+    assert np.array_equal(out, encoder.transform(frame))
+
+
+def test_unfitted_encoder_raises():
+    with pytest.raises(RuntimeError):
+        ColumnEncoder().transform(pd.DataFrame({'a': [1.0]}))
+
+
+def test_preprocessor_save_load_round_trip(tmp_path):
+    train, test = make_titanic_frame(ROWS), make_titanic_frame(500, random_state=1)
+    preprocessor = Preprocessor(drop=DROP_COLUMNS).fit(train)
+    path = str(tmp_path / 'preprocessor.json')
+    preprocessor.save(path)
+    loaded = Preprocessor.load(path)
+
+    assert loaded.feature_names_ == preprocessor.feature_names_
+    assert loaded.impute_ == preprocessor.impute_
+    # 测试集有空缺值, 用训练集学到的值填
+    assert test.isna().any().any()
+    assert np.array_equal(loaded.transform(test), preprocessor.transform(test))
+
+
+def test_preprocessor_transform_does_not_depend_on_the_batch():
+    train = make_titanic_frame(ROWS)
+    preprocessor = Preprocessor(drop=DROP_COLUMNS).fit(train)
+    whole = preprocessor.transform(train)
+
+    # 单独一行(只有一个类别, 还可能有空缺)和整表里的那一行一样
+    for row in (0, 1, 7):
+        assert np.array_equal(preprocessor.transform(train.iloc[[row]]), whole[[row]])
+
+
+def test_encoder_and_standardizer_dict_round_trip():
+    frame = make_titanic_frame(ROWS).ffill().drop(columns=DROP_COLUMNS)
+    encoder = ColumnEncoder(sparse=True).fit(frame)
+    loaded = ColumnEncoder.from_dict(json.loads(json.dumps(encoder.to_dict())))
+    assert loaded.sparse
+    assert np.array_equal(loaded.transform(frame).toarray(), encoder.transform(frame).toarray())
+
+    x = encoder.transform(frame).toarray()
+    scaler = Standardizer().fit(x)
+    loaded = Standardizer.from_dict(json.loads(json.dumps(scaler.to_dict())))
+    assert np.array_equal(loaded.transform(x), scaler.transform(x))
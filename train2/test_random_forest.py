@@ -0,0 +1,61 @@
+"""Tests of RandomForest.
+
+    python -m pytest -q test_random_forest.py
+"""
+import numpy as np
+import pytest
+
+from Random_Forest import RandomForest
+from synthetic import make_titanic_matrix
+
+
+N_TREES = 8
+
+
+@pytest.fixture(scope='module')
+def data():
+    return make_titanic_matrix(1000, 12)
+
+
+@pytest.mark.parametrize('max_bins', [None, 64])
+def test_pool_grows_the_same_forest(data, max_bins):
+    x, y = data
+    serial = RandomForest(n_trees=N_TREES, max_bins=max_bins, workers=1).fit(x, y)
+    pooled = RandomForest(n_trees=N_TREES, max_bins=max_bins, workers=2).fit(x, y)
+
+    for tree, reference in zip(pooled.trees_, serial.trees_):
+        for name in ('feature_', 'threshold_', 'true_', 'false_', 'counts_'):
+            assert np.array_equal(getattr(tree, name), getattr(reference, name), equal_nan=True)
+    assert pooled.oob_score_ == serial.oob_score_
+    assert np.array_equal(pooled.predict_proba(x), serial.predict_proba(x))
+
+
+def test_flat_predict_is_the_average_of_the_trees(data, monkeypatch):
+    x, y = data
+    x_test, _ = make_titanic_matrix(500, 12, random_state=1)
+    forest = RandomForest(n_trees=N_TREES, workers=1).fit(x, y)
+
+    leaf = forest.apply(x_test)
+    for t, tree in enumerate(forest.trees_):
+        assert np.array_equal(leaf[:, t] - forest.offsets_[t], tree.apply(x_test))
+
+    counts = [tree.counts_[tree.apply(x_test)] for tree in forest.trees_]
+    expected = np.mean([count / np.sum(count, axis=1, keepdims=True) for count in counts], axis=0)
+    assert np.allclose(forest.predict_proba(x_test), expected)
+    assert np.array_equal(forest.predict(x_test).ravel(), forest.classes_[np.argmax(expected, axis=1)])
+
+    # 分块算的结果和一次算完一样
+    monkeypatch.setattr('Random_Forest.BLOCK', 7)
+    assert np.allclose(forest.predict_proba(x_test), expected)
+
+
+def test_oob_proba(data):
+    x, y = data
+    forest = RandomForest(n_trees=N_TREES, workers=1).fit(x, y)
+
+    seen = ~np.isnan(forest.oob_proba_[:, 0])
+    # 8 棵树, 每行都在所有 bootstrap 里的概率是 (1 - 0.368) ** 8 ~ 2.6%
+    assert 0.9 < np.mean(seen) < 1
+    assert np.allclose(np.sum(forest.oob_proba_[seen], axis=1), 1)
+    y_get = forest.classes_[np.argmax(forest.oob_proba_[seen], axis=1)]
+    assert forest.oob_score_ == pytest.approx(np.mean(y_get == y[seen]) * 100)
@@ -1,10 +1,14 @@
+import os
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.feature_extraction import DictVectorizer
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'train2'))
+from feature_store import leave_out as titanic_leave_out
+from preprocessing import Standardizer
 
 
-# 超参数
+# 超参数(默认值, 每个实例可以单独设置)
 EPOCH = 300
 LAMBDA = 10
 ALPHA = 0.1
@@ -23,27 +27,7 @@ def leave_out(data):
 
     """
     if data == 'titanic':
-        data_frame = pd.read_csv('./titanic/train.csv')
-
-        # 填补空缺值
-        data_frame = data_frame.fillna(method='ffill')  # 待改进
-
-        # 删除不必要特征
-        del data_frame['PassengerId']
-        del data_frame['Cabin']
-        del data_frame['Name']
-        del data_frame['Ticket']
-
-        # 特征向量化
-        dvec = DictVectorizer(sparse=False)
-        data_get = dvec.fit_transform(data_frame.to_dict(orient='record'))
-
-        leave_num = int((np.size(data_get, axis=0) - (np.size(data_get, axis=0) % 10)) / 10 * 7)
-        x_get = data_get[:leave_num, :-2]
-        y_get = data_get[:leave_num, -1]
-        x_test_get = data_get[(leave_num + 1):, :-2]
-        y_test_get = data_get[(leave_num + 1):, -1]
-        return x_get, y_get, x_test_get, y_test_get
+        return titanic_leave_out()
 
     elif data == 'wine':
         data_frame = pd.read_csv('./wine.csv')
@@ -65,7 +49,19 @@ def leave_out(data):
 
 
 class FC(object):
-    def __init__(self, layer_num, layer_size, activation):
+    """Fully connected network with softmax output.
+
+    Attributes:
+        epoch, alpha, lambda_, momentum, p: hyperparameters, default to the module
+        constants (p is the keep probability of dropout)
+    """
+    def __init__(self, layer_num, layer_size, activation, epoch=EPOCH, alpha=ALPHA, lambda_=LAMBDA,
+                 momentum=Momentum, p=P):
+        self.epoch = epoch
+        self.alpha = alpha
+        self.lambda_ = lambda_
+        self.momentum = momentum
+        self.p = p
         self.__layer_num = layer_num
         self.__params_list = []
         self.__hidden_layer_size = layer_size
@@ -74,45 +70,95 @@ class FC(object):
         self.__a_list = []
         self.__z_list = []
         self.__start_from_1 = 0
-        self.__count = 0
+        self.__scaler = None
         self.__momentum = [0] * (self.__layer_num - 1)
 
     def fit(self, x_in, y_in):
         x_in, y_in = self.__initialize(x_in, y_in)
         j_list = []
-        for epoch in range(EPOCH):
+        for epoch in range(self.epoch):
             y_pred = self.__forward(x_in)
             j_list.append(self.__cost(y_pred, y_in))
             self.__backward(y_pred, y_in)
             if epoch % 10 == 0:
-                print("EPOCH: %4d / %4d" % (epoch, EPOCH), ' | Cost: %7.4f' % float(j_list[-1]))
+                print("EPOCH: %4d / %4d" % (epoch, self.epoch), ' | Cost: %7.4f' % float(j_list[-1]))
         self.__plot_j(j_list)
         return self
 
+    def partial_fit(self, x_in, y_in, classes=None):
+        """Do one forward/backward step on a mini-batch.
+
+        Used to train on data that does not fit in memory (see
+        feature_store.stream_batches). The first call fits the scaler on its
+        batch and initializes params; it also needs classes, the labels of the
+        whole data, because one batch may not contain all of them.
+        """
+        if self.__scaler is None:
+            if classes is None:
+                raise ValueError('classes must be given on the first call of partial_fit')
+            x_in, y_in = self.__initialize(x_in, y_in, np.asarray(classes))
+        else:
+            x_in, y_in = self.__normalize(x_in), self.__one_hot(y_in)
+
+        y_pred = self.__forward(x_in)
+        self.__backward(y_pred, y_in)
+        return self
+
     def __plot_j(self, j_list):
         """Visualize the change of j.
         Parameters:
             j_list: record j of every epoch
         """
-        plt.plot(range(EPOCH), j_list, c="r")
+        plt.plot(range(len(j_list)), j_list, c="r")
         plt.show()
         return 0
 
     def score(self, x_in, y_in):
         y_pred = self.predict(x_in, y_in)
-        count = 0
-        for i in range(np.size(y_pred, axis=0)):
-            if y_pred[i] == y_in[i]:
-                count += 1
-        acc = count / np.size(y_pred, axis=0) * 100
+        acc = np.mean(y_pred == np.ravel(y_in)) * 100
         print("ACC: %.4f%%" % acc)
 
-    def predict(self, x_in, y_in):
-        x_in, y_in = self.__initialize(x_in, y_in)
-        y_pred = self.__forward(x_in)
-        y_output = np.argmax(y_pred, axis=1)
-        # if self.__start_from_1 == 1:
-        #     y_output += 1
+    def predict_proba(self, x_in, out=None):
+        """Softmax output of each row of x.
+
+        Inference only: no dropout (it is inverted dropout, so the expected
+        activations are already right) and no a / z lists for backprop. The
+        scaler is folded into the first layer, so x is not copied.
+
+        Parameters:
+            x_in: raw x  (M, N)
+            out: optional preallocated (M, label_num) float64 matrix to write into
+
+        Returns:
+            (M, label_num) matrix
+        """
+        a_get = x_in
+        for i in range(self.__layer_num - 1):
+            params = self.__params_list[i]
+            weight, bias = params[1:], params[0]
+            if i == 0:                                                         # (x - mean) / std 并入参数
+                weight = weight / self.__scaler.std_.reshape(-1, 1)
+                bias = bias - self.__scaler.mean_ @ weight
+
+            if i != self.__layer_num - 2:
+                a_get = self.__activation.forward(a_get @ weight + bias)
+            else:                                                              # 最后一层 softmax
+                if out is None:
+                    out = a_get @ weight
+                else:
+                    np.matmul(a_get, weight, out=out)
+                out += bias
+                out -= np.max(out, axis=1, keepdims=True)
+                np.exp(out, out=out)
+                out /= np.sum(out, axis=1, keepdims=True)
+        return out
+
+    def predict(self, x_in, y_in=None, out=None):
+        """Predict labels of x; out is an optional (M, label_num) buffer for the probabilities."""
+        # y_in is useless here
+        y_output = np.argmax(self.predict_proba(x_in, out=out), axis=1)
+        if self.__start_from_1 == 1:
+            y_output += 1
         return y_output
 
     def __cost(self, y_pred, y_in):
@@ -125,7 +171,7 @@ class FC(object):
             theta[:, 0] = 0
             j2 += np.sum(np.sum((theta * theta), axis=1), axis=0)
 
-        j = 1 / np.size(y_in, axis=0) * j1 + LAMBDA / 2 / np.size(y_in, axis=0) * j2
+        j = 1 / np.size(y_in, axis=0) * j1 + self.lambda_ / 2 / np.size(y_in, axis=0) * j2
         return j
 
     def __forward(self, x_in):
@@ -151,7 +197,7 @@ class FC(object):
             self.__z_list.append(np.hstack((np.ones((np.size(x_in, axis=0), 1)), x_in)))      # 未激活前
 
             if i != self.__layer_num - 2:                                                     # 最后一层不激活
-                dropout = (np.random.random((np.shape(x_in))) < P) / P
+                dropout = (np.random.random((np.shape(x_in))) < self.p) / self.p
                 x_in = self.__activation.forward(x_in) * dropout
             else:
                 x_in = Softmax().forward(x_in)
@@ -162,41 +208,32 @@ class FC(object):
         delta_list = [0] * (self.__layer_num - 1)
         delta_sum_list = [0] * (self.__layer_num - 1)
 
-        y_new = np.zeros_like(y_in)
-
-        for row in range(np.size(y_in, axis=0)):
-            y_new[row, np.argmax(y_pred[row], axis=0)] = 1                              # 把pred变成 0, 1
-            for layer in range(self.__layer_num - 2, -1, -1):                           # num-2--0 num-1个
-
-                if layer == self.__layer_num - 2:                                       # 最后一层
-                    delta_list[layer] = Softmax().backward(y_in[row], y_pred[row]).reshape(np.size(y_in, axis=1), 1)
-                    a_get = self.__a_list[layer][row, :]
-                    a_get = a_get.reshape(np.size(a_get, axis=0), 1)
-                    delta_sum_list[layer] += np.dot(a_get, delta_list[layer].T)
-                else:
-                    a_back = self.__activation.backward(self.__z_list[layer][row, :])   # 激活函数反向
-                    a_back = a_back.reshape(np.size(a_back, axis=0), 1)
-
-                    delta = np.dot(self.__params_list[layer + 1], delta_list[layer + 1]) * a_back
-                    delta_list[layer] = delta[1:]
-                    a_get = self.__a_list[layer][row, :]
-                    a_get = a_get.reshape(np.size(a_get, axis=0), 1)
-                    delta_sum_list[layer] += np.dot(a_get, delta_list[layer].T)
+        # 整个 batch 一起反向, 每层的 delta 是 (行, 神经元) 矩阵, 梯度是各行外积之和
+        for layer in range(self.__layer_num - 2, -1, -1):                               # num-2--0 num-1个
+            if layer == self.__layer_num - 2:                                           # 最后一层
+                delta_list[layer] = Softmax().backward(y_in, y_pred)
+            else:
+                a_back = self.__activation.backward(self.__z_list[layer])               # 激活函数反向
+                delta = np.dot(delta_list[layer + 1], self.__params_list[layer + 1].T) * a_back
+                delta_list[layer] = delta[:, 1:]
+            delta_sum_list[layer] = np.dot(self.__a_list[layer].T, delta_list[layer])
 
         # 更新
         for i in range(self.__layer_num - 1):
             theta = self.__params_list[i]
             # theta[:, 0] = 0
-            grad = Momentum * self.__momentum[i] + ALPHA * (delta_sum_list[i] + LAMBDA * theta) / np.size(y_in, axis=0)
+            grad = self.momentum * self.__momentum[i] + \
+                self.alpha * (delta_sum_list[i] + self.lambda_ * theta) / np.size(y_in, axis=0)
             self.__params_list[i] -= grad
             self.__momentum[i] = grad
 
-    def __initialize(self, x_in, y_in):
-        """Normalize x_in, initialize params, and reshape y_in.
+    def __initialize(self, x_in, y_in, classes=None):
+        """Fit the scaler, initialize params, and reshape y_in.
 
         Parameters:
              x_in: raw x      (M, N)
              y_in: raw label  (M, )
+             classes: every label of the whole data, defaults to the labels in y_in
 
         Returns:
             x_in: after normalization  (M, N)
@@ -204,49 +241,55 @@ class FC(object):
         """
 
         # reshape y
+        if classes is None:
+            classes = y_in
         self.__start_from_1 = 1
-        for label in y_in:
+        for label in classes:
             if label == 0:                 # 从0开始
                 self.__start_from_1 = 0
-        if self.__start_from_1 == 1:
-            y_in -= 1                      # 从1开始的话-1,最后再加1
-
-        self.__label_num = self.__label_count(y_in)
-        y_matrix = np.zeros((np.size(y_in, axis=0), self.__label_num))
-        for j in range(np.size(y_in, axis=0)):
-            y_matrix[j, int(y_in[j])] = 1
+        self.__label_num = self.__label_count(classes)
+        y_matrix = self.__one_hot(y_in)
 
         # normalization
-        average = np.mean(x_in, axis=0)
-        std = np.std(x_in, axis=0)
-        for i in range(np.size(x_in, axis=1)):
-            if std[i] == 0:
-                continue
-            else:
-                x_in[:, i] = (x_in[:, i] - average[i]) / std[i]
+        self.__scaler = Standardizer().fit(x_in)
+        x_in = self.__normalize(x_in)
 
         # initialize params
-        self.__count += 1
-        if self.__count == 1:
-            for k in range(self.__layer_num - 1):
-                if k == 0:                           # 第一层
-                    params = np.random.random((np.size(x_in, axis=1) + 1, self.__hidden_layer_size[0]))
-                    epsilon_init = np.sqrt(6) / np.sqrt(np.size(x_in, axis=1) + 1 + self.__hidden_layer_size[0])
-                    params = 2 * epsilon_init * params - epsilon_init
-                    self.__params_list.append(params)
-                elif k == self.__layer_num - 2:      # 最后
-                    params = np.random.random((self.__hidden_layer_size[-1] + 1, self.__label_num))
-                    epsilon_init = np.sqrt(6) / np.sqrt(self.__hidden_layer_size[-1] + 1 + self.__label_num)
-                    params = 2 * epsilon_init * params - epsilon_init
-                    self.__params_list.append(params)
-                else:                                # 中间
-                    params = np.random.random((self.__hidden_layer_size[k-1] + 1, self.__hidden_layer_size[k]))
-                    epsilon_init = np.sqrt(6) / np.sqrt(self.__hidden_layer_size[k-1] + 1 + self.__hidden_layer_size[k])
-                    params = 2 * epsilon_init * params - epsilon_init
-                    self.__params_list.append(params)
+        self.__params_list = []
+        self.__momentum = [0] * (self.__layer_num - 1)
+        for k in range(self.__layer_num - 1):
+            if k == 0:                           # 第一层
+                params = np.random.random((np.size(x_in, axis=1) + 1, self.__hidden_layer_size[0]))
+                epsilon_init = np.sqrt(6) / np.sqrt(np.size(x_in, axis=1) + 1 + self.__hidden_layer_size[0])
+                params = 2 * epsilon_init * params - epsilon_init
+                self.__params_list.append(params)
+            elif k == self.__layer_num - 2:      # 最后
+                params = np.random.random((self.__hidden_layer_size[-1] + 1, self.__label_num))
+                epsilon_init = np.sqrt(6) / np.sqrt(self.__hidden_layer_size[-1] + 1 + self.__label_num)
+                params = 2 * epsilon_init * params - epsilon_init
+                self.__params_list.append(params)
+            else:                                # 中间
+                params = np.random.random((self.__hidden_layer_size[k-1] + 1, self.__hidden_layer_size[k]))
+                epsilon_init = np.sqrt(6) / np.sqrt(self.__hidden_layer_size[k-1] + 1 + self.__hidden_layer_size[k])
+                params = 2 * epsilon_init * params - epsilon_init
+                self.__params_list.append(params)
 
         return x_in, y_matrix
 
+    def __one_hot(self, y_in):
+        """Turn labels into a (M, label_num) 0/1 matrix."""
+
+        if self.__start_from_1 == 1:
+            y_in = y_in - 1                # 从1开始的话-1,最后再加1
+        y_matrix = np.zeros((np.size(y_in, axis=0), self.__label_num))
+        for j in range(np.size(y_in, axis=0)):
+            y_matrix[j, int(y_in[j])] = 1
+        return y_matrix
+
+    def __normalize(self, x_in):
+        """Standardize x_in with the scaler fitted in fit (transform only)."""
+        return self.__scaler.transform(x_in)
+
     def __label_count(self, y_in):
         """将每个label与出现次数转为字典 {label值:出现次数}
 
@@ -287,63 +330,42 @@ class Sigmoid(object):
         return inputs
 
 
+# 激活函数都是原地修改 inputs
 class ReLU(object):
     def forward(self, inputs):
-        for j in range(np.size(inputs, axis=1)):
-            for i in range(np.size(inputs, axis=0)):
-                if inputs[i, j] < 0:
-                    inputs[i, j] = 0
+        np.maximum(inputs, 0, out=inputs)
         return inputs
 
     def backward(self, inputs):
-        for i in range(np.size(inputs, axis=0)):
-            if inputs[i] > 0:
-                inputs[i] = 1
-            else:
-                inputs[i] = 0
+        inputs[:] = inputs > 0
         return inputs
 
 
 class LeakyReLU(object):
     def forward(self, inputs):
-        for j in range(np.size(inputs, axis=1)):
-            for i in range(np.size(inputs, axis=0)):
-                if inputs[i, j] < 0:
-                    inputs[i, j] = 0.01 * inputs[i, j]
+        inputs[inputs < 0] *= 0.01
         return inputs
 
     def backward(self, inputs):
-        for i in range(np.size(inputs, axis=0)):
-            if inputs[i] >= 0:
-                inputs[i] = 1
-            else:
-                inputs[i] = 0.01
+        inputs[:] = np.where(inputs >= 0, 1, 0.01)
         return inputs
 
 
 class ELU(object):
     def forward(self, inputs):
-        for j in range(np.size(inputs, axis=1)):
-            for i in range(np.size(inputs, axis=0)):
-                if inputs[i, j] < 0:
-                    inputs[i, j] = 0.01 * (np.exp(inputs[i, j] - 1))
+        negative = inputs < 0
+        inputs[negative] = 0.01 * (np.exp(inputs[negative] - 1))
         return inputs
 
     def backward(self, inputs):
-        for i in range(np.size(inputs, axis=0)):
-            if inputs[i] >= 0:
-                inputs[i] = 1
-            else:
-                inputs[i] = 0.01 * np.exp(inputs[i])
+        inputs[:] = np.where(inputs >= 0, 1, 0.01 * np.exp(inputs))
         return inputs
 
 
 class Softmax(object):
     def forward(self, inputs):
-        inputs_new = np.exp(inputs)
-        inputs_sum = np.sum(inputs_new, axis=1)
-        for i in range(np.size(inputs_new, axis=0)):
-            inputs_new[i, :] = inputs_new[i, :] / inputs_sum[i]
+        inputs_new = np.exp(inputs - np.max(inputs, axis=1, keepdims=True))   # 减去最大值防止溢出
+        inputs_new /= np.sum(inputs_new, axis=1, keepdims=True)
         return inputs_new
 
     def backward(self, y, y_pred):